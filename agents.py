@@ -1,19 +1,70 @@
+import json
+import time
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 from llm_utils import call_llm
+from context_compactor import count_tokens, compact_context, AGENT_CONTEXT_TOKENS, CONTEXT_COMPACTION
 
 class Agent:
+    # data_context keys this agent's prompt uses, compacted to share token_budget
+    context_keys = ()
+    token_budget = AGENT_CONTEXT_TOKENS
+
     def __init__(self, name, role, description):
         self.name = name
         self.role = role
         self.description = description
+        self.prompt_stats = {}
+
+    def build_prompt(self, stock_name, stock_code, data_context):
+        """Return (system_prompt, prompt)."""
+        raise NotImplementedError("Subclasses must implement build_prompt method")
+
+    def analyze(self, stock_name, stock_code, data_context, stream=False):
+        """
+        Ask the LLM for this agent's analysis. With CONTEXT_COMPACTION the
+        context is compacted to token_budget first; prompt sizes with and
+        without compaction and the call latency are logged to prompt_stats.
+        """
+        system_prompt, prompt = self.build_prompt(stock_name, stock_code, data_context)
+        raw_tokens = count_tokens(system_prompt) + count_tokens(prompt)
+        if CONTEXT_COMPACTION:
+            compacted = compact_context(data_context, self.context_keys, self.token_budget)
+            system_prompt, prompt = self.build_prompt(stock_name, stock_code, compacted)
+        self.prompt_stats = {
+            "compaction": CONTEXT_COMPACTION,
+            "raw_tokens": raw_tokens,
+            "prompt_tokens": count_tokens(system_prompt) + count_tokens(prompt),
+        }
+        start = time.perf_counter()
+        if stream:
+            return self._timed_stream(call_llm(prompt, system_prompt, stream=True), start)
+        response = call_llm(prompt, system_prompt)
+        self._log_latency(start)
+        return response
+
+    def _timed_stream(self, deltas, start):
+        first = None
+        for delta in deltas:
+            if first is None:
+                first = time.perf_counter() - start
+                self.prompt_stats["first_token_seconds"] = round(first, 3)
+            yield delta
+        self._log_latency(start)
 
-    def analyze(self, stock_name, stock_code, data_context):
-        raise NotImplementedError("Subclasses must implement analyze method")
+    def _log_latency(self, start):
+        stats = self.prompt_stats
+        stats["latency_seconds"] = round(time.perf_counter() - start, 3)
+        print(f"[{self.name}] prompt {stats['raw_tokens']} -> {stats['prompt_tokens']} tokens "
+              f"(compaction {'on' if stats['compaction'] else 'off'}), LLM {stats['latency_seconds']}s")
 
 class FundamentalAnalyst(Agent):
+    context_keys = ('basic_info', 'financial_summary', 'industry_comparison')
+
     def __init__(self):
         super().__init__("Warren", "Fundamental Analyst", "Focuses on financial health, valuation, and long-term growth.")
 
-    def analyze(self, stock_name, stock_code, data_context):
+    def build_prompt(self, stock_name, stock_code, data_context):
         system_prompt = f"""You are {self.name}, a {self.role}. {self.description}
         Your goal is to analyze the provided financial data for {stock_name} ({stock_code}) and provide a professional investment opinion.
         Focus on:
@@ -38,20 +89,23 @@ class FundamentalAnalyst(Agent):
         
         Provide your analysis:
         """
-        return call_llm(prompt, system_prompt)
+        return system_prompt, prompt
 
 class TechnicalAnalyst(Agent):
+    context_keys = ('price_action', 'moving_averages', 'volume_info', 'indicator_summary')
+
     def __init__(self):
         super().__init__("Chartist", "Technical Analyst", "Focuses on price action, trends, volume, and technical indicators.")
 
-    def analyze(self, stock_name, stock_code, data_context):
+    def build_prompt(self, stock_name, stock_code, data_context):
         system_prompt = f"""You are {self.name}, a {self.role}. {self.description}
         Your goal is to analyze the technical patterns for {stock_name} ({stock_code}).
         Focus on:
-        1. Trend Analysis (Moving Averages)
-        2. Volume Analysis
-        3. Support and Resistance levels (estimated)
-        4. Recent price action
+        1. Trend Analysis (Moving Averages, MACD)
+        2. Momentum and Volatility (RSI, KDJ, Bollinger Bands, ATR)
+        3. Volume Analysis
+        4. Support and Resistance levels (estimated)
+        5. Recent price action
         
         Output format: Markdown. Use bullet points.
         """
@@ -68,15 +122,20 @@ class TechnicalAnalyst(Agent):
         Volume Info:
         {data_context.get('volume_info', 'N/A')}
         
+        Technical Indicators (MA / MACD / RSI / Bollinger / ATR / KDJ / OBV):
+        {data_context.get('indicator_summary', 'N/A')}
+        
         Provide your technical outlook:
         """
-        return call_llm(prompt, system_prompt)
+        return system_prompt, prompt
 
 class NewsAnalyst(Agent):
+    context_keys = ('notices', 'comments')
+
     def __init__(self):
         super().__init__("Scoop", "News & Sentiment Analyst", "Focuses on market sentiment, news, and public opinion.")
 
-    def analyze(self, stock_name, stock_code, data_context):
+    def build_prompt(self, stock_name, stock_code, data_context):
         system_prompt = f"""You are {self.name}, a {self.role}. {self.description}
         Your goal is to gauge the sentiment for {stock_name} ({stock_code}).
         Focus on:
@@ -98,13 +157,15 @@ class NewsAnalyst(Agent):
         
         Provide your sentiment analysis:
         """
-        return call_llm(prompt, system_prompt)
+        return system_prompt, prompt
 
 class RiskManager(Agent):
+    context_keys = ('financial_summary', 'price_action', 'notices')
+
     def __init__(self):
         super().__init__("Prudence", "Risk Manager", "Focuses on identifying potential risks and downsides.")
 
-    def analyze(self, stock_name, stock_code, data_context):
+    def build_prompt(self, stock_name, stock_code, data_context):
         system_prompt = f"""You are {self.name}, a {self.role}. {self.description}
         Your job is to be the devil's advocate and point out risks for {stock_name} ({stock_code}).
         Focus on:
@@ -129,4 +190,104 @@ class RiskManager(Agent):
         
         Provide your risk assessment:
         """
-        return call_llm(prompt, system_prompt)
+        return system_prompt, prompt
+
+
+def build_team():
+    """The default analyst team, in display order."""
+    return [FundamentalAnalyst(), TechnicalAnalyst(), NewsAnalyst(), RiskManager()]
+
+
+CIO_SYSTEM_PROMPT = "You are a Chief Investment Officer (CIO). Synthesize the reports from your team."
+
+def build_cio_prompt(stock_name, stock_code, analyses):
+    """Prompt asking the CIO to synthesize the team's analyses into one rating."""
+    return f"""
+    Based on the following analyses for {stock_name} ({stock_code}), provide a comprehensive investment summary and a final rating (Buy/Hold/Sell).
+    
+    Analyses:
+    {json.dumps(analyses, ensure_ascii=False)}
+    
+    Output format: Markdown.
+    """
+
+
+def run_agents(agents, stock_name, stock_code, data_context, max_workers=4, timeout=None):
+    """
+    Run the agents' analyses concurrently on a bounded worker pool.
+
+    Yields (agent, analysis, error, elapsed) in completion order, so callers
+    can render each result as soon as it lands. A failed agent yields its
+    exception as `error`; agents still running when `timeout` seconds have
+    passed are yielded with a TimeoutError and do not block the others.
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(agents))))
+    start = time.perf_counter()
+    futures = {
+        executor.submit(agent.analyze, stock_name, stock_code, data_context): agent
+        for agent in agents
+    }
+    remaining = dict(futures)
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            agent = remaining.pop(future)
+            elapsed = time.perf_counter() - start
+            try:
+                analysis, error = future.result(), None
+            except Exception as e:
+                analysis, error = None, e
+            yield agent, analysis, error, elapsed
+    except FuturesTimeoutError:
+        elapsed = time.perf_counter() - start
+        for future, agent in remaining.items():
+            future.cancel()
+            yield agent, None, TimeoutError(f"{agent.name} did not finish within {timeout}s"), elapsed
+    finally:
+        # Do not wait for timed-out calls; their threads finish in the background.
+        executor.shutdown(wait=False)
+
+
+def stream_agents(agents, stock_name, stock_code, data_context, max_workers=4, timeout=None):
+    """
+    Like run_agents, but streams each agent's answer token by token.
+
+    Yields (agent, text, done, error, elapsed) events from the calling thread:
+    `text` is the answer aggregated so far, and exactly one event per agent
+    has done=True, carrying either the full answer or the error.
+    """
+    events = queue.Queue()
+
+    def work(agent):
+        try:
+            for delta in agent.analyze(stock_name, stock_code, data_context, stream=True):
+                events.put((agent, delta, False, None))
+            events.put((agent, "", True, None))
+        except Exception as e:
+            events.put((agent, "", True, e))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(agents))))
+    start = time.perf_counter()
+    texts = {agent.name: "" for agent in agents}
+    remaining = {agent.name: agent for agent in agents}
+    for agent in agents:
+        executor.submit(work, agent)
+    try:
+        while remaining:
+            wait_for = None if timeout is None else timeout - (time.perf_counter() - start)
+            try:
+                if wait_for is not None and wait_for <= 0:
+                    raise queue.Empty
+                agent, delta, done, error = events.get(timeout=wait_for)
+            except queue.Empty:
+                elapsed = time.perf_counter() - start
+                for agent in remaining.values():
+                    yield agent, texts[agent.name], True, TimeoutError(f"{agent.name} did not finish within {timeout}s"), elapsed
+                return
+            if agent.name not in remaining:
+                continue
+            texts[agent.name] += delta
+            if done:
+                remaining.pop(agent.name)
+            yield agent, texts[agent.name], done, error, time.perf_counter() - start
+    finally:
+        executor.shutdown(wait=False)
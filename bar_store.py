@@ -0,0 +1,357 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import numpy as np
+import pandas as pd
+
+from upstream import get_upstream
+
+# Local daily bar store (env overrides)
+BAR_STORE_DIR = os.getenv("BAR_STORE_DIR", os.path.join("cache", "bars"))
+BAR_ADJUST = os.getenv("BAR_ADJUST", "qfq")
+# Multi-source fetching: "hedge", "race" or "sequential", and the hedge delay before stats exist
+BAR_HEDGE_MODE = os.getenv("BAR_HEDGE_MODE", "hedge")
+BAR_HEDGE_DELAY = float(os.getenv("BAR_HEDGE_DELAY", "1.0"))
+
+BAR_COLUMNS = ['日期', '开盘', '最高', '最低', '收盘', '成交量', '成交额']
+DATE_FMT = "%Y%m%d"
+# Daily bars are final once the market has closed (exchange time, whatever the server's zone)
+MARKET_TZ = ZoneInfo("Asia/Shanghai")
+MARKET_CLOSE = (15, 30)
+# Source ranking: recent latencies kept, samples needed and success rate required to be primary
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 5
+MIN_SUCCESS_RATE = 0.8
+
+
+def exchange_prefix(code):
+    """000001 -> sz, 600000 -> sh, 830799 -> bj"""
+    if code.startswith('6'):
+        return "sh"
+    if code.startswith(('0', '3')):
+        return "sz"
+    if code.startswith(('8', '4')):
+        return "bj"
+    return ""
+
+
+def normalize_bars(df, source):
+    """Map a provider's daily bar frame onto BAR_COLUMNS, volume in shares."""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=BAR_COLUMNS)
+    if source == "sina":
+        df = df.rename(columns={
+            'date': '日期', 'open': '开盘', 'high': '最高', 'low': '最低',
+            'close': '收盘', 'volume': '成交量', 'amount': '成交额'
+        })
+    else:
+        df = df.copy()
+        # eastmoney reports volume in lots of 100 shares
+        df['成交量'] = pd.to_numeric(df['成交量'], errors='coerce') * 100
+    if '成交额' not in df.columns:
+        df['成交额'] = float('nan')
+    df = df[BAR_COLUMNS].copy()
+    df['日期'] = pd.to_datetime(df['日期'])
+    for col in BAR_COLUMNS[1:]:
+        df[col] = pd.to_numeric(df[col], errors='coerce').astype(float)
+    return df.sort_values('日期').reset_index(drop=True)
+
+
+def fetch_sina_bars(code, start_date, end_date, adjust=BAR_ADJUST):
+    df = get_upstream().ak("stock_zh_a_daily", symbol=exchange_prefix(code) + code, start_date=start_date, end_date=end_date, adjust=adjust)
+    return normalize_bars(df, "sina")
+
+
+def fetch_eastmoney_bars(code, start_date, end_date, adjust=BAR_ADJUST):
+    df = get_upstream().ak("stock_zh_a_hist", symbol=code, period="daily", start_date=start_date, end_date=end_date, adjust=adjust)
+    return normalize_bars(df, "eastmoney")
+
+
+BAR_SOURCES = {"sina": fetch_sina_bars, "eastmoney": fetch_eastmoney_bars}
+
+
+class SourceStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def percentile(self, q):
+        return float(np.percentile(self.latencies, q)) if self.latencies else float("nan")
+
+
+class HedgedBarFetcher:
+    """
+    Fetches daily bars from several sources, taking the first valid answer.
+
+    In "hedge" mode the primary source starts alone and the next one is
+    started only if no valid result arrived within the hedge delay (the
+    primary's p95 latency once known, else `hedge_delay`) or the primary
+    failed. "race" starts all sources at once; "sequential" only moves on
+    after a failure. Results from every source are normalized to
+    BAR_COLUMNS. Latencies are recorded for every finished call, including
+    losers, and the primary is the source with the lowest p50 among those
+    with a good success rate.
+    """
+
+    def __init__(self, sources=None, mode=BAR_HEDGE_MODE, hedge_delay=BAR_HEDGE_DELAY):
+        self.sources = sources or BAR_SOURCES
+        self.mode = mode
+        self.hedge_delay = hedge_delay
+        self._stats = {name: SourceStats() for name in self.sources}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2 * len(self.sources))
+
+    def order(self):
+        """Sources, primary first."""
+        names = list(self.sources)
+        with self._lock:
+            ranked = [
+                (self._stats[n].percentile(50), names.index(n), n) for n in names
+                if len(self._stats[n].latencies) >= MIN_SAMPLES and self._stats[n].errors <= (1 - MIN_SUCCESS_RATE) * self._stats[n].calls
+            ]
+        preferred = [n for _, _, n in sorted(ranked)]
+        return preferred + [n for n in names if n not in preferred]
+
+    def _delay(self, name):
+        with self._lock:
+            stats = self._stats[name]
+            return stats.percentile(95) if len(stats.latencies) >= MIN_SAMPLES else self.hedge_delay
+
+    def _run(self, name, args):
+        start = time.perf_counter()
+        try:
+            bars = self.sources[name](*args)
+        except Exception:
+            with self._lock:
+                self._stats[name].calls += 1
+                self._stats[name].errors += 1
+            raise
+        with self._lock:
+            self._stats[name].calls += 1
+            self._stats[name].latencies.append(time.perf_counter() - start)
+        return bars
+
+    def fetch(self, code, start_date, end_date, adjust=BAR_ADJUST):
+        args = (code, start_date, end_date, adjust)
+        waiting = self.order()
+        running = {}
+
+        def launch():
+            name = waiting.pop(0)
+            running[self._executor.submit(self._run, name, args)] = name
+
+        launch()
+        if self.mode == "race":
+            while waiting:
+                launch()
+        empty, error = None, None
+        while running:
+            timeout = self._delay(running[next(iter(running))]) if self.mode == "hedge" and waiting else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                launch()  # the primary is slow: hedge with the next source
+                continue
+            for future in done:
+                name = running.pop(future)
+                try:
+                    bars = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if not bars.empty:
+                    with self._lock:
+                        self._stats[name].wins += 1
+                    return bars
+                empty = bars
+            if not running and waiting:
+                launch()
+        if empty is not None:
+            return empty
+        raise error
+
+    def stats(self):
+        with self._lock:
+            return [
+                {
+                    "source": name,
+                    "calls": s.calls,
+                    "errors": s.errors,
+                    "wins": s.wins,
+                    "win_rate": round(s.wins / s.calls, 3) if s.calls else None,
+                    "p50_ms": round(s.percentile(50) * 1000, 1),
+                    "p95_ms": round(s.percentile(95) * 1000, 1),
+                }
+                for name, s in self._stats.items()
+            ]
+
+
+def fetch_daily_bars(code, start_date, end_date, adjust=BAR_ADJUST):
+    """Download daily bars, hedged across sina and eastmoney."""
+    return get_bar_fetcher().fetch(code, start_date, end_date, adjust)
+
+
+def last_complete_day(now=None):
+    """The latest date whose daily bar can no longer change (naive `now` is taken as Shanghai time)."""
+    now = now or datetime.now(MARKET_TZ)
+    if now.tzinfo is not None:
+        now = now.astimezone(MARKET_TZ)
+    if (now.hour, now.minute) >= MARKET_CLOSE:
+        return now.date()
+    return now.date() - timedelta(days=1)
+
+
+class BarStore:
+    """
+    Per-symbol Parquet store of daily OHLCV bars.
+
+    Each symbol has a bar file plus a small coverage record of the date span
+    already requested from upstream, so ranges inside it are served from disk
+    without network access even when they contain non-trading days. Requests
+    outside the span download only the missing days. Each top-up re-fetches
+    the boundary bar: if its price no longer matches (an adjustment event
+    changed forward-adjusted history), the whole span is downloaded again.
+    """
+
+    def __init__(self, root=BAR_STORE_DIR, adjust=BAR_ADJUST, fetcher=fetch_daily_bars):
+        self.root = root
+        self.adjust = adjust
+        self.fetcher = fetcher
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _lock(self, code):
+        with self._locks_guard:
+            return self._locks.setdefault(code, threading.Lock())
+
+    def _paths(self, code):
+        base = os.path.join(self.root, f"{code}_{self.adjust or 'none'}")
+        return base + ".parquet", base + ".json"
+
+    def load(self, code):
+        """Return (bars, coverage) as stored on disk."""
+        data_path, meta_path = self._paths(code)
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return pd.DataFrame(columns=BAR_COLUMNS), None
+        with open(meta_path, encoding="utf-8") as f:
+            coverage = json.load(f)
+        return pd.read_parquet(data_path), coverage
+
+    def codes(self):
+        """Codes that have bars on disk."""
+        suffix = f"_{self.adjust or 'none'}.parquet"
+        return sorted(name[:-len(suffix)] for name in os.listdir(self.root) if name.endswith(suffix))
+
+    def _save(self, code, bars, coverage):
+        data_path, meta_path = self._paths(code)
+        # Write to temp files and rename so readers never see partial files
+        bars.to_parquet(data_path + ".tmp", index=False)
+        os.replace(data_path + ".tmp", data_path)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(coverage, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @staticmethod
+    def _merge(bars, new_bars):
+        if bars.empty:
+            return new_bars.reset_index(drop=True)
+        merged = pd.concat([bars, new_bars], ignore_index=True)
+        return merged.drop_duplicates('日期', keep='last').sort_values('日期').reset_index(drop=True)
+
+    @staticmethod
+    def _boundary_changed(bars, new_bars, date):
+        """True when the re-fetched bar for `date` disagrees with the stored one."""
+        day = pd.Timestamp(date)
+        old = bars.loc[bars['日期'] == day, '收盘']
+        new = new_bars.loc[new_bars['日期'] == day, '收盘']
+        if old.empty or new.empty:
+            return False
+        return abs(old.iloc[0] - new.iloc[0]) > 1e-6 * max(abs(old.iloc[0]), 1.0)
+
+    def get_bars(self, code, start_date, end_date=None):
+        """
+        Daily bars for `code` between start_date and end_date (YYYYMMDD, inclusive).
+        Missing days are fetched and stored first; if upstream is unreachable,
+        whatever is already on disk is returned. An empty answer (first fetch
+        or top-up) never marks a span as covered, so it is asked for again on
+        the next call.
+        """
+        today = datetime.now(MARKET_TZ).strftime(DATE_FMT)
+        end_date = min(end_date or today, today)
+        complete = last_complete_day().strftime(DATE_FMT)
+
+        with self._lock(code):
+            bars, coverage = self.load(code)
+            try:
+                if coverage is None:
+                    bars = self.fetcher(code, start_date, end_date, self.adjust)
+                    if not bars.empty:
+                        coverage = {"from": start_date, "through": min(end_date, complete)}
+                        self._save(code, bars, coverage)
+                else:
+                    changed = False
+                    if start_date < coverage["from"]:
+                        older = self.fetcher(code, start_date, coverage["from"], self.adjust)
+                        if self._boundary_changed(bars, older, coverage["from"]):
+                            bars = pd.DataFrame(columns=BAR_COLUMNS)
+                            coverage["through"] = coverage["from"]
+                        bars = self._merge(bars, older)
+                        coverage["from"] = start_date
+                        changed = True
+                    if end_date > coverage["through"]:
+                        newer = self.fetcher(code, coverage["through"], end_date, self.adjust)
+                        # The request includes the stored boundary day, so an empty
+                        # answer is a failed fetch: leave coverage where it was
+                        if newer.empty:
+                            raise ValueError("empty top-up")
+                        if self._boundary_changed(bars, newer, coverage["through"]):
+                            rebuilt = self.fetcher(code, coverage["from"], end_date, self.adjust)
+                            if rebuilt.empty:
+                                raise ValueError("empty rebuild after an adjustment change")
+                            bars = rebuilt
+                        else:
+                            bars = self._merge(bars, newer)
+                        coverage["through"] = min(end_date, complete)
+                        changed = True
+                    if changed:
+                        self._save(code, bars, coverage)
+            except Exception as e:
+                if bars.empty:
+                    raise
+                print(f"Bar store top-up error ({code}): {e}")
+
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        return bars[(bars['日期'] >= start) & (bars['日期'] <= end)].reset_index(drop=True)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_bar_store():
+    """Return the process-wide BarStore."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = BarStore()
+    return _store
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+def get_bar_fetcher():
+    """Return the process-wide HedgedBarFetcher."""
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                _fetcher = HedgedBarFetcher()
+    return _fetcher
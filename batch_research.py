@@ -0,0 +1,273 @@
+"""
+批量个股研究 (无界面)
+
+对自选股列表、代码区间或 stock_list.csv 中的全部股票，依次构建数据上下文、
+运行 AI 投顾团队并生成 CIO 综合报告，逐只输出 Markdown/JSON 报告与运行汇总。
+支持断点续跑：已成功的股票记录在 checkpoint.jsonl 中，--resume 时跳过。
+
+用法示例:
+    python batch_research.py --codes 000001,600036 --out reports/
+    python batch_research.py --watchlist watchlist.txt --workers 4 --resume
+    python batch_research.py --range 600000-600100 --llm-concurrency 4
+    python batch_research.py --industry 银行,证券 --out reports/
+    python batch_research.py --all --stocks-per-minute 30 --resume
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from streamlit import logger as st_logger
+from agents import build_team, run_agents, build_cio_prompt, CIO_SYSTEM_PROMPT
+from llm_utils import call_llm, configure_llm_client, LLMError
+# 以裸模式导入 Streamlit 页面模块，复用其中的数据获取函数
+from investment_research import build_data_context, context_sources, get_stock_list
+from industry import get_industry_index
+from notice_store import get_notice_store
+
+# 屏蔽裸模式下 "missing ScriptRunContext" 之类的提示
+st_logger.set_log_level("error")
+
+CHECKPOINT_FILE = "checkpoint.jsonl"
+# 批量运行在公告库中的查看者标识: 报告中的"新公告"指上次批量运行以来新增的公告
+NOTICE_VIEWER = "batch"
+
+
+class RateLimiter:
+    """令牌桶：限制全局每分钟开始研究的股票数 (即对上游数据源的请求速率)"""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait_for = self._next - now
+            self._next = max(self._next, now) + self.interval
+        if wait_for > 0:
+            time.sleep(wait_for)
+
+
+def resolve_codes(args, stock_list):
+    """根据命令行参数确定待研究的股票代码 (保持顺序、去重)"""
+    codes = []
+    if args.codes:
+        codes += [c.strip() for c in args.codes.split(",") if c.strip()]
+    if args.watchlist:
+        with open(args.watchlist, encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#")[0].strip()
+                if line:
+                    codes.append(line.split(",")[0].strip())
+    if args.range:
+        low, high = args.range.split("-")
+        in_range = stock_list[(stock_list['code'] >= low) & (stock_list['code'] <= high)]
+        codes += in_range['code'].tolist()
+    if args.industry:
+        index = get_industry_index()
+        # 首次运行时等待行业成员索引构建完成
+        if not index.wait_ready():
+            print("行业成员索引尚未建好")
+        for industry in args.industry.split(","):
+            members = index.codes_in(industry.strip())
+            if not members:
+                print(f"行业成员索引中没有行业: {industry.strip()}")
+            codes += members
+    if args.all:
+        codes += stock_list['code'].tolist()
+    # 跳过 CSV 表头等非代码内容
+    return list(dict.fromkeys(c.zfill(6) for c in codes if c.isdigit()))
+
+
+def load_checkpoint(out_dir):
+    """已成功完成的股票代码集合"""
+    path = os.path.join(out_dir, CHECKPOINT_FILE)
+    done = set()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # 中断时写了一半的行
+                if record.get("status") == "ok":
+                    done.add(record["code"])
+    return done
+
+
+def research_stock(code, name, agent_timeout):
+    """对单只股票运行完整流程，返回报告字典 (不抛出异常)"""
+    report = {
+        "code": code,
+        "name": name,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "analyses": {},
+        "errors": {},
+        "summary": None,
+    }
+    start = time.perf_counter()
+
+    get_notice_store().mark_seen(code, NOTICE_VIEWER)
+    data_context, timings = build_data_context(code, name, sources=context_sources(NOTICE_VIEWER))
+    report["data_context"] = data_context
+    report["context_timings"] = {source: {"seconds": round(elapsed, 3), "status": status} for source, (elapsed, status) in timings.items()}
+
+    report["prompt_stats"] = {}
+    for agent, analysis, error, elapsed in run_agents(build_team(), name, code, data_context, timeout=agent_timeout):
+        report["prompt_stats"][agent.name] = agent.prompt_stats
+        if error is not None:
+            report["errors"][agent.name] = str(error)
+        else:
+            report["analyses"][agent.name] = analysis
+
+    if report["analyses"]:
+        try:
+            report["summary"] = call_llm(build_cio_prompt(name, code, report["analyses"]), CIO_SYSTEM_PROMPT)
+        except LLMError as e:
+            report["errors"]["CIO"] = str(e)
+
+    report["elapsed"] = round(time.perf_counter() - start, 3)
+    report["status"] = "ok" if report["summary"] and not report["errors"] else "failed"
+    return report
+
+
+def render_markdown(report):
+    lines = [f"# {report['name']} ({report['code']})", "", f"生成时间: {report['started_at']}  耗时: {report['elapsed']}s", ""]
+    lines += ["## 首席投资官 (CIO) 综合报告", "", report["summary"] or "_未生成_", ""]
+    for agent_name, analysis in report["analyses"].items():
+        lines += [f"## {agent_name}", "", analysis, ""]
+    if report["errors"]:
+        lines += ["## 错误", ""] + [f"- {k}: {v}" for k, v in report["errors"].items()] + [""]
+    lines += ["## 数据获取耗时", "", "| 数据源 | 耗时(秒) | 状态 |", "| --- | --- | --- |"]
+    lines += [f"| {s} | {t['seconds']} | {t['status']} |" for s, t in report["context_timings"].items()]
+    return "\n".join(lines) + "\n"
+
+
+def write_report(out_dir, report, checkpoint_lock):
+    base = os.path.join(out_dir, report["code"])
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    with open(base + ".md", "w", encoding="utf-8") as f:
+        f.write(render_markdown(report))
+    record = {"code": report["code"], "status": report["status"], "elapsed": report["elapsed"], "finished_at": datetime.now().isoformat(timespec="seconds")}
+    with checkpoint_lock:
+        with open(os.path.join(out_dir, CHECKPOINT_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def write_run_summary(out_dir, results, skipped, wall_time):
+    ok = [r for r in results if r["status"] == "ok"]
+    failed = [r for r in results if r["status"] != "ok"]
+    summary = {
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "wall_seconds": round(wall_time, 1),
+        "processed": len(results),
+        "ok": len(ok),
+        "failed": len(failed),
+        "skipped_from_checkpoint": skipped,
+        "mean_stock_seconds": round(sum(r["elapsed"] for r in results) / len(results), 2) if results else 0,
+        "failures": {r["code"]: r["errors"] for r in failed},
+    }
+    with open(os.path.join(out_dir, "run_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    lines = [
+        "# 批量研究运行汇总", "",
+        f"- 完成时间: {summary['finished_at']}",
+        f"- 总耗时: {summary['wall_seconds']}s",
+        f"- 成功 / 失败 / 跳过: {summary['ok']} / {summary['failed']} / {skipped}",
+        f"- 单只平均耗时: {summary['mean_stock_seconds']}s", "",
+    ]
+    if ok:
+        lines += ["| 代码 | 名称 | 耗时(秒) |", "| --- | --- | --- |"]
+        lines += [f"| [{r['code']}]({r['code']}.md) | {r['name']} | {r['elapsed']} |" for r in ok]
+    if failed:
+        lines += ["", "## 失败", ""] + [f"- {r['code']} {r['name']}: {r['errors']}" for r in failed]
+    with open(os.path.join(out_dir, "run_summary.md"), "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="批量运行 AI 投顾团队个股研究")
+    target = parser.add_argument_group("研究范围 (可组合)")
+    target.add_argument("--codes", help="逗号分隔的股票代码，如 000001,600036")
+    target.add_argument("--watchlist", help="自选股文件，每行一个代码 (或 CSV 首列为代码)")
+    target.add_argument("--range", help="代码区间 (含端点)，如 600000-600100")
+    target.add_argument("--industry", help="逗号分隔的行业名称 (东方财富行业板块)，如 银行,证券")
+    target.add_argument("--all", action="store_true", help="stock_list.csv 中的全部股票")
+    parser.add_argument("--out", default="reports", help="报告输出目录 (默认 reports)")
+    parser.add_argument("--workers", type=int, default=2, help="同时研究的股票数 (默认 2)")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="全局同时在途的 LLM 请求数上限 (默认 4)")
+    parser.add_argument("--stocks-per-minute", type=float, default=20, help="每分钟最多开始研究的股票数，0 为不限 (默认 20)")
+    parser.add_argument("--agent-timeout", type=float, default=180, help="单只股票团队分析的最长等待秒数 (默认 180)")
+    parser.add_argument("--resume", action="store_true", help="跳过 checkpoint 中已成功的股票")
+    args = parser.parse_args(argv)
+    if not (args.codes or args.watchlist or args.range or args.industry or args.all):
+        parser.error("请至少指定 --codes / --watchlist / --range / --industry / --all 之一")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(args.out, exist_ok=True)
+    configure_llm_client(max_concurrency=args.llm_concurrency)
+
+    stock_list = get_stock_list()
+    stock_list['code'] = stock_list['code'].astype(str).str.zfill(6)
+    names = dict(zip(stock_list['code'], stock_list['name']))
+
+    codes = resolve_codes(args, stock_list)
+    skipped = 0
+    if args.resume:
+        done = load_checkpoint(args.out)
+        skipped = sum(1 for c in codes if c in done)
+        codes = [c for c in codes if c not in done]
+    print(f"待研究 {len(codes)} 只股票 (跳过 {skipped} 只已完成)，输出目录: {args.out}")
+    # 公告按批 (每次请求多只股票) 预先拉取，逐只研究时不再单独请求
+    print(f"公告预取: 新增 {get_notice_store().poll(codes)} 条")
+
+    limiter = RateLimiter(args.stocks_per_minute)
+    checkpoint_lock = threading.Lock()
+    results = []
+    start = time.perf_counter()
+
+    def task(code):
+        limiter.acquire()
+        return research_stock(code, names.get(code, code), args.agent_timeout)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, args.workers))
+    try:
+        futures = {executor.submit(task, code): code for code in codes}
+        for i, future in enumerate(as_completed(futures), 1):
+            code = futures[future]
+            try:
+                report = future.result()
+            except Exception as e:
+                report = {"code": code, "name": names.get(code, code), "started_at": "", "analyses": {}, "summary": None,
+                          "errors": {"runner": str(e)}, "context_timings": {}, "elapsed": 0.0, "status": "failed"}
+            write_report(args.out, report, checkpoint_lock)
+            results.append(report)
+            print(f"[{i}/{len(codes)}] {code} {report['name']}: {report['status']} ({report['elapsed']}s)")
+    except KeyboardInterrupt:
+        print("已中断，使用 --resume 可从断点继续。")
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+    else:
+        executor.shutdown()
+
+    summary = write_run_summary(args.out, results, skipped, time.perf_counter() - start)
+    print(f"完成: 成功 {summary['ok']}，失败 {summary['failed']}，总耗时 {summary['wall_seconds']}s")
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
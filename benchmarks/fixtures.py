@@ -0,0 +1,442 @@
+"""
+基准测试的离线数据夹具: 录制、合成与回放
+
+录制的夹具保存在 benchmarks/fixtures/ (可提交到仓库)；没有录制夹具时，基准测试自动在
+benchmarks/.synthetic_fixtures/ 生成合成夹具 (不提交，随时可重新生成)。
+
+夹具目录结构:
+    manifest.json          来源 (recorded / synthetic)、股票代码、生成时间
+    ak/<函数名>.pkl         {symbol 或 "*": DataFrame}，akshare 调用结果
+    http/guba.html         股吧列表页
+    http/notices.json      东方财富公告接口响应
+    http/em_<报表>.json     东方财富 F10 报表接口响应 (lrb / zcfzb / xjllb)
+    llm/responses.json     [{"system": 系统提示词摘要, "content": 回复, "usage": {...}}]
+
+用法:
+    python benchmarks/fixtures.py --record --code 000001   # 联网录制真实数据 (含一次 AI 团队分析)
+    python benchmarks/fixtures.py --synthesize             # 生成与真实接口同结构、全市场规模的合成数据
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DIR = os.path.join(ROOT, "benchmarks", "fixtures")
+SYNTHETIC_DIR = os.path.join(ROOT, "benchmarks", ".synthetic_fixtures")
+DEFAULT_CODE = "000001"
+STATEMENT_KINDS = ("lrb", "zcfzb", "xjllb")
+
+
+def isolate(workdir):
+    """把所有本地存储 (行情库、各类缓存、指标文件) 指向 workdir，需在导入项目模块之前调用"""
+    for name, relative in (
+        ("BAR_STORE_DIR", "bars"), ("FINANCIAL_CACHE_DIR", "financials"), ("LLM_CACHE_PATH", "llm_cache.sqlite3"),
+        ("NOTICE_STORE_PATH", "notices.sqlite3"), ("INDUSTRY_INDEX_PATH", "industry_membership.parquet"),
+        ("SHARED_CACHE_PATH", "shared_cache.sqlite3"), ("STOCK_LIST_PATH", "stock_list.csv"), ("METRICS_PATH", "metrics.prom"),
+    ):
+        os.environ[name] = os.path.join(workdir, relative)
+
+
+def system_key(system_prompt):
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def exchange_symbol(code):
+    return ("sh" if code.startswith("6") else "bj" if code.startswith(("4", "8")) else "sz") + code
+
+
+# --- 录制 ---
+
+def market_calls(code, industry):
+    """(akshare 函数, symbol, kwargs)：个股研究页与后台预热会用到的全部调用"""
+    end = datetime.now().strftime("%Y%m%d")
+    start = (datetime.now() - timedelta(days=20 * 365)).strftime("%Y%m%d")
+    year = datetime.now().year
+    return [
+        ("stock_zh_a_spot_em", "*", {}),
+        ("stock_info_a_code_name", "*", {}),
+        ("stock_zh_index_spot_sina", "*", {}),
+        ("stock_board_industry_name_em", "*", {}),
+        ("stock_hsgt_fund_flow_summary_em", "*", {}),
+        ("tool_trade_date_hist_sina", "*", {}),
+        ("stock_individual_info_em", code, {"symbol": code}),
+        ("stock_financial_abstract", code, {"symbol": code}),
+        ("stock_research_report_em", code, {"symbol": code}),
+        ("stock_zh_a_daily", exchange_symbol(code), {"symbol": exchange_symbol(code), "start_date": start, "end_date": end, "adjust": "qfq"}),
+        ("stock_zh_a_hist", code, {"symbol": code, "period": "daily", "start_date": start, "end_date": end, "adjust": "qfq"}),
+        ("stock_board_industry_hist_em", industry, {"symbol": industry, "start_date": f"{year - 1}0101", "end_date": f"{year}1231", "period": "日k", "adjust": "qfq"}),
+    ]
+
+
+def record(code=DEFAULT_CODE, out=FIXTURE_DIR):
+    """联网录制一只股票所需的全部上游响应与一次 AI 团队分析的 LLM 回复"""
+    import akshare as ak
+    import requests
+    from guba_crawler import list_page_url, USER_AGENT
+    from notice_store import NOTICE_API, NOTICE_HEADERS, NOTICE_PAGE_SIZE
+
+    info = ak.stock_individual_info_em(symbol=code)
+    industry = info.loc[info['item'] == '行业', 'value'].iloc[0]
+    tables = {}
+    for func_name, symbol, kwargs in market_calls(code, industry):
+        print(f"录制 ak.{func_name}({symbol})")
+        tables.setdefault(func_name, {})[symbol] = getattr(ak, func_name)(**kwargs)
+    boards = tables["stock_board_industry_name_em"]["*"]['板块名称'].tolist()
+    for board in boards:
+        print(f"录制 ak.stock_board_industry_cons_em({board})")
+        tables.setdefault("stock_board_industry_cons_em", {})[board] = ak.stock_board_industry_cons_em(symbol=board)
+        time.sleep(0.2)
+
+    headers = {"User-Agent": USER_AGENT}
+    http = {"guba.html": requests.get(list_page_url(code), headers=headers, timeout=10).text}
+    params = {"page_index": 1, "page_size": NOTICE_PAGE_SIZE, "ann_type": "A", "client_source": "web",
+              "stock_list": code, "f_node": 1, "s_node": 1}
+    http["notices.json"] = requests.get(NOTICE_API, params=params, headers=NOTICE_HEADERS, timeout=10).text
+    from financial_cache import fetch_statement_em
+    for kind in STATEMENT_KINDS:
+        http[f"em_{kind}.json"] = json.dumps({"data": fetch_statement_em(code, kind).to_dict(orient="records")}, ensure_ascii=False)
+
+    save(out, tables, http, [], source="recorded", code=code)
+    # 以刚录制的数据回放上游，只有 LLM 走真实接口
+    replay = Replay(out)
+    replay.install(llm=False)
+    responses = record_llm(code, info.loc[info['item'] == '股票简称', 'value'].iloc[0])
+    with open(os.path.join(out, "llm", "responses.json"), "w", encoding="utf-8") as f:
+        json.dump(responses, f, ensure_ascii=False, indent=1)
+    print(f"夹具已保存到 {out}")
+
+
+def record_llm(code, name):
+    """运行一次 AI 团队分析，记录每位分析师的 LLM 回复"""
+    import llm_utils
+    from agents import build_team, run_agents
+    from investment_research import build_data_context
+
+    responses = []
+    chat = llm_utils.LLMClient.chat
+
+    def recording_chat(self, prompt, system_prompt="You are a helpful assistant.", temperature=0.7):
+        result = chat(self, prompt, system_prompt, temperature)
+        if result.ok:
+            responses.append({"system": system_key(system_prompt), "content": result.content, "usage": result.usage})
+        return result
+
+    llm_utils.LLMClient.chat = recording_chat
+    try:
+        data_context, _ = build_data_context(code, name)
+        for _ in run_agents(build_team(), name, code, data_context):
+            pass
+    finally:
+        llm_utils.LLMClient.chat = chat
+    return responses
+
+
+# --- 合成 ---
+
+def synthesize(code=DEFAULT_CODE, out=SYNTHETIC_DIR, stocks=5300, boards=86, seed=7):
+    """
+    生成与真实接口同结构、全市场规模的合成夹具 (无网络环境下使用)。
+    数据由固定随机种子生成，同一台机器上多次生成结果一致。
+    """
+    rng = np.random.default_rng(seed)
+    prefixes = rng.choice(["0", "3", "6"], stocks - 1)
+    codes = list(dict.fromkeys([code] + [f"{p}{i:05d}" for p, i in zip(prefixes, rng.choice(99999, stocks - 1, replace=False))]))
+    n = len(codes)
+    names = [f"股票{c}" for c in codes]
+    names[0] = "平安银行"
+    industries = ["银行"] + [f"行业{i:02d}" for i in range(1, boards)]
+    member_of = np.concatenate([[0], rng.integers(0, boards, n - 1)])
+    price = np.round(rng.lognormal(2.5, 0.8, n), 2)
+    pe = np.round(rng.normal(25, 30, n), 2)
+    spot = pd.DataFrame({
+        "序号": np.arange(1, n + 1), "代码": codes, "名称": names, "最新价": price,
+        "涨跌幅": np.round(rng.normal(0, 2, n), 2), "涨跌额": np.round(rng.normal(0, 0.3, n), 2),
+        "成交量": rng.integers(1e4, 1e7, n).astype(float), "成交额": np.round(rng.lognormal(18, 1.5, n), 0),
+        "振幅": np.round(rng.uniform(0, 8, n), 2), "最高": price * 1.02, "最低": price * 0.98, "今开": price, "昨收": price,
+        "量比": np.round(rng.uniform(0.3, 3, n), 2), "换手率": np.round(rng.uniform(0.1, 10, n), 2), "市盈率-动态": pe,
+        "市净率": np.round(rng.uniform(0.4, 10, n), 2), "总市值": np.round(rng.lognormal(23, 1.2, n), 0),
+        "流通市值": np.round(rng.lognormal(22.5, 1.2, n), 0), "涨速": np.round(rng.normal(0, 0.2, n), 2),
+        "5分钟涨跌": np.round(rng.normal(0, 0.3, n), 2), "60日涨跌幅": np.round(rng.normal(0, 15, n), 2),
+        "年初至今涨跌幅": np.round(rng.normal(0, 25, n), 2),
+    })
+    tables = {
+        "stock_zh_a_spot_em": {"*": spot},
+        "stock_info_a_code_name": {"*": pd.DataFrame({"code": codes, "name": names})},
+        "stock_zh_index_spot_sina": {"*": pd.DataFrame({
+            "代码": ["sh000001", "sz399001", "sz399006", "sh000688"], "名称": ["上证指数", "深证成指", "创业板指", "科创50"],
+            "最新价": [3300.0, 10500.0, 2100.0, 980.0], "涨跌额": [12.0, -30.0, 5.0, 3.0], "涨跌幅": [0.36, -0.28, 0.24, 0.31],
+        })},
+        "stock_board_industry_name_em": {"*": pd.DataFrame({
+            "排名": np.arange(1, boards + 1), "板块名称": industries, "板块代码": [f"BK{1000 + i}" for i in range(boards)],
+            "最新价": np.round(rng.uniform(500, 5000, boards), 2), "涨跌幅": np.round(rng.normal(0, 1.5, boards), 2),
+            "总市值": np.round(rng.lognormal(27, 1, boards), 0), "换手率": np.round(rng.uniform(0.3, 5, boards), 2),
+            "上涨家数": rng.integers(0, 80, boards), "下跌家数": rng.integers(0, 80, boards),
+            "领涨股票": rng.choice(names, boards), "领涨股票-涨跌幅": np.round(rng.uniform(0, 10, boards), 2),
+        })},
+        "stock_hsgt_fund_flow_summary_em": {"*": pd.DataFrame({
+            "交易日": [datetime.now().strftime("%Y-%m-%d")] * 4, "类型": ["沪港通", "沪港通", "深港通", "深港通"],
+            "板块": ["沪股通", "港股通(沪)", "深股通", "港股通(深)"], "资金方向": ["北向", "南向", "北向", "南向"],
+            "资金净流入": [12.3, 8.1, -4.2, 5.5], "指数涨跌幅": [0.36, -0.5, -0.28, -0.5],
+        })},
+        "tool_trade_date_hist_sina": {"*": pd.DataFrame({"trade_date": pd.bdate_range("1990-12-19", f"{datetime.now().year}-12-31").date})},
+        "stock_individual_info_em": {code: pd.DataFrame({
+            "item": ["股票代码", "股票简称", "总股本", "流通股", "总市值", "流通市值", "行业", "上市时间"],
+            "value": [code, "平安银行", 19405918198.0, 19405601653.0, float(spot.at[0, "总市值"]), float(spot.at[0, "流通市值"]), "银行", 19910403],
+        })},
+        "stock_research_report_em": {code: pd.DataFrame({
+            "序号": np.arange(1, 41), "股票代码": code, "股票简称": "平安银行", "报告名称": [f"研报{i}: 业绩稳健" for i in range(40)],
+            "东财评级": rng.choice(["买入", "增持", "中性"], 40), "机构": rng.choice(["中信证券", "华泰证券", "国泰君安"], 40),
+            "日期": pd.date_range(end=datetime.now(), periods=40, freq="7D").strftime("%Y-%m-%d")[::-1],
+            "报告PDF链接": [f"https://pdf.dfcfw.com/pdf/H3_{i}.pdf" for i in range(40)],
+        })},
+        "stock_board_industry_cons_em": {
+            industry: spot[member_of == i].reset_index(drop=True) for i, industry in enumerate(industries)
+        },
+    }
+    # 财务摘要: 约 80 个指标 x 100 个报告期，列为 YYYYMMDD
+    periods = quarter_ends(100).strftime("%Y%m%d")
+    indicators = ["营业总收入", "归母净利润", "扣非净利润", "毛利率", "净资产收益率(ROE)", "资产负债率", "每股收益", "每股净资产"]
+    indicators += [f"指标{i}" for i in range(80 - len(indicators))]
+    values = rng.lognormal(20, 2, (len(indicators), len(periods)))
+    abstract = pd.DataFrame(values, columns=periods)
+    abstract.insert(0, "指标", indicators)
+    abstract.insert(0, "选项", ["常用指标"] * 30 + ["每股指标"] * 20 + ["盈利能力"] * 30)
+    tables["stock_financial_abstract"] = {code: abstract}
+    # 20 年日线 (新浪与东方财富两种列名)
+    days = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=20 * 245)
+    close = np.round(10 * np.exp(np.cumsum(rng.normal(0, 0.02, len(days)))), 2)
+    volume = rng.integers(1e5, 1e7, len(days)).astype(float)
+    tables["stock_zh_a_daily"] = {exchange_symbol(code): pd.DataFrame({
+        "date": days.date, "open": close, "high": close * 1.01, "low": close * 0.99, "close": close,
+        "volume": volume, "amount": volume * close, "outstanding_share": 1.9e10, "turnover": volume / 1.9e10,
+    })}
+    tables["stock_zh_a_hist"] = {code: pd.DataFrame({
+        "日期": days.date, "股票代码": code, "开盘": close, "收盘": close, "最高": close * 1.01, "最低": close * 0.99,
+        "成交量": volume / 100, "成交额": volume * close, "振幅": 2.0, "涨跌幅": 0.1, "涨跌额": 0.01, "换手率": 0.5,
+    })}
+    hist_days = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=480)
+    level = np.round(1000 * np.exp(np.cumsum(rng.normal(0, 0.01, len(hist_days)))), 2)
+    tables["stock_board_industry_hist_em"] = {"银行": pd.DataFrame({
+        "日期": hist_days.strftime("%Y-%m-%d"), "开盘": level, "收盘": level, "最高": level * 1.01, "最低": level * 0.99,
+        "涨跌幅": 0.1, "涨跌额": 1.0, "成交量": 1e8, "成交额": 1e10, "振幅": 1.5, "换手率": 0.8,
+    })}
+
+    http = {"guba.html": synthesize_guba_page(rng), "notices.json": json.dumps({"data": {"list": [
+        {"art_code": f"AN{202600000000 + i}", "title": f"平安银行:关于第{i}次董事会决议的公告",
+         "notice_date": (datetime.now() - timedelta(days=3 * i)).strftime("%Y-%m-%d 00:00:00"),
+         "codes": [{"stock_code": code}], "columns": [{"column_name": rng.choice(["董事会决议", "年度报告", "临时公告"])}]}
+        for i in range(50)
+    ]}}, ensure_ascii=False)}
+    report_dates = quarter_ends(30).strftime("%Y-%m-%d 00:00:00")
+    for kind in STATEMENT_KINDS:
+        columns = [f"{kind.upper()}_ITEM_{i}" for i in range(150)]
+        rows = [dict(zip(columns, rng.lognormal(20, 2, len(columns)).round(2)), SECUCODE=f"{code}.SZ", REPORT_DATE=d) for d in report_dates]
+        http[f"em_{kind}.json"] = json.dumps({"data": rows}, ensure_ascii=False)
+
+    content = "## 分析结论\n" + "\n".join(f"- 要点{i}: 公司经营稳健，估值处于历史较低水平，需关注资产质量变化。" for i in range(12))
+    llm = [{"system": "*", "content": content, "usage": {"prompt_tokens": 900, "completion_tokens": 400}}]
+    save(out, tables, http, llm, source="synthetic", code=code)
+    print(f"合成夹具已保存到 {out}")
+
+
+def quarter_ends(count):
+    """最近 count 个已结束的季度末，新的在前"""
+    quarters = pd.period_range(end=pd.Period(pd.Timestamp.now(), "Q") - 1, periods=count, freq="Q")
+    return quarters.end_time.normalize()[::-1]
+
+
+def synthesize_guba_page(rng, posts=80):
+    rows = []
+    for i in range(posts):
+        reads = f"{rng.uniform(1, 9):.1f}万" if i % 7 == 0 else str(rng.integers(10, 9999))
+        when = (datetime.now() - timedelta(hours=3 * i)).strftime("%m-%d %H:%M")
+        rows.append(
+            f'<tr class="listitem"><td><div class="read">{reads}</div></td><td><div class="reply">{rng.integers(0, 500)}</div></td>'
+            f'<td><div class="title"><a href="/news,000001,{1400000000 + i}.html" title="帖子{i}">帖子标题{i} 关于平安银行的看法</a>'
+            f'<em class="icon"></em></div></td><td><div class="author"><a href="//i.eastmoney.com/{i}">股友{i}</a></div></td>'
+            f'<td><div class="update">{when}</div></td></tr>'
+        )
+    return ('<html><head><title>平安银行吧</title></head><body><div class="listbody"><table class="default_list"><tbody>'
+            + "\n".join(rows) + "</tbody></table></div></body></html>")
+
+
+# --- 存取 ---
+
+def save(out, tables, http, llm, source, code):
+    for sub in ("ak", "http", "llm"):
+        os.makedirs(os.path.join(out, sub), exist_ok=True)
+    for func_name, by_symbol in tables.items():
+        pd.to_pickle(by_symbol, os.path.join(out, "ak", f"{func_name}.pkl"))
+    for name, text in http.items():
+        with open(os.path.join(out, "http", name), "w", encoding="utf-8") as f:
+            f.write(text)
+    with open(os.path.join(out, "llm", "responses.json"), "w", encoding="utf-8") as f:
+        json.dump(llm, f, ensure_ascii=False, indent=1)
+    with open(os.path.join(out, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"source": source, "code": code, "created": datetime.now().isoformat(timespec="seconds")}, f, ensure_ascii=False, indent=1)
+
+
+def load_manifest(path):
+    with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def locate_fixtures(path=None):
+    """
+    要使用的夹具目录: 指定的目录，否则录制的 benchmarks/fixtures/，
+    都没有时生成 (或复用) 合成夹具
+    """
+    if path:
+        return path
+    if os.path.exists(os.path.join(FIXTURE_DIR, "manifest.json")):
+        return FIXTURE_DIR
+    if not os.path.exists(os.path.join(SYNTHETIC_DIR, "manifest.json")):
+        synthesize(out=SYNTHETIC_DIR)
+    return SYNTHETIC_DIR
+
+
+# --- 回放 ---
+
+class Replay:
+    """
+    以夹具回放全部上游: akshare 函数按 symbol 返回录制的 DataFrame (副本)，
+    requests 的 GET 按 URL 返回录制的响应体，LLM 由本地 OpenAI 兼容服务回放录制的回复。
+    """
+
+    def __init__(self, path=FIXTURE_DIR):
+        self.path = path
+        self.tables = {
+            name[:-4]: pd.read_pickle(os.path.join(path, "ak", name))
+            for name in os.listdir(os.path.join(path, "ak")) if name.endswith(".pkl")
+        }
+        self.http = {}
+        for name in os.listdir(os.path.join(path, "http")):
+            with open(os.path.join(path, "http", name), encoding="utf-8") as f:
+                self.http[name] = f.read()
+        with open(os.path.join(path, "llm", "responses.json"), encoding="utf-8") as f:
+            self.llm = json.load(f)
+        self._server = None
+
+    def ak_function(self, func_name):
+        by_symbol = self.tables[func_name]
+
+        def replay(*args, **kwargs):
+            symbol = kwargs.get("symbol", args[0] if args else "*")
+            df = by_symbol.get(symbol, by_symbol.get("*"))
+            if df is None:
+                # 未录制的 symbol (如其他行业的成分股): 返回同结构的空表
+                df = next(iter(by_symbol.values())).iloc[:0]
+            return df.copy()
+        replay.__name__ = func_name
+        return replay
+
+    def response(self, url):
+        if "guba.eastmoney.com" in url:
+            return ReplayResponse(self.http["guba.html"])
+        if "np-anotice-stock" in url or "anotice" in url:
+            return ReplayResponse(self.http["notices.json"])
+        for kind in STATEMENT_KINDS:
+            if f"/{kind}Ajax" in url:
+                return ReplayResponse(self.http[f"em_{kind}.json"])
+        return ReplayResponse("", status_code=404)
+
+    def llm_reply(self, system_prompt):
+        key = system_key(system_prompt)
+        for item in self.llm:
+            if item["system"] in (key, "*"):
+                return item
+        return self.llm[0] if self.llm else {"content": "", "usage": {}}
+
+    def start_llm_server(self):
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                item = replay.llm_reply(body["messages"][0]["content"])
+                if body.get("stream"):
+                    chunks = [item["content"][i:i + 16] for i in range(0, len(item["content"]), 16)]
+                    events = [json.dumps({"choices": [{"delta": {"content": c}}]}, ensure_ascii=False) for c in chunks]
+                    events.append(json.dumps({"choices": [], "usage": item.get("usage", {})}))
+                    payload = "".join(f"data: {e}\n\n" for e in events + ["[DONE]"]).encode("utf-8")
+                    content_type = "text/event-stream"
+                else:
+                    payload = json.dumps({"choices": [{"message": {"content": item["content"]}}], "usage": item.get("usage", {})},
+                                         ensure_ascii=False).encode("utf-8")
+                    content_type = "application/json"
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1/"
+
+    def install(self, llm=True):
+        """
+        替换 akshare 函数与 requests 的 GET；llm=True 时启动 LLM 回放服务并设置 QWEN_BASE_URL
+        (需在导入 llm_utils 之前调用)
+        """
+        import akshare as ak
+        import requests
+
+        for func_name in self.tables:
+            setattr(ak, func_name, self.ak_function(func_name))
+        requests.get = lambda url, *args, **kwargs: self.response(url)
+        requests.Session.get = lambda session, url, *args, **kwargs: self.response(url)
+        if llm:
+            os.environ["QWEN_BASE_URL"] = self.start_llm_server()
+        return self
+
+
+class ReplayResponse:
+    """requests.Response 的最小替身 (text / content / json / status_code / raise_for_status)"""
+
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.content = text.encode("utf-8")
+        self.status_code = status_code
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"HTTP {self.status_code}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="录制或合成基准测试夹具")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--record", action="store_true", help="联网录制真实数据")
+    group.add_argument("--synthesize", action="store_true", help="生成合成数据")
+    parser.add_argument("--code", default=DEFAULT_CODE, help=f"录制的股票代码 (默认 {DEFAULT_CODE})")
+    parser.add_argument("--out", help=f"夹具目录 (默认录制到 {FIXTURE_DIR}，合成到 {SYNTHETIC_DIR})")
+    args = parser.parse_args(argv)
+    sys.path.insert(0, ROOT)
+    if args.record:
+        import tempfile
+        isolate(tempfile.mkdtemp(prefix="robo-record-"))
+        record(args.code, args.out or FIXTURE_DIR)
+    else:
+        synthesize(args.code, args.out or SYNTHETIC_DIR)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+股吧列表页解析耗时对比: 原 BeautifulSoup(html.parser) 实现 vs guba_crawler.parse_list_page (lxml)
+
+用法:
+    python benchmarks/guba_parse.py                         # 使用夹具中的页面 (见 benchmarks/fixtures.py)
+    python benchmarks/guba_parse.py --code 600000          # 抓取一页实时页面后对比
+    python benchmarks/guba_parse.py --file page.html -n 50  # 使用保存的页面
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+from bs4 import BeautifulSoup
+from guba_crawler import parse_list_page, list_page_url, USER_AGENT
+from fixtures import Replay, locate_fixtures
+
+
+def legacy_parse(page_html):
+    """原 get_guba_comments 的解析部分 (逐条兼容新旧两种结构，按标题去重取前 20)"""
+    soup = BeautifulSoup(page_html, 'html.parser')
+    items = soup.find_all('tr', class_='listitem')
+    if not items:
+        items = soup.find_all('div', class_='article-h')
+    comments_list = []
+    for item in items:
+        if item.name == 'tr':
+            cells = [item.find('div', class_=c) for c in ('read', 'reply', 'title', 'author', 'update')]
+        else:
+            cells = [item.find(class_=c) for c in ('l1', 'l2', 'l3', 'l4', 'l5')]
+        read_div, reply_div, title_div, author_div, update_div = cells
+        if title_div and title_div.a:
+            href = title_div.a['href']
+            comments_list.append({
+                "标题": title_div.a.get_text(strip=True),
+                "链接": "https://guba.eastmoney.com" + href if href.startswith("/") else href,
+                "阅读": read_div.get_text(strip=True) if read_div else "0",
+                "评论": reply_div.get_text(strip=True) if reply_div else "0",
+                "作者": author_div.get_text(strip=True) if author_div else "未知作者",
+                "时间": update_div.get_text(strip=True) if update_div else "",
+            })
+    seen, unique = set(), []
+    for item in comments_list:
+        if item['标题'] not in seen:
+            seen.add(item['标题'])
+            unique.append(item)
+    return unique[:20]
+
+
+def time_parser(func, page_html, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(page_html)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), len(result)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="股吧列表页解析耗时对比")
+    parser.add_argument("--file", help="本地保存的股吧列表页 HTML")
+    parser.add_argument("--code", help="抓取该股票的第一页实时页面 (默认使用夹具中的页面)")
+    parser.add_argument("-n", "--repeat", type=int, default=20, help="每种解析器重复次数 (默认 20)")
+    args = parser.parse_args(argv)
+
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            page_html = f.read()
+    elif args.code:
+        page_html = requests.get(list_page_url(args.code), headers={"User-Agent": USER_AGENT}, timeout=10).text
+    else:
+        page_html = Replay(locate_fixtures()).http["guba.html"]
+
+    legacy_ms, legacy_posts = time_parser(legacy_parse, page_html, args.repeat)
+    lxml_ms, lxml_posts = time_parser(parse_list_page, page_html, args.repeat)
+    print(f"页面大小: {len(page_html) / 1024:.1f} KB，重复 {args.repeat} 次取中位数")
+    print(f"BeautifulSoup(html.parser): {legacy_ms:7.2f} ms/页  ({legacy_posts} 条，截取前 20)")
+    print(f"lxml parse_list_page:       {lxml_ms:7.2f} ms/页  ({lxml_posts} 条，含类型转换)")
+    print(f"加速比: {legacy_ms / lxml_ms:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+离线性能基准套件
+
+以录制 (或合成) 的夹具回放全部上游数据与 LLM 回复，对数据整理路径计时，并与
+基准线 benchmarks/baseline.json 比较: 任一项的中位耗时比基准线慢超过容忍度
+(且绝对差超过 --floor-ms) 即以退出码 1 结束，可直接用于 CI。
+
+用法:
+    python benchmarks/run.py                      # 运行并与基准线比较
+    python benchmarks/run.py --update-baseline    # 运行并把结果写为新的基准线
+    python benchmarks/run.py --only guba_parse,peer_ranking -n 20
+    python benchmarks/run.py --fixtures path/to/fixtures --tolerance 0.5
+
+基准线只在同一台机器、同一套夹具上可比；更换 CI 机器或重新录制夹具后请先 --update-baseline。
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import platform
+import statistics
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import Replay, isolate, locate_fixtures, load_manifest
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+DEFAULT_TOLERANCE = 0.3
+DEFAULT_FLOOR_MS = 1.0
+
+BENCHMARKS = {}
+
+
+def benchmark(name, repeat=None):
+    """登记一个基准: setup(env) 返回要计时的无参函数；repeat 覆盖默认重复次数"""
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, repeat)
+        return setup
+    return decorator
+
+
+class Env:
+    """基准共用的夹具数据与已导入的项目模块"""
+
+    def __init__(self, replay, manifest):
+        self.replay = replay
+        self.code = manifest["code"]
+        self.ak = replay.tables
+
+    def table(self, func_name, symbol="*"):
+        by_symbol = self.ak[func_name]
+        return by_symbol.get(symbol, by_symbol.get("*")).copy()
+
+
+@benchmark("safe_dataframe")
+def bench_safe_dataframe(env):
+    from investment_research import safe_dataframe
+    frames = [env.table("stock_zh_a_spot_em"), env.table("stock_financial_abstract", env.code),
+              env.table("stock_research_report_em", env.code)]
+    return lambda: [safe_dataframe(df) for df in frames]
+
+
+@benchmark("peer_ranking")
+def bench_peer_ranking(env):
+    import pandas as pd
+    from spot_service import SpotService
+    from industry import build_rank_table
+    spot = SpotService._prepare(env.table("stock_zh_a_spot_em"))
+    membership = pd.concat(
+        [pd.DataFrame({'代码': df['代码'].astype(str).values, '行业': board}) for board, df in env.ak["stock_board_industry_cons_em"].items()],
+        ignore_index=True,
+    ).drop_duplicates('代码')
+
+    def run():
+        table = build_rank_table(spot, membership)
+        groups = table.groupby('行业', sort=False).indices
+        return table.iloc[groups[table.at[env.code, '行业']]]
+    return run
+
+
+@benchmark("financial_transpose")
+def bench_financial_transpose(env):
+    from investment_research import transpose_financial_abstract
+    abstract = env.table("stock_financial_abstract", env.code)
+    return lambda: transpose_financial_abstract(abstract)
+
+
+@benchmark("guba_parse")
+def bench_guba_parse(env):
+    from guba_crawler import parse_list_page
+    page = env.replay.http["guba.html"]
+    return lambda: parse_list_page(page)
+
+
+@benchmark("data_context", repeat=5)
+def bench_data_context(env):
+    from investment_research import build_data_context
+    name = env.table("stock_individual_info_em", env.code).set_index('item')['value'].get('股票简称', env.code)
+    build_data_context(env.code, name)  # 首次运行写入本地行情库与各类缓存，计时的是稳态
+    return lambda: build_data_context(env.code, name)
+
+
+@benchmark("prompt_compaction")
+def bench_prompt_compaction(env):
+    from investment_research import build_data_context
+    from agents import build_team
+    from context_compactor import compact_context
+    data_context, _ = build_data_context(env.code, env.code)
+    team = build_team()
+    return lambda: [compact_context(data_context, agent.context_keys, agent.token_budget) for agent in team]
+
+
+@benchmark("agent_team", repeat=5)
+def bench_agent_team(env):
+    from investment_research import build_data_context
+    from agents import build_team, run_agents
+    data_context, _ = build_data_context(env.code, env.code)
+
+    def run():
+        results = list(run_agents(build_team(), env.code, env.code, data_context))
+        errors = [error for _, _, error, _ in results if error]
+        if errors:
+            raise errors[0]
+        return results
+    return run
+
+
+@benchmark("stock_research_render", repeat=5)
+def bench_stock_research_render(env):
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(os.path.join(ROOT, "investment_research.py"), default_timeout=120)
+    app.run()
+    app.sidebar.radio[0].set_value("个股研究").run()
+    app.session_state["research_code"] = env.code
+
+    def run():
+        app.run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+        return app
+    run()
+    return run
+
+
+def quiet(func):
+    """运行 func，屏蔽项目代码的 print 与 Streamlit 裸模式/弃用提示；出错时先输出被屏蔽的内容"""
+    from streamlit import logger as st_logger
+    captured = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(captured):
+            st_logger.set_log_level("error")
+            return func()
+    except Exception:
+        sys.stdout.write(captured.getvalue())
+        raise
+
+
+def measure(func, repeat):
+    """先运行一次预热 (不计时)，再计时 repeat 次；返回每次耗时 (毫秒)"""
+    func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def compare(results, baseline, tolerance, floor_ms):
+    """(名称, 当前中位数, 基准线中位数, 变化比例, 是否退化) 列表"""
+    rows = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            rows.append((name, result["median_ms"], None, None, False))
+            continue
+        change = result["median_ms"] / base["median_ms"] - 1 if base["median_ms"] else 0.0
+        regressed = change > tolerance and result["median_ms"] - base["median_ms"] > floor_ms
+        rows.append((name, result["median_ms"], base["median_ms"], change, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="离线性能基准套件")
+    parser.add_argument("--fixtures", help="夹具目录 (默认: 录制的 benchmarks/fixtures/，否则合成夹具)")
+    parser.add_argument("--only", help="只运行这些基准 (逗号分隔): " + ", ".join(BENCHMARKS))
+    parser.add_argument("-n", "--repeat", type=int, default=15, help="每项计时次数 (默认 15，较慢的项为 5)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="基准线文件")
+    parser.add_argument("--update-baseline", action="store_true", help="把本次结果写为基准线")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="允许的变慢比例 (默认 0.3 即 30%%)")
+    parser.add_argument("--floor-ms", type=float, default=DEFAULT_FLOOR_MS, help="小于该绝对差 (毫秒) 的变慢不算退化")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.only.split(",")] if args.only else list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的基准: {', '.join(unknown)}")
+
+    # 本地存储指向临时目录，夹具回放须在导入项目模块之前安装
+    isolate(tempfile.mkdtemp(prefix="robo-bench-"))
+    os.environ.update({"LLM_CACHE": "0", "GUBA_MIN_INTERVAL": "0", "UPSTREAM_RATE": "1000000", "UPSTREAM_BURST": "1000000"})
+    fixture_dir = locate_fixtures(args.fixtures)
+    manifest = load_manifest(fixture_dir)
+    replay = Replay(fixture_dir).install()
+    env = Env(replay, manifest)
+    print(f"夹具: {fixture_dir} ({manifest['source']}, {manifest['code']}, {manifest['created']})")
+
+    results = {}
+    for name in names:
+        setup, repeat = BENCHMARKS[name]
+        repeat = min(repeat, args.repeat) if repeat else args.repeat
+        samples = quiet(lambda: measure(setup(env), repeat))
+        results[name] = {
+            "median_ms": round(statistics.median(samples), 3),
+            "min_ms": round(min(samples), 3),
+            "repeat": repeat,
+        }
+        print(f"{name:<24} 中位 {results[name]['median_ms']:10.2f} ms   最快 {results[name]['min_ms']:10.2f} ms   ({repeat} 次)")
+
+    if args.update_baseline:
+        baseline = {"fixtures": manifest["source"], "code": manifest["code"], "python": platform.python_version(),
+                    "machine": platform.machine(), "updated": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+        if os.path.exists(args.baseline) and args.only:
+            # 只运行了部分基准时保留其余项的基准线
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline["results"] = dict(json.load(f).get("results", {}), **results)
+        with open(args.baseline + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=1)
+        os.replace(args.baseline + ".tmp", args.baseline)
+        print(f"基准线已更新: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("没有基准线文件，请先运行 --update-baseline")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("fixtures") != manifest["source"]:
+        print(f"基准线使用的是 {baseline.get('fixtures')} 夹具，本次为 {manifest['source']}，不作比较")
+        return 0
+
+    print(f"\n与基准线比较 (容忍 +{args.tolerance:.0%}，绝对差 > {args.floor_ms} ms 才算退化):")
+    regressions = 0
+    for name, current, base, change, regressed in compare(results, baseline, args.tolerance, args.floor_ms):
+        if base is None:
+            print(f"  {name:<24} {current:10.2f} ms   (基准线中无此项)")
+            continue
+        regressions += regressed
+        print(f"  {name:<24} {current:10.2f} ms   基准 {base:10.2f} ms   {change:+7.1%}  {'退化' if regressed else 'ok'}")
+    if regressions:
+        print(f"\n{regressions} 项性能退化")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from indicators import compute_indicators, TAIL_WINDOW
+
+# Payload limits per chart (env overrides): candles drawn, points per line trace
+CHART_MAX_CANDLES = int(os.getenv("CHART_MAX_CANDLES", "400"))
+CHART_MAX_LINE_POINTS = int(os.getenv("CHART_MAX_LINE_POINTS", "800"))
+
+# Visible range -> calendar days (None = all stored history)
+CHART_RANGES = {'3个月': 91, '6个月': 182, '1年': 365, '3年': 3 * 365, '5年': 5 * 365, '全部': None}
+# Bar period -> (label, pandas period frequency, calendar days per bar)
+PERIODS = {'D': ('日K', None, 1.5), 'W': ('周K', 'W-FRI', 7), 'M': ('月K', 'M', 31)}
+TRADING_DAYS_PER_YEAR = 245
+HISTORY_START = "19900101"
+
+MA_COLORS = {'MA5': 'orange', 'MA10': 'purple', 'MA20': 'blue', 'MA60': 'green'}
+
+
+def choose_period(trading_days, max_candles=CHART_MAX_CANDLES):
+    """The finest of D / W / M that shows `trading_days` in at most `max_candles` candles."""
+    if trading_days <= max_candles:
+        return 'D'
+    if trading_days / 5 <= max_candles:
+        return 'W'
+    return 'M'
+
+
+def fit_period(trading_days, period='auto', max_candles=CHART_MAX_CANDLES):
+    """
+    `period` ('auto' or a forced D / W / M), moved to a coarser one when
+    the forced period would need more than `max_candles` candles.
+    """
+    fitting = choose_period(trading_days, max_candles)
+    if period == 'auto' or list(PERIODS).index(period) < list(PERIODS).index(fitting):
+        return fitting
+    return period
+
+
+def history_start(range_days, period, now=None):
+    """
+    First date (YYYYMMDD) to load for a visible range of `range_days`
+    calendar days, with TAIL_WINDOW extra bars so MA60 etc. are warmed up
+    at the left edge. `period` may be 'auto'.
+    """
+    if range_days is None:
+        return HISTORY_START
+    period = fit_period(range_days * TRADING_DAYS_PER_YEAR / 365, period)
+    now = now or datetime.now()
+    warmup = TAIL_WINDOW * PERIODS[period][2]
+    return (now - timedelta(days=range_days + warmup)).strftime("%Y%m%d")
+
+
+def resample_ohlc(bars, period):
+    """Daily bars (bar_store schema) -> weekly ('W') or monthly ('M') OHLC, dated by each period's last trading day."""
+    freq = PERIODS[period][1]
+    if freq is None or bars.empty:
+        return bars
+    agg = {'日期': 'last', '开盘': 'first', '最高': 'max', '最低': 'min', '收盘': 'last', '成交量': 'sum'}
+    if '成交额' in bars.columns:
+        agg['成交额'] = 'sum'
+    keys = pd.to_datetime(bars['日期']).dt.to_period(freq)
+    return bars.groupby(keys.values, sort=True).agg(agg).reset_index(drop=True)
+
+
+def lttb(y, threshold, x=None):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Returns the indices of at most `threshold` points of `y` that keep its
+    visual shape (first and last points always kept).
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=float) if x is None else np.asarray(x, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    picked = np.empty(threshold, dtype=int)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        picked[i + 1] = a
+    return picked
+
+
+def downsample(dates, values, max_points=CHART_MAX_LINE_POINTS):
+    """(dates, values) of one line trace, NaNs dropped and LTTB-downsampled to max_points."""
+    values = np.asarray(values, dtype=float)
+    mask = ~np.isnan(values)
+    dates, values = np.asarray(dates)[mask], values[mask]
+    keep = lttb(values, max_points)
+    return dates[keep], values[keep]
+
+
+def prepare_chart(bars, range_days, period='auto', daily_indicators=None, max_candles=CHART_MAX_CANDLES):
+    """
+    Bars and indicators to draw for one visible range.
+
+    `bars` are daily bars that include the warm-up history (see
+    `history_start`). They are aggregated to the chosen period first, so
+    indicators are those of the weekly / monthly chart, then cut to the
+    visible range. For a daily chart, `daily_indicators` (indexed by date,
+    e.g. from IndicatorCache) are used instead of recomputing.
+
+    A forced period that would need more than `max_candles` candles is
+    moved to a coarser one (see `fit_period`); if even monthly bars are too
+    many, only the latest `max_candles` are kept.
+    Returns (bars, indicators, period, clipped).
+    """
+    if bars.empty:
+        return bars, pd.DataFrame(), 'D', False
+    dates = pd.to_datetime(bars['日期'])
+    visible_from = dates.iloc[-1] - timedelta(days=range_days) if range_days else dates.iloc[0]
+    period = fit_period(int((dates >= visible_from).sum()), period, max_candles)
+    shown = resample_ohlc(bars, period)
+    if period == 'D' and daily_indicators is not None:
+        ind = daily_indicators.reindex(pd.to_datetime(shown['日期'])).reset_index(drop=True)
+    else:
+        ind = compute_indicators(shown)
+    visible = (pd.to_datetime(shown['日期']) >= visible_from).to_numpy(copy=True)
+    clipped = int(visible.sum()) > max_candles
+    if clipped:
+        visible[:len(visible) - max_candles] = False
+    return shown[visible].reset_index(drop=True), ind[visible].reset_index(drop=True), period, clipped
+
+
+def _line(dates, values, name, **line):
+    x, y = downsample(dates, values)
+    return go.Scattergl(x=x, y=y, mode='lines', name=name, line=dict(width=1, **line))
+
+
+def price_figure(bars, ind, overlays, title):
+    """Candles plus MA / Bollinger overlays (WebGL line traces)."""
+    dates = bars['日期'].values
+    fig = go.Figure()
+    fig.add_trace(go.Candlestick(
+        x=dates, open=bars['开盘'], high=bars['最高'], low=bars['最低'], close=bars['收盘'], name='K线'
+    ))
+    for name in overlays:
+        if name in MA_COLORS:
+            fig.add_trace(_line(dates, ind[name], name, color=MA_COLORS[name]))
+    if "BOLL" in overlays:
+        for col, label in (('BOLL_UP', '布林上轨'), ('BOLL_MID', '布林中轨'), ('BOLL_LOW', '布林下轨')):
+            fig.add_trace(_line(dates, ind[col], label, color='gray', dash='dot'))
+    fig.update_layout(xaxis_rangeslider_visible=False, height=500, title_text=title, yaxis_title="价格", dragmode='pan')
+    return fig
+
+
+def volume_figure(bars, ind):
+    dates = bars['日期'].values
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=dates, y=bars['成交量'], name='成交量', marker_color='lightblue'))
+    fig.add_trace(_line(dates, ind['VMA5'], 'VMA5', color='orange'))
+    fig.add_trace(_line(dates, ind['VMA10'], 'VMA10', color='blue'))
+    fig.update_layout(height=200, title_text="成交量", margin=dict(t=30))
+    return fig
+
+
+def indicator_figure(bars, ind, sub_indicator):
+    """Sub-chart for MACD / RSI / KDJ / ATR / OBV."""
+    dates = bars['日期'].values
+    fig = go.Figure()
+    if sub_indicator == "MACD":
+        colors = np.where(ind['MACD'].fillna(0) >= 0, 'red', 'green')
+        fig.add_trace(go.Bar(x=dates, y=ind['MACD'], name='MACD', marker_color=colors))
+        fig.add_trace(_line(dates, ind['DIF'], 'DIF', color='orange'))
+        fig.add_trace(_line(dates, ind['DEA'], 'DEA', color='blue'))
+    elif sub_indicator == "RSI":
+        fig.add_trace(_line(dates, ind['RSI14'], 'RSI14', color='purple'))
+        fig.add_hline(y=70, line_dash='dot', line_color='red')
+        fig.add_hline(y=30, line_dash='dot', line_color='green')
+    elif sub_indicator == "KDJ":
+        for col, color in (('K', 'orange'), ('D', 'blue'), ('J', 'purple')):
+            fig.add_trace(_line(dates, ind[col], col, color=color))
+    else:
+        col = 'ATR14' if sub_indicator == "ATR" else 'OBV'
+        fig.add_trace(_line(dates, ind[col], col, color='teal'))
+    fig.update_layout(height=220, title_text=sub_indicator, margin=dict(t=30))
+    return fig
@@ -0,0 +1,142 @@
+import os
+import re
+
+# Prompt budget per agent, in estimated tokens (env overrides)
+AGENT_CONTEXT_TOKENS = int(os.getenv("AGENT_CONTEXT_TOKENS", "1500"))
+CONTEXT_COMPACTION = os.getenv("CONTEXT_COMPACTION", "1") != "0"
+MAX_TABLE_COLUMNS = int(os.getenv("CONTEXT_MAX_COLUMNS", "8"))
+
+# Qwen-style tokenization estimate: one token per CJK character, digit or
+# symbol, about four letters per token, and one per whitespace run
+_TOKEN_RE = re.compile(r"[㐀-鿿豈-﫿]|\d|[A-Za-z]+|\s+|[^\sA-Za-z\d]")
+_FLOAT_RE = re.compile(r"^-?\d+(\.\d+)?(e[+-]?\d+)?$", re.IGNORECASE)
+
+
+def count_tokens(text):
+    """Estimated prompt tokens of `text` (no tokenizer download needed)."""
+    if not text:
+        return 0
+    tokens = 0
+    for piece in _TOKEN_RE.findall(str(text)):
+        tokens += -(-len(piece) // 4) if piece[0].isascii() and piece[0].isalpha() else 1
+    return tokens
+
+
+def compact_number(text):
+    """'12345678901.0' -> '123.5亿', '0.123456' -> '0.1235'; integers, codes and dates stay as they are."""
+    if not _FLOAT_RE.match(text) or not any(c in text for c in ".eE"):
+        return text
+    value = float(text)
+    for unit, scale in (("亿", 1e8), ("万", 1e4)):
+        if abs(value) >= scale:
+            return f"{value / scale:.4g}{unit}"
+    return f"{value:.4g}"
+
+
+def _parse_table(lines):
+    rows = [[cell.strip() for cell in line.strip().strip("|").split("|")] for line in lines]
+    # Drop the |---|:---:| separator line under the header
+    rows = [rows[0]] + [r for r in rows[1:] if not all(set(c) <= set("-: ") for c in r)]
+    header, body = rows[0], rows[1:]
+    keep = []
+    for i, name in enumerate(header):
+        values = [r[i] if i < len(r) else "" for r in body]
+        if not name and all(v.isdigit() for v in values):
+            continue  # the DataFrame's default index
+        if all(v in ("", "nan", "None", "NaN") for v in values):
+            continue
+        if len(body) > 1 and len(set(values)) == 1 and i < len(header) - 1:
+            continue  # constant column, e.g. 选项 = 常用指标
+        keep.append(i)
+    header = [header[i] for i in keep]
+    body = [[compact_number(r[i]) if i < len(r) else "" for i in keep] for r in body]
+    return header, body
+
+
+def _blocks(text):
+    """Split a section into ('text', line) and ('table', header, rows) blocks, in order."""
+    blocks, table = [], []
+    for line in str(text).splitlines() + [""]:
+        if line.lstrip().startswith("|"):
+            table.append(line)
+            continue
+        if table:
+            blocks.append(("table",) + _parse_table(table))
+            table = []
+        if line.strip():
+            blocks.append(("text", line.strip()))
+    return blocks
+
+
+def _render_table(header, rows, columns):
+    return ["|".join(header[:columns])] + ["|".join(r[:columns]) for r in rows]
+
+
+def compact_section(text, budget=None):
+    """
+    Dense version of one data_context section under `budget` tokens.
+
+    Markdown tables lose their padding, default index, empty and constant
+    columns, and long floats become 亿/万 figures. If that is still over
+    budget, text lines are kept first (they are summaries), then table
+    columns beyond MAX_TABLE_COLUMNS and finally trailing rows are cut:
+    callers put the most important rows and columns (latest periods,
+    largest peers) first.
+    """
+    budget = float("inf") if budget is None else budget
+    blocks = _blocks(text)
+    lines = [b[1] for b in blocks if b[0] == "text"]
+    used = sum(count_tokens(line) + 1 for line in lines)
+    if used > budget:
+        kept, used = [], 0
+        for line in lines:
+            cost = count_tokens(line) + 1
+            if used + cost > budget:
+                break
+            kept.append(line)
+            used += cost
+        return "\n".join(kept)
+    out = list(lines)
+    for block in blocks:
+        if block[0] != "table":
+            continue
+        _, header, rows = block
+        columns = min(len(header), MAX_TABLE_COLUMNS)
+        rendered = _render_table(header, rows, columns)
+        while len(rendered) > 1 and used + sum(count_tokens(r) + 1 for r in rendered) > budget:
+            if len(rendered) > 2:
+                rendered.pop()
+            elif columns > 2:
+                columns -= 1
+                rendered = _render_table(header, rows[:1], columns)
+            else:
+                break
+        omitted = len(rows) - (len(rendered) - 1)
+        if omitted > 0:
+            rendered.append(f"(另有 {omitted} 行省略)")
+        used += sum(count_tokens(r) + 1 for r in rendered)
+        out.extend(rendered)
+    return "\n".join(out)
+
+
+def compact_context(data_context, keys, budget=AGENT_CONTEXT_TOKENS):
+    """
+    Compact the `keys` sections of data_context to share `budget` tokens.
+
+    Sections that already fit get what they need; what they leave over is
+    split evenly among the larger ones. Other keys are passed through.
+    """
+    compacted = dict(data_context)
+    dense = {key: compact_section(data_context[key]) for key in keys if key in data_context}
+    need = {key: count_tokens(text) for key, text in dense.items()}
+    remaining, pending = budget, sorted(need, key=need.get)
+    while pending:
+        share = remaining // len(pending)
+        key = pending.pop(0)
+        if need[key] <= share:
+            compacted[key] = dense[key]
+            remaining -= need[key]
+        else:
+            compacted[key] = compact_section(data_context[key], share)
+            remaining -= count_tokens(compacted[key])
+    return compacted
@@ -0,0 +1,134 @@
+import os
+import time
+import threading
+from concurrent.futures import Future
+import pandas as pd
+
+from metrics import get_metrics
+
+# How long a loaded result is reused, in seconds (env override)
+DATA_LOADER_TTL = float(os.getenv("DATA_LOADER_TTL", "120"))
+DATA_LOADER_MAX_ENTRIES = int(os.getenv("DATA_LOADER_MAX_ENTRIES", "2048"))
+
+
+def _private_copy(value):
+    """Hand each caller its own DataFrame so in-place edits cannot leak between them."""
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(_private_copy(v) for v in value)
+    return value
+
+
+class DataLoader:
+    """
+    Process-wide memoizing loader with single-flight semantics.
+
+    Results are keyed by (source, args, kwargs) and reused for `ttl`
+    seconds, so the several places one page render asks for the same data
+    trigger one upstream call. Identical requests that arrive while a call is
+    in flight, from any session, wait for that call instead of issuing their
+    own. Exceptions are propagated to every waiter and never memoized.
+
+    Hits and merged waits are recorded in the metrics under `source`, tagged
+    with `metric_symbol`; a miss only counts as a cache lookup, because the
+    call it makes is recorded by the layer below (Upstream).
+    """
+
+    def __init__(self, ttl=DATA_LOADER_TTL, max_entries=DATA_LOADER_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memo = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.upstream_calls = 0
+        self.memo_hits = 0
+        self.merged = 0
+
+    @staticmethod
+    def make_key(source, args, kwargs):
+        return (source, args, tuple(sorted(kwargs.items())))
+
+    def load(self, source, func, *args, metric_symbol=None, **kwargs):
+        key = self.make_key(source, args, kwargs)
+        start = time.perf_counter()
+        now = time.time()
+        with self._lock:
+            entry = self._memo.get(key)
+            if entry is not None and entry[1] > now:
+                self.memo_hits += 1
+                get_metrics().record(source, time.perf_counter() - start, "ok", "hit", metric_symbol)
+                return _private_copy(entry[0])
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.upstream_calls += 1
+            else:
+                self.merged += 1
+
+        if not leader:
+            try:
+                value = future.result()
+            except Exception:
+                get_metrics().record(source, time.perf_counter() - start, "error", "merged", metric_symbol)
+                raise
+            get_metrics().record(source, time.perf_counter() - start, "ok", "merged", metric_symbol)
+            return _private_copy(value)
+
+        get_metrics().record_lookup(source, "miss")
+        try:
+            value = func(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._inflight.pop(key, None)
+            self._memo[key] = (value, time.time() + self.ttl)
+            self._prune()
+        future.set_result(value)
+        return _private_copy(value)
+
+    def _prune(self):
+        if len(self._memo) <= self.max_entries:
+            return
+        now = time.time()
+        for key in [k for k, (_, expires) in self._memo.items() if expires <= now]:
+            del self._memo[key]
+        # Still too many: drop the entries closest to expiry
+        overflow = len(self._memo) - self.max_entries
+        if overflow > 0:
+            for key in sorted(self._memo, key=lambda k: self._memo[k][1])[:overflow]:
+                del self._memo[key]
+
+    def invalidate(self, source=None):
+        with self._lock:
+            if source is None:
+                self._memo.clear()
+            else:
+                for key in [k for k in self._memo if k[0] == source]:
+                    del self._memo[key]
+
+    def stats(self):
+        return {
+            "upstream_calls": self.upstream_calls,
+            "memo_hits": self.memo_hits,
+            "merged": self.merged,
+            "saved": self.memo_hits + self.merged,
+        }
+
+
+_loader = None
+_loader_lock = threading.Lock()
+
+def get_data_loader():
+    """Return the process-wide DataLoader."""
+    global _loader
+    if _loader is None:
+        with _loader_lock:
+            if _loader is None:
+                _loader = DataLoader()
+    return _loader
@@ -0,0 +1,193 @@
+import os
+import io
+import json
+import time
+import threading
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+from upstream import get_upstream
+
+# Local financial statement cache (env overrides)
+FINANCIAL_CACHE_DIR = os.getenv("FINANCIAL_CACHE_DIR", os.path.join("cache", "financials"))
+# While a newer report may be out but is not cached yet, how often to ask upstream again
+FINANCIAL_RECHECK_SECONDS = float(os.getenv("FINANCIAL_RECHECK_SECONDS", str(6 * 3600)))
+
+STATEMENTS = {
+    'abstract': '财务摘要',
+    'lrb': '利润表',
+    'zcfzb': '资产负债表',
+    'xjllb': '现金流量表',
+}
+QUARTER_ENDS = ((3, 31), (6, 30), (9, 30), (12, 31))
+
+
+def fetch_statement_em(code, report_type):
+    """Eastmoney F10 statement (zcfzb / xjllb / lrb), one row per report period. Raises on failure."""
+    # 转换代码格式: 000001 -> SZ000001
+    market = "SZ" if code.startswith(('0', '3')) else "SH" if code.startswith('6') else "BJ"
+    symbol = f"{market}{code}"
+    url = f"https://emweb.securities.eastmoney.com/PC_HSF10/NewFinanceAnalysis/{report_type}Ajax?companyType=4&reportDateType=0&reportType=1&endDate=&code={symbol}"
+    headers = {
+        "User-Agent": "Mozilla/5.0",
+        "Referer": f"https://emweb.securities.eastmoney.com/PC_HSF10/NewFinanceAnalysis/Index?type=web&code={symbol}"
+    }
+    response = get_upstream().get(url, headers=headers, source=f"em.{report_type}", symbol=code, timeout=5)
+    response.raise_for_status()
+    data = response.json()
+    return pd.DataFrame(data['data']) if data.get('data') else pd.DataFrame()
+
+
+def fetch_statement(code, kind):
+    if kind == 'abstract':
+        return get_upstream().ak("stock_financial_abstract", symbol=code)
+    return fetch_statement_em(code, kind)
+
+
+def latest_period(kind, df):
+    """Newest report period in a statement as 'YYYY-MM-DD', or None."""
+    if df is None or df.empty:
+        return None
+    if kind == 'abstract':
+        # 摘要的报告期是列名: 选项, 指标, 20240930, 20240630, ...
+        periods = [c for c in df.columns if str(c).isdigit() and len(str(c)) == 8]
+        return max(f"{p[:4]}-{p[4:6]}-{p[6:]}" for p in map(str, periods)) if periods else None
+    if 'REPORT_DATE' not in df.columns:
+        return None
+    return str(df['REPORT_DATE'].max())[:10]
+
+
+def last_period_end(today=None):
+    """The most recent quarter end strictly before `today`: the newest report that could exist."""
+    today = today or date.today()
+    ends = [date(today.year, m, d) for m, d in QUARTER_ENDS if date(today.year, m, d) < today]
+    return (max(ends) if ends else date(today.year - 1, 12, 31)).isoformat()
+
+
+class FinancialCache:
+    """
+    On-disk cache of financial statements per (stock, statement type).
+
+    Each entry stores the statement with the newest report period it
+    contains. It stays valid, without any upstream call, until a newer
+    quarter has ended (the reporting calendar). Then, while the new report
+    has not been seen, upstream is re-checked at most every
+    `recheck_seconds`. An entry is also refetched when another statement of
+    the same stock (e.g. the cheaper abstract) already shows a newer
+    period. Misses for several statements are fetched concurrently.
+    """
+
+    def __init__(self, root=FINANCIAL_CACHE_DIR, fetcher=fetch_statement, recheck_seconds=FINANCIAL_RECHECK_SECONDS):
+        self.root = root
+        self.fetcher = fetcher
+        self.recheck_seconds = recheck_seconds
+        self._executor = ThreadPoolExecutor(max_workers=len(STATEMENTS))
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _lock(self, code, kind):
+        with self._locks_guard:
+            return self._locks.setdefault((code, kind), threading.Lock())
+
+    def _path(self, code, kind):
+        return os.path.join(self.root, f"{code}_{kind}.json")
+
+    def _read(self, code, kind):
+        path = self._path(code, kind)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except ValueError:
+            return None
+
+    def _write(self, code, kind, entry):
+        path = self._path(code, kind)
+        # Write to a temp file and rename so readers never see a partial file
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def _frame(entry):
+        if not entry or not entry.get("data"):
+            return pd.DataFrame()
+        return pd.read_json(io.StringIO(entry["data"]), orient="split", dtype=False, convert_axes=False, convert_dates=False)
+
+    def periods(self, code):
+        """Newest cached report period per statement type."""
+        return {kind: (self._read(code, kind) or {}).get("latest_period") for kind in STATEMENTS}
+
+    def is_current(self, entry, newest_known=None, now=None):
+        """
+        `newest_known` is (period, fetched) of the newest statement of the same
+        stock; an older entry not checked since that period appeared is stale.
+        """
+        if entry is None:
+            return False
+        now = now or time.time()
+        cached = entry.get("latest_period")
+        if newest_known and (cached is None or cached < newest_known[0]) and entry.get("checked", 0) < newest_known[1]:
+            return False
+        if cached and cached >= last_period_end(datetime.fromtimestamp(now).date()):
+            return True
+        return now - entry.get("checked", 0) < self.recheck_seconds
+
+    def _refresh(self, code, kind, entry, now):
+        with self._lock(code, kind):
+            try:
+                df = self.fetcher(code, kind)
+            except Exception as e:
+                print(f"Financial API error ({kind}): {e}")
+                return self._frame(entry)
+            period = latest_period(kind, df)
+            if entry is not None and (df.empty or period == entry.get("latest_period")):
+                # Nothing new upstream: keep the stored data, remember that we checked
+                entry["checked"] = now
+            else:
+                entry = {
+                    "latest_period": period,
+                    "fetched": now,
+                    "checked": now,
+                    "data": df.to_json(orient="split", force_ascii=False, date_format="iso") if not df.empty else None,
+                }
+            self._write(code, kind, entry)
+            return df if not df.empty else self._frame(entry)
+
+    def get_many(self, code, kinds=tuple(STATEMENTS)):
+        """{kind: DataFrame} for one stock; stale or missing statements are fetched concurrently."""
+        entries = {kind: self._read(code, kind) for kind in STATEMENTS}
+        # The newest period any statement of this stock shows, and when it first appeared
+        known = [(e["latest_period"], e["fetched"]) for e in entries.values() if e and e.get("latest_period")]
+        newest_known = max(known) if known else None
+        # One timestamp per round, so statements fetched together never look stale to each other
+        now = time.time()
+        result, futures = {}, {}
+        for kind in kinds:
+            entry = entries[kind]
+            if self.is_current(entry, newest_known, now):
+                result[kind] = self._frame(entry)
+            else:
+                futures[kind] = self._executor.submit(self._refresh, code, kind, entry, now)
+        for kind, future in futures.items():
+            result[kind] = future.result()
+        return {kind: result[kind] for kind in kinds}
+
+    def get(self, code, kind):
+        return self.get_many(code, (kind,))[kind]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_financial_cache():
+    """Return the process-wide FinancialCache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = FinancialCache()
+    return _cache
@@ -0,0 +1,187 @@
+import os
+import re
+import time
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from lxml import html as lxml_html
+
+from upstream import get_upstream
+
+# Crawl settings (env overrides)
+GUBA_PAGES = int(os.getenv("GUBA_PAGES", "3"))
+GUBA_MAX_CONCURRENCY = int(os.getenv("GUBA_MAX_CONCURRENCY", "3"))
+GUBA_MIN_INTERVAL = float(os.getenv("GUBA_MIN_INTERVAL", "0.2"))
+GUBA_TIMEOUT = float(os.getenv("GUBA_TIMEOUT", "5"))
+
+GUBA_BASE = "https://guba.eastmoney.com"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+COLUMNS = ['标题', '链接', '阅读', '评论', '作者', '时间']
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+# Current layout: one tr.listitem per post; the old layout used div.article-h rows with l1..l5 cells
+_NEW_ROWS = f"//tr[{_has_class('listitem')}]"
+_OLD_ROWS = f"//div[{_has_class('article-h')}]"
+_CELL_CLASSES = {
+    'read': 'read', 'reply': 'reply', 'title': 'title', 'author': 'author', 'update': 'time',
+    'l1': 'read', 'l2': 'reply', 'l3': 'title', 'l4': 'author', 'l5': 'time',
+}
+
+_COUNT_RE = re.compile(r"([\d.]+)\s*(万|亿)?")
+
+
+def list_page_url(code, page=1):
+    return f"{GUBA_BASE}/list,{code}.html" if page <= 1 else f"{GUBA_BASE}/list,{code}_{page}.html"
+
+
+def parse_count(text):
+    """'1.2万' -> 12000, '356' -> 356, anything else -> 0."""
+    match = _COUNT_RE.search(text or "")
+    if not match:
+        return 0
+    value = float(match.group(1))
+    return int(value * {'万': 1e4, '亿': 1e8}.get(match.group(2), 1))
+
+
+def parse_time(text, now=None):
+    """
+    List pages show 'MM-DD HH:MM' without a year: assume the current year,
+    or the previous one if that would put the post in the future.
+    Full 'YYYY-MM-DD HH:MM' values are parsed as is. Returns NaT otherwise.
+    """
+    text = (text or "").strip()
+    now = now or datetime.now()
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+        try:
+            return pd.Timestamp(datetime.strptime(text, fmt))
+        except ValueError:
+            pass
+    try:
+        parsed = datetime.strptime(f"{now.year}-{text}", "%Y-%m-%d %H:%M")
+    except ValueError:
+        return pd.NaT
+    if parsed > now:
+        parsed = parsed.replace(year=now.year - 1)
+    return pd.Timestamp(parsed)
+
+
+def _row_cells(row):
+    """Map one post row's cells (by class name) to read/reply/title/author/time elements."""
+    cells = {}
+    for el in row.iterdescendants():
+        for cls in (el.get('class') or "").split():
+            key = _CELL_CLASSES.get(cls)
+            if key and key not in cells:
+                cells[key] = el
+    return cells
+
+
+def _text(el):
+    return el.text_content().strip() if el is not None else ""
+
+
+def parse_list_page(page_html, now=None):
+    """Posts on one guba list page as dicts with typed 阅读/评论 and 时间."""
+    if not page_html or not page_html.strip():
+        return []
+    tree = lxml_html.fromstring(page_html)
+    rows = tree.xpath(_NEW_ROWS) or tree.xpath(_OLD_ROWS)
+    now = now or datetime.now()
+    posts = []
+    for row in rows:
+        cells = _row_cells(row)
+        title = cells.get('title')
+        link = next(title.iter('a'), None) if title is not None else None
+        if link is None or not link.get('href'):
+            continue
+        href = link.get('href')
+        posts.append({
+            '标题': link.text_content().strip(),
+            '链接': GUBA_BASE + href if href.startswith("/") else href,
+            '阅读': parse_count(_text(cells.get('read'))),
+            '评论': parse_count(_text(cells.get('reply'))),
+            '作者': _text(cells.get('author')) or "未知作者",
+            '时间': parse_time(_text(cells.get('time')), now),
+        })
+    return posts
+
+
+class GubaCrawler:
+    """
+    Fetches several guba list pages per stock concurrently.
+
+    All requests share one pooled session. Politeness limits are global:
+    at most `max_concurrency` requests in flight and at least
+    `min_interval` seconds between request starts. Posts are deduplicated
+    across pages by link (pages shift while they are being read) and
+    returned newest first.
+    """
+
+    def __init__(self, max_concurrency=GUBA_MAX_CONCURRENCY, min_interval=GUBA_MIN_INTERVAL, timeout=GUBA_TIMEOUT):
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._next_start = time.monotonic()
+        self._pace_lock = threading.Lock()
+
+    def _pace(self):
+        with self._pace_lock:
+            now = time.monotonic()
+            wait_for = self._next_start - now
+            self._next_start = max(self._next_start, now) + self.min_interval
+        if wait_for > 0:
+            time.sleep(wait_for)
+
+    def fetch_page(self, code, page):
+        """Posts on one list page; [] if the page could not be fetched."""
+        with self._slots:
+            self._pace()
+            try:
+                response = get_upstream().get(list_page_url(code, page), session=self.session, source="guba", symbol=code, timeout=self.timeout)
+                if response.status_code != 200:
+                    return []
+                return parse_list_page(response.text)
+            except Exception as e:
+                print(f"Guba scraping error (page {page}): {e}")
+                return []
+
+    def crawl(self, code, pages=GUBA_PAGES):
+        """Up to `pages` list pages of posts for one stock as a DataFrame."""
+        futures = [self._executor.submit(self.fetch_page, code, page) for page in range(1, pages + 1)]
+        seen = set()
+        posts = []
+        for future in futures:
+            for post in future.result():
+                key = post['链接'] or post['标题']
+                if key not in seen:
+                    seen.add(key)
+                    posts.append(post)
+        if not posts:
+            return pd.DataFrame(columns=COLUMNS)
+        df = pd.DataFrame(posts, columns=COLUMNS)
+        return df.sort_values('时间', ascending=False, na_position='last', kind='stable').reset_index(drop=True)
+
+
+_crawler = None
+_crawler_lock = threading.Lock()
+
+def get_guba_crawler():
+    """Return the process-wide GubaCrawler."""
+    global _crawler
+    if _crawler is None:
+        with _crawler_lock:
+            if _crawler is None:
+                _crawler = GubaCrawler()
+    return _crawler
@@ -0,0 +1,452 @@
+"""
+Vectorized technical indicators.
+
+Every function takes arrays shaped (T,) for one symbol or (N, T) for a panel
+of N symbols stacked along the first axis, with time on the last axis, and
+returns arrays of the same shape. Leading NaNs (shorter histories in a
+panel) are allowed. Rolling indicators are window reductions over
+`sliding_window_view`; recursive ones (EMA family, KDJ, OBV) loop over time
+only, vectorized across symbols.
+
+`IncrementalIndicators` keeps the recursive state plus a short tail window,
+so a new bar updates all indicators in O(window) instead of recomputing the
+whole history. `IndicatorCache` holds that state per symbol over its stored
+daily bars and only feeds it the bars that arrived since the last request.
+"""
+import os
+import copy
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+MA_WINDOWS = (5, 10, 20, 60)
+VOLUME_MA_WINDOWS = (5, 10)
+MACD_PARAMS = (12, 26, 9)
+RSI_PERIOD = 14
+BOLL_PARAMS = (20, 2.0)
+ATR_PERIOD = 14
+KDJ_PARAMS = (9, 3, 3)
+
+# Longest look-back any rolling indicator needs
+TAIL_WINDOW = max(MA_WINDOWS + VOLUME_MA_WINDOWS + (BOLL_PARAMS[0], KDJ_PARAMS[0]))
+
+# Symbols whose incremental state is kept in memory (env override)
+INDICATOR_CACHE_SYMBOLS = int(os.getenv("INDICATOR_CACHE_SYMBOLS", "256"))
+
+
+def _as_2d(x):
+    x = np.asarray(x, dtype=float)
+    return (x[np.newaxis, :], True) if x.ndim == 1 else (x, False)
+
+
+def _restore(x, squeeze):
+    return x[0] if squeeze else x
+
+
+def _rolling(x, n, reducer):
+    """Apply reducer over trailing windows of n bars; NaN until n valid bars exist."""
+    x, squeeze = _as_2d(x)
+    out = np.full(x.shape, np.nan)
+    if x.shape[-1] >= n:
+        windows = sliding_window_view(x, n, axis=-1)
+        out[:, n - 1:] = reducer(windows, axis=-1)
+    return _restore(out, squeeze)
+
+
+def sma(x, n):
+    return _rolling(x, n, np.mean)
+
+
+def rolling_std(x, n):
+    """Population std (ddof=0) from windowed E[x^2] - E[x]^2; avoids a strided np.std."""
+    x = np.asarray(x, dtype=float)
+    mean = sma(x, n)
+    return np.sqrt(np.maximum(sma(x * x, n) - mean * mean, 0.0))
+
+
+def rolling_max(x, n):
+    return _rolling(x, n, np.max)
+
+
+def rolling_min(x, n):
+    return _rolling(x, n, np.min)
+
+
+def _ema_step(prev, x, alpha):
+    """One EMA step; starts from the first valid value and carries over gaps."""
+    updated = np.where(np.isnan(prev), x, alpha * x + (1 - alpha) * prev)
+    return np.where(np.isnan(x), prev, updated)
+
+
+def _recursive(x, alpha):
+    x, squeeze = _as_2d(x)
+    out = np.empty(x.shape)
+    state = np.full(x.shape[0], np.nan)
+    for t in range(x.shape[-1]):
+        state = _ema_step(state, x[:, t], alpha)
+        out[:, t] = state
+    return _restore(out, squeeze)
+
+
+def ema(x, n):
+    """Exponential moving average, alpha = 2 / (n + 1) (pandas ewm adjust=False)."""
+    return _recursive(x, 2.0 / (n + 1))
+
+
+def rma(x, n):
+    """Wilder's smoothing, alpha = 1 / n, as used by RSI and ATR."""
+    return _recursive(x, 1.0 / n)
+
+
+def _prev(x):
+    x, squeeze = _as_2d(x)
+    out = np.full(x.shape, np.nan)
+    out[:, 1:] = x[:, :-1]
+    return _restore(out, squeeze)
+
+
+def macd(close, fast=MACD_PARAMS[0], slow=MACD_PARAMS[1], signal=MACD_PARAMS[2]):
+    """Returns (DIF, DEA, MACD histogram); histogram uses the A-share 2x convention."""
+    dif = ema(close, fast) - ema(close, slow)
+    dea = ema(dif, signal)
+    return dif, dea, 2 * (dif - dea)
+
+
+def _gain_loss(close):
+    change = np.asarray(close, dtype=float) - _prev(close)
+    return np.where(change > 0, change, np.where(np.isnan(change), np.nan, 0.0)), \
+        np.where(change < 0, -change, np.where(np.isnan(change), np.nan, 0.0))
+
+
+def rsi(close, n=RSI_PERIOD):
+    gain, loss = _gain_loss(close)
+    avg_gain, avg_loss = rma(gain, n), rma(loss, n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 100 * avg_gain / (avg_gain + avg_loss)
+
+
+def bollinger(close, n=BOLL_PARAMS[0], k=BOLL_PARAMS[1]):
+    """Returns (middle, upper, lower)."""
+    mid, std = sma(close, n), rolling_std(close, n)
+    return mid, mid + k * std, mid - k * std
+
+
+def true_range(high, low, close):
+    prev_close = _prev(close)
+    high, low = np.asarray(high, dtype=float), np.asarray(low, dtype=float)
+    return np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+
+def atr(high, low, close, n=ATR_PERIOD):
+    return rma(true_range(high, low, close), n)
+
+
+def obv(close, volume):
+    direction = np.sign(np.nan_to_num(np.asarray(close, dtype=float) - _prev(close)))
+    return np.cumsum(direction * np.nan_to_num(np.asarray(volume, dtype=float)), axis=-1)
+
+
+def _kdj_step(k_prev, d_prev, rsv, m1, m2):
+    k = np.where(np.isnan(rsv), k_prev, ((m1 - 1) * k_prev + rsv) / m1)
+    d = np.where(np.isnan(rsv), d_prev, ((m2 - 1) * d_prev + k) / m2)
+    return k, d
+
+
+def _rsv(close, hhv, llv):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        span = hhv - llv
+        return np.where(span > 0, (close - llv) / span * 100, 50.0) + np.where(np.isnan(span), np.nan, 0.0)
+
+
+def kdj(high, low, close, n=KDJ_PARAMS[0], m1=KDJ_PARAMS[1], m2=KDJ_PARAMS[2]):
+    """Returns (K, D, J); K and D start at 50 and are NaN until RSV is defined."""
+    rsv = _rsv(np.asarray(close, dtype=float), rolling_max(high, n), rolling_min(low, n))
+    rsv, squeeze = _as_2d(rsv)
+    k_out, d_out = np.empty(rsv.shape), np.empty(rsv.shape)
+    k = d = np.full(rsv.shape[0], 50.0)
+    for t in range(rsv.shape[-1]):
+        k, d = _kdj_step(k, d, rsv[:, t], m1, m2)
+        k_out[:, t], d_out[:, t] = k, d
+    invalid = np.isnan(rsv)
+    k_out[invalid] = np.nan
+    d_out[invalid] = np.nan
+    return _restore(k_out, squeeze), _restore(d_out, squeeze), _restore(3 * k_out - 2 * d_out, squeeze)
+
+
+def compute_panel(high, low, close, volume):
+    """All indicators for (T,) or (N, T) inputs, as a dict of same-shaped arrays."""
+    out = {}
+    for n in MA_WINDOWS:
+        out[f"MA{n}"] = sma(close, n)
+    for n in VOLUME_MA_WINDOWS:
+        out[f"VMA{n}"] = sma(volume, n)
+    fast, slow, _ = MACD_PARAMS
+    out[f"EMA{fast}"], out[f"EMA{slow}"] = ema(close, fast), ema(close, slow)
+    out["DIF"], out["DEA"], out["MACD"] = macd(close)
+    out[f"RSI{RSI_PERIOD}"] = rsi(close)
+    out["BOLL_MID"], out["BOLL_UP"], out["BOLL_LOW"] = bollinger(close)
+    out[f"ATR{ATR_PERIOD}"] = atr(high, low, close)
+    out["OBV"] = obv(close, volume)
+    out["K"], out["D"], out["J"] = kdj(high, low, close)
+    return out
+
+
+def compute_indicators(bars):
+    """Indicator columns for one symbol's bars (bar_store schema), aligned to its index."""
+    values = compute_panel(bars['最高'].values, bars['最低'].values, bars['收盘'].values, bars['成交量'].values)
+    return pd.DataFrame(values, index=bars.index)
+
+
+class IncrementalIndicators:
+    """
+    Indicator state for N symbols that advances one bar at a time.
+
+    Build it from history with `from_history`, then call `update` with each
+    new bar's (N,) arrays; it returns the same keys as `compute_panel`, for
+    the new bar only, matching what a full recomputation would give.
+    """
+
+    def __init__(self, n_symbols):
+        nan = np.full(n_symbols, np.nan)
+        self.tail = {name: np.full((n_symbols, TAIL_WINDOW), np.nan) for name in ("high", "low", "close", "volume")}
+        fast, slow, signal = MACD_PARAMS
+        self.ema = {fast: nan.copy(), slow: nan.copy()}
+        self.dea = nan.copy()
+        self.avg_gain, self.avg_loss, self.atr = nan.copy(), nan.copy(), nan.copy()
+        self.obv = np.zeros(n_symbols)
+        self.k, self.d = np.full(n_symbols, 50.0), np.full(n_symbols, 50.0)
+
+    @classmethod
+    def from_history(cls, high, low, close, volume):
+        """Replay (N, T) history (or (T,) for one symbol) through `update`."""
+        arrays = [_as_2d(a)[0] for a in (high, low, close, volume)]
+        state = cls(arrays[0].shape[0])
+        for t in range(arrays[0].shape[-1]):
+            state.update(*(a[:, t] for a in arrays))
+        return state
+
+    @classmethod
+    def from_bulk(cls, high, low, close, volume, values=None):
+        """
+        The state after (N, T) history (or (T,) for one symbol), taken from
+        a vectorized `compute_panel` pass instead of a bar-by-bar replay.
+        Pass `values` when compute_panel has already been run on the same inputs.
+        """
+        arrays = [_as_2d(a)[0] for a in (high, low, close, volume)]
+        values = compute_panel(*arrays) if values is None else {k: _as_2d(v)[0] for k, v in values.items()}
+        state = cls(arrays[0].shape[0])
+        length = arrays[0].shape[-1]
+        if length == 0:
+            return state
+        for name, a in zip(("high", "low", "close", "volume"), arrays):
+            tail = a[:, -TAIL_WINDOW:]
+            state.tail[name][:, TAIL_WINDOW - tail.shape[-1]:] = tail
+        fast, slow, _ = MACD_PARAMS
+        state.ema = {fast: values[f"EMA{fast}"][:, -1].copy(), slow: values[f"EMA{slow}"][:, -1].copy()}
+        state.dea = values["DEA"][:, -1].copy()
+        gain, loss = _gain_loss(arrays[2])
+        state.avg_gain, state.avg_loss = rma(gain, RSI_PERIOD)[:, -1], rma(loss, RSI_PERIOD)[:, -1]
+        state.atr = values[f"ATR{ATR_PERIOD}"][:, -1].copy()
+        state.obv = values["OBV"][:, -1].copy()
+        # K / D hold their last value while RSV is undefined, starting from 50
+        for name in ("K", "D"):
+            series = values[name]
+            valid = ~np.isnan(series)
+            last = np.where(valid.any(axis=-1), length - 1 - np.argmax(valid[:, ::-1], axis=-1), 0)
+            setattr(state, name.lower(), np.where(valid.any(axis=-1), series[np.arange(len(series)), last], 50.0))
+        return state
+
+    def _window(self, name, n):
+        # NaN anywhere in the window propagates, like the bulk rolling functions
+        return self.tail[name][:, -n:]
+
+    def update(self, high, low, close, volume):
+        high, low, close, volume = (np.atleast_1d(np.asarray(a, dtype=float)) for a in (high, low, close, volume))
+        prev_close = self.tail["close"][:, -1].copy()
+        for name, value in (("high", high), ("low", low), ("close", close), ("volume", volume)):
+            buffer = self.tail[name]
+            buffer[:, :-1] = buffer[:, 1:]
+            buffer[:, -1] = value
+
+        out = {}
+        for n in MA_WINDOWS:
+            out[f"MA{n}"] = self._window("close", n).mean(axis=-1)
+        for n in VOLUME_MA_WINDOWS:
+            out[f"VMA{n}"] = self._window("volume", n).mean(axis=-1)
+
+        fast, slow, signal = MACD_PARAMS
+        for n in (fast, slow):
+            self.ema[n] = _ema_step(self.ema[n], close, 2.0 / (n + 1))
+            out[f"EMA{n}"] = self.ema[n]
+        out["DIF"] = self.ema[fast] - self.ema[slow]
+        self.dea = _ema_step(self.dea, out["DIF"], 2.0 / (signal + 1))
+        out["DEA"] = self.dea
+        out["MACD"] = 2 * (out["DIF"] - self.dea)
+
+        change = close - prev_close
+        gain = np.where(change > 0, change, np.where(np.isnan(change), np.nan, 0.0))
+        loss = np.where(change < 0, -change, np.where(np.isnan(change), np.nan, 0.0))
+        self.avg_gain = _ema_step(self.avg_gain, gain, 1.0 / RSI_PERIOD)
+        self.avg_loss = _ema_step(self.avg_loss, loss, 1.0 / RSI_PERIOD)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[f"RSI{RSI_PERIOD}"] = 100 * self.avg_gain / (self.avg_gain + self.avg_loss)
+
+        n, k = BOLL_PARAMS
+        window = self._window("close", n)
+        mid, std = window.mean(axis=-1), window.std(axis=-1)
+        out["BOLL_MID"], out["BOLL_UP"], out["BOLL_LOW"] = mid, mid + k * std, mid - k * std
+
+        tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+        self.atr = _ema_step(self.atr, tr, 1.0 / ATR_PERIOD)
+        out[f"ATR{ATR_PERIOD}"] = self.atr
+
+        self.obv = self.obv + np.sign(np.nan_to_num(change)) * np.nan_to_num(volume)
+        out["OBV"] = self.obv
+
+        n, m1, m2 = KDJ_PARAMS
+        rsv = _rsv(close, self._window("high", n).max(axis=-1), self._window("low", n).min(axis=-1))
+        self.k, self.d = _kdj_step(self.k, self.d, rsv, m1, m2)
+        valid = ~np.isnan(rsv)
+        out["K"] = np.where(valid, self.k, np.nan)
+        out["D"] = np.where(valid, self.d, np.nan)
+        out["J"] = 3 * out["K"] - 2 * out["D"]
+        return out
+
+
+class IndicatorCache:
+    """
+    Daily indicators per symbol over its whole stored bar history.
+
+    The first request for a symbol computes the history in bulk and keeps
+    the recursive state; later requests only run `update` for bars that
+    arrived since. Only final bars (dated up to `final_through`) advance
+    the kept state; the current day's still-changing bar is computed on a
+    copy. A history that no longer extends the cached one (older bars were
+    added, or an adjustment rewrote prices) is recomputed in bulk. At most
+    `max_symbols` symbols are kept (least recently used dropped).
+    """
+
+    def __init__(self, max_symbols=INDICATOR_CACHE_SYMBOLS):
+        self.max_symbols = max_symbols
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bulk = 0
+        self.incremental = 0
+
+    @staticmethod
+    def _extends(entry, dates, arrays, final):
+        n = entry["length"]
+        if n == 0 or n > final or dates[0] != entry["first"] or dates[n - 1] != entry["last"]:
+            return False
+        return all(a[n - 1] == v or (np.isnan(a[n - 1]) and np.isnan(v)) for a, v in zip(arrays, entry["last_bar"]))
+
+    @staticmethod
+    def _advance(state, arrays, start, end, dates):
+        rows = []
+        for t in range(start, end):
+            out = state.update(*(a[t] for a in arrays))
+            rows.append({name: value[0] for name, value in out.items()})
+        return pd.DataFrame(rows, index=pd.DatetimeIndex(dates[start:end], name='日期'))
+
+    def indicators(self, code, bars, final_through=None):
+        """
+        Indicator frame indexed by 日期 for `bars`, one symbol's full daily
+        history (bar_store schema, oldest first). `final_through` is the
+        last date whose bar can no longer change (default: all of them).
+        """
+        dates = pd.DatetimeIndex(bars['日期']).values
+        arrays = [bars[col].to_numpy(dtype=float) for col in ('最高', '最低', '收盘', '成交量')]
+        final = len(dates) if final_through is None else int(np.searchsorted(dates, np.datetime64(pd.Timestamp(final_through)), side='right'))
+        with self._lock:
+            entry = self._entries.get(code)
+        if entry is not None and self._extends(entry, dates, arrays, final):
+            state = copy.deepcopy(entry["state"])
+            added = self._advance(state, arrays, entry["length"], final, dates)
+            committed = pd.concat([entry["frame"], added]) if len(added) else entry["frame"]
+            self.incremental += 1
+        else:
+            values = compute_panel(*(a[:final] for a in arrays))
+            state = IncrementalIndicators.from_bulk(*(a[:final] for a in arrays), values=values)
+            committed = pd.DataFrame(values, index=pd.DatetimeIndex(dates[:final], name='日期'))
+            self.bulk += 1
+        if final:
+            with self._lock:
+                self._entries[code] = {
+                    "length": final, "first": dates[0], "last": dates[final - 1],
+                    "last_bar": tuple(a[final - 1] for a in arrays), "state": state, "frame": committed,
+                }
+                self._entries.move_to_end(code)
+                while len(self._entries) > self.max_symbols:
+                    self._entries.popitem(last=False)
+        if final == len(dates):
+            return committed.copy()
+        provisional = self._advance(copy.deepcopy(state), arrays, final, len(dates), dates)
+        return pd.concat([committed, provisional])
+
+    def stats(self):
+        with self._lock:
+            symbols = len(self._entries)
+        return {"symbols": symbols, "bulk": self.bulk, "incremental": self.incremental}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_indicator_cache():
+    """Return the process-wide IndicatorCache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = IndicatorCache()
+    return _cache
+
+
+def _cross(fast, slow, lookback=5):
+    """'金叉' / '死叉' if fast crossed slow within the last `lookback` bars."""
+    diff = np.asarray(fast) - np.asarray(slow)
+    diff = diff[~np.isnan(diff)][-(lookback + 1):]
+    for a, b in zip(diff[-2::-1], diff[:0:-1]):
+        if a <= 0 < b:
+            return "近期金叉"
+        if a >= 0 > b:
+            return "近期死叉"
+    return "无交叉"
+
+
+def summarize_indicators(bars, ind=None):
+    """Compact text summary of the latest indicator readings, for LLM prompts."""
+    if bars is None or bars.empty:
+        return "暂无指标数据"
+    ind = compute_indicators(bars) if ind is None else ind
+    last = ind.iloc[-1]
+    close = bars['收盘'].iloc[-1]
+
+    def fmt(v, digits=2):
+        return "-" if pd.isna(v) else f"{v:.{digits}f}"
+
+    lines = [f"收盘 {fmt(close)}"]
+    lines.append("均线: " + ", ".join(
+        f"MA{n} {fmt(last[f'MA{n}'])}" + ("" if pd.isna(last[f'MA{n}']) else (" (价上)" if close >= last[f'MA{n}'] else " (价下)"))
+        for n in MA_WINDOWS
+    ))
+    lines.append(f"MACD: DIF {fmt(last['DIF'], 3)}, DEA {fmt(last['DEA'], 3)}, 柱 {fmt(last['MACD'], 3)}, {_cross(ind['DIF'], ind['DEA'])}")
+    rsi_value = last[f'RSI{RSI_PERIOD}']
+    rsi_zone = "" if pd.isna(rsi_value) else (" 超买" if rsi_value >= 70 else " 超卖" if rsi_value <= 30 else " 中性")
+    lines.append(f"RSI{RSI_PERIOD}: {fmt(rsi_value, 1)}{rsi_zone}")
+    width = last['BOLL_UP'] - last['BOLL_LOW']
+    pct_b = (close - last['BOLL_LOW']) / width if width and not pd.isna(width) else np.nan
+    lines.append(f"布林带: 上 {fmt(last['BOLL_UP'])}, 中 {fmt(last['BOLL_MID'])}, 下 {fmt(last['BOLL_LOW'])}, %B {fmt(pct_b)}")
+    atr_value = last[f'ATR{ATR_PERIOD}']
+    lines.append(f"ATR{ATR_PERIOD}: {fmt(atr_value)} (占收盘 {fmt(atr_value / close * 100 if close else np.nan, 1)}%)")
+    lines.append(f"KDJ: K {fmt(last['K'], 1)}, D {fmt(last['D'], 1)}, J {fmt(last['J'], 1)}, {_cross(ind['K'], ind['D'])}")
+    obv_series = ind['OBV'].dropna()
+    if len(obv_series) > 5:
+        lines.append(f"OBV 近5日: {'上升' if obv_series.iloc[-1] > obv_series.iloc[-6] else '下降'}")
+    volume = bars['成交量'].iloc[-1]
+    vma = last[f'VMA{VOLUME_MA_WINDOWS[0]}']
+    if not pd.isna(vma) and vma:
+        lines.append(f"量能: 最新成交量为 {VOLUME_MA_WINDOWS[0]} 日均量的 {volume / vma:.2f} 倍")
+    return "\n".join(lines)
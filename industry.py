@@ -0,0 +1,334 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+from spot_service import get_spot_service
+from upstream import get_upstream
+from shared_cache import get_shared_cache
+
+# Persisted code -> industry membership and how often it is rebuilt (env overrides)
+INDUSTRY_INDEX_PATH = os.getenv("INDUSTRY_INDEX_PATH", os.path.join("cache", "industry_membership.parquet"))
+INDUSTRY_MEMBERSHIP_TTL = float(os.getenv("INDUSTRY_MEMBERSHIP_TTL", str(24 * 3600)))
+INDUSTRY_FETCH_WORKERS = int(os.getenv("INDUSTRY_FETCH_WORKERS", "4"))
+INDUSTRY_REBUILD_LEASE_SECONDS = 600
+
+# Rank name -> (snapshot column, ascending); rank 1 is the best in the industry
+RANK_METRICS = {
+    '市值': ('总市值', False),
+    '净利润': ('估算净利润', False),
+    '涨跌幅': ('涨跌幅', False),
+    '换手率': ('换手率', False),
+    '市盈率': ('市盈率-动态', True),
+}
+
+NUMERIC_COLUMNS = ['最新价', '涨跌幅', '换手率', '市盈率-动态', '市净率', '总市值', '成交额']
+
+
+def fetch_board_members(industry):
+    """Constituent codes of one eastmoney industry board."""
+    cons = get_upstream().ak("stock_board_industry_cons_em", symbol=industry)
+    return pd.DataFrame({'代码': cons['代码'].astype(str).values, '行业': industry})
+
+
+def fetch_industry_membership(workers=INDUSTRY_FETCH_WORKERS):
+    """
+    code -> industry for the whole market from the industry board lists.
+    Returns (DataFrame with 代码 / 行业, names of boards that failed to load).
+    """
+    boards = get_upstream().ak("stock_board_industry_name_em")['板块名称'].tolist()
+    frames, failed = [], []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for industry, future in zip(boards, [executor.submit(fetch_board_members, b) for b in boards]):
+            try:
+                frames.append(future.result())
+            except Exception as e:
+                print(f"Industry constituents error ({industry}): {e}")
+                failed.append(industry)
+    if not frames:
+        return pd.DataFrame(columns=['代码', '行业']), failed
+    # Eastmoney industry boards are disjoint; keep the first if upstream ever overlaps
+    return pd.concat(frames, ignore_index=True).drop_duplicates('代码'), failed
+
+
+class IndustryIndex:
+    """
+    Persisted code -> industry membership for the whole market.
+
+    Built from the industry board lists (one call per board) and saved as
+    Parquet, so code -> industry and industry -> codes are answered from
+    memory without network access, across restarts. The warm-up scheduler
+    calls `build` to keep it fresh; a reader that finds it missing or older
+    than `ttl` starts a rebuild in a background thread and is answered from
+    the current index. Until the first build finishes the index is empty
+    (`ready` is False) and callers fall back to per-stock lookups, or call
+    `wait_ready`. Boards that fail during a rebuild keep their previous
+    members.
+    """
+
+    def __init__(self, path=INDUSTRY_INDEX_PATH, ttl=INDUSTRY_MEMBERSHIP_TTL, loader=fetch_industry_membership):
+        self.path = path
+        self.ttl = ttl
+        self.loader = loader
+        self._frame = None
+        self._by_code = {}
+        self._by_industry = {}
+        self._updated = 0.0
+        self._loaded_from_disk = False
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._refreshed = threading.Condition(self._lock)
+        self._read_lock = threading.Lock()
+
+    @property
+    def meta_path(self):
+        return os.path.splitext(self.path)[0] + ".json"
+
+    @property
+    def updated_at(self):
+        return self._updated
+
+    @property
+    def ready(self):
+        return self._frame is not None
+
+    def _install(self, frame, updated):
+        frame = frame[['代码', '行业']].astype(str).reset_index(drop=True)
+        by_code = dict(zip(frame['代码'], frame['行业']))
+        by_industry = {industry: codes.tolist() for industry, codes in frame.groupby('行业', sort=False)['代码']}
+        with self._lock:
+            self._frame, self._by_code, self._by_industry, self._updated = frame, by_code, by_industry, updated
+
+    def _read(self):
+        if not (os.path.exists(self.path) and os.path.exists(self.meta_path)):
+            return
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            self._install(pd.read_parquet(self.path), meta["updated"])
+        except Exception as e:
+            print(f"Industry index read error: {e}")
+
+    def _write(self, frame, updated):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Write to temp files and rename so readers never see partial files
+        frame.to_parquet(self.path + ".tmp", index=False)
+        os.replace(self.path + ".tmp", self.path)
+        with open(self.meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"updated": updated, "stocks": len(frame), "industries": int(frame['行业'].nunique())}, f)
+        os.replace(self.meta_path + ".tmp", self.meta_path)
+
+    def refresh(self):
+        """Rebuild the index from upstream now. Keeps the current one on failure."""
+        try:
+            frame, failed = self.loader()
+            if self._frame is not None and failed:
+                kept = self._frame[self._frame['行业'].isin(failed) & ~self._frame['代码'].isin(frame['代码'])]
+                frame = pd.concat([frame, kept], ignore_index=True)
+            if frame.empty:
+                raise ValueError("empty industry membership")
+            updated = time.time()
+            self._write(frame, updated)
+            self._install(frame, updated)
+        except Exception as e:
+            print(f"Industry index refresh error: {e}")
+        finally:
+            self._finish_refresh()
+
+    def _finish_refresh(self):
+        with self._lock:
+            self._refreshing = False
+            self._refreshed.notify_all()
+
+    def _refresh_shared(self):
+        """
+        Background rebuild coordinated with other app processes: adopt an
+        index another process has already rebuilt on disk, otherwise rebuild
+        it under the shared cache's lease so only one process does.
+        """
+        self._read()
+        if time.time() - self._updated < self.ttl:
+            self._finish_refresh()
+            return
+        cache = get_shared_cache()
+        if not cache.try_lease("industry_index", INDUSTRY_REBUILD_LEASE_SECONDS):
+            self._finish_refresh()  # another process is rebuilding it
+            return
+        try:
+            self.refresh()
+        finally:
+            cache.release("industry_index")
+
+    def _ensure_fresh(self):
+        if not self._loaded_from_disk:
+            with self._read_lock:
+                if not self._loaded_from_disk:
+                    self._read()
+                    self._loaded_from_disk = True
+        with self._lock:
+            if self._frame is not None and time.time() - self._updated < self.ttl:
+                return
+            start_refresh = not self._refreshing
+            self._refreshing = True
+        if start_refresh:
+            # Never on the caller's thread: a first build is ~90 board requests
+            threading.Thread(target=self._refresh_shared, daemon=True).start()
+
+    def build(self):
+        """
+        Scheduled refresh (see warmup): adopt the index on disk, rebuilding it
+        first when it is missing or older than `ttl`. Returns the number of
+        stocks indexed.
+        """
+        with self._lock:
+            start_refresh = not self._refreshing
+            self._refreshing = True
+        if start_refresh:
+            self._refresh_shared()
+        return len(self._by_code)
+
+    def wait_ready(self, timeout=None):
+        """Block until the first build has finished (or failed). Returns `ready`."""
+        self._ensure_fresh()
+        with self._lock:
+            self._refreshed.wait_for(lambda: self._frame is not None or not self._refreshing, timeout)
+        return self.ready
+
+    def membership(self):
+        """The whole index as a DataFrame with 代码 / 行业 (empty if never built)."""
+        self._ensure_fresh()
+        frame = self._frame
+        return frame if frame is not None else pd.DataFrame(columns=['代码', '行业'])
+
+    def industry_of(self, code):
+        self._ensure_fresh()
+        return self._by_code.get(str(code))
+
+    def codes_in(self, industry):
+        self._ensure_fresh()
+        return list(self._by_industry.get(industry, []))
+
+    def industries(self):
+        self._ensure_fresh()
+        return sorted(self._by_industry)
+
+
+def build_rank_table(spot, membership):
+    """
+    Industry rank table for every stock in `membership`, in one vectorized pass.
+
+    Returns the snapshot rows indexed by code with 行业, 估算净利润 (市值 / PE,
+    0 when PE <= 0), 行业股票数 and, for each RANK_METRICS entry, an integer
+    `<name>排名` (1 = best), `<name>样本数` (peers with a value to rank) and
+    `<name>分位` (percent of those peers ranked at or below it). Stocks with no
+    value for a metric (e.g. PE <= 0) get a NaN rank for it.
+    """
+    if spot is None or spot.empty or membership is None or membership.empty:
+        return pd.DataFrame()
+    members = membership.set_index('代码')['行业']
+    codes = spot['代码'].astype(str)
+    table = spot[codes.isin(members.index)].copy()
+    # Key by code whatever index the snapshot arrives with
+    table.index = pd.Index(table['代码'].astype(str).values)
+    for col in NUMERIC_COLUMNS:
+        if col in table.columns:
+            table[col] = pd.to_numeric(table[col], errors='coerce')
+    table['行业'] = table['代码'].astype(str).map(members)
+    pe = table['市盈率-动态']
+    table['估算净利润'] = np.where(pe > 0, table['总市值'] / pe, 0.0)
+
+    groups = table.groupby('行业', sort=False)
+    table['行业股票数'] = groups['代码'].transform('size')
+    for name, (column, ascending) in RANK_METRICS.items():
+        values = table[column].where(table[column] > 0) if column == '市盈率-动态' else table[column]
+        ranked = values.groupby(table['行业'], sort=False)
+        rank = ranked.rank(ascending=ascending, method='min')
+        count = ranked.transform('count')
+        table[f'{name}排名'] = rank
+        table[f'{name}样本数'] = count
+        table[f'{name}分位'] = (count - rank + 1) / count * 100
+    return table
+
+
+class IndustryRanks:
+    """
+    Process-wide industry rank tables over the shared spot snapshot.
+
+    The table is rebuilt only when the spot service has a newer snapshot or
+    the industry index is rebuilt, so every page and every stock in the same
+    industry reads the same ranks; per-stock lookups are index lookups.
+    """
+
+    def __init__(self, index=None):
+        self.index = index
+        self._table = pd.DataFrame()
+        self._groups = {}
+        self._table_key = None
+        self._lock = threading.Lock()
+
+    def _current(self):
+        index = self.index or get_industry_index()
+        membership = index.membership()
+        spot_service = get_spot_service()
+        spot = spot_service.snapshot()
+        key = (spot_service.updated_at, index.updated_at)
+        with self._lock:
+            if key != self._table_key:
+                self._table = build_rank_table(spot, membership)
+                self._groups = self._table.groupby('行业', sort=False).indices if not self._table.empty else {}
+                self._table_key = key
+            return self._table, self._groups
+
+    def table(self):
+        return self._current()[0]
+
+    def industry_of(self, code):
+        table = self.table()
+        return table.at[code, '行业'] if code in table.index else None
+
+    def lookup(self, code):
+        """The stock's row (values, ranks and percentiles) as a Series, or None."""
+        table = self.table()
+        return table.loc[code] if code in table.index else None
+
+    def peers(self, industry):
+        """All rows of one industry."""
+        table, groups = self._current()
+        positions = groups.get(industry)
+        return table.iloc[positions] if positions is not None else table.iloc[:0]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_industry_index():
+    """Return the process-wide IndustryIndex."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = IndustryIndex()
+    return _index
+
+
+_ranks = None
+_ranks_lock = threading.Lock()
+
+def get_industry_ranks():
+    """Return the process-wide IndustryRanks."""
+    global _ranks
+    if _ranks is None:
+        with _ranks_lock:
+            if _ranks is None:
+                _ranks = IndustryRanks()
+    return _ranks
+
+
+if __name__ == "__main__":
+    # 供定时任务 (如 cron) 调用: python industry.py
+    index = IndustryIndex()
+    index.refresh()
+    print(f"行业成员索引: {len(index._by_code)} 只股票，{len(index._by_industry)} 个行业 -> {index.path}")
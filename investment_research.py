@@ -1,13 +1,31 @@
 import streamlit as st
-import akshare as ak
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import re
 import os
-from agents import FundamentalAnalyst, TechnicalAnalyst, NewsAnalyst, RiskManager
-from llm_utils import call_llm
+import time
+import uuid
+from functools import partial
+from agents import build_team, run_agents, stream_agents, build_cio_prompt, CIO_SYSTEM_PROMPT
+from llm_utils import call_llm, LLMError, LLM_STREAM
+from bar_store import get_bar_store, get_bar_fetcher, last_complete_day
+from spot_service import get_spot_service
+from stock_search import StockSearchIndex
+from data_loader import get_data_loader
+from guba_crawler import get_guba_crawler
+from notice_store import get_notice_store
+from indicators import get_indicator_cache, summarize_indicators
+from screener import field_labels, indicator_snapshot, build_screen_frame, screen, paginate
+from industry import get_industry_index, get_industry_ranks, build_rank_table, fetch_board_members, RANK_METRICS
+from financial_cache import get_financial_cache
+from upstream import get_upstream
+from warmup import get_warmup
+from shared_cache import cached, get_shared_cache
+from metrics import get_metrics
+from charts import CHART_MAX_CANDLES, CHART_RANGES, PERIODS, history_start, prepare_chart, price_figure, volume_figure, indicator_figure
 
 # 设置页面配置
 st.set_page_config(
@@ -31,156 +49,27 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-import requests
-from bs4 import BeautifulSoup
 import json
 import re
 
+FINANCIAL_KINDS = ('abstract', 'lrb', 'zcfzb', 'xjllb')
+
 # --- 辅助爬虫函数 ---
 
 def get_guba_comments(code):
-    """爬取东方财富股吧评论 (包含阅读、评论、标题、作者、最后更新)"""
-    url = f"https://guba.eastmoney.com/list,{code}.html"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-    comments_list = []
-    try:
-        response = requests.get(url, headers=headers, timeout=5)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 新版结构: tr.listitem
-            items = soup.find_all('tr', class_='listitem')
-            
-            # 如果没找到 tr.listitem，尝试旧版结构 (兼容性)
-            if not items:
-                items = soup.find_all('div', class_='article-h')
-
-            for item in items:
-                try:
-                    # 判断是新版还是旧版
-                    if item.name == 'tr':
-                        # 新版结构
-                        read_div = item.find('div', class_='read')
-                        reply_div = item.find('div', class_='reply')
-                        title_div = item.find('div', class_='title')
-                        author_div = item.find('div', class_='author')
-                        update_div = item.find('div', class_='update')
-                        
-                        if title_div and title_div.a:
-                            title = title_div.a.get_text(strip=True)
-                            href = title_div.a['href']
-                            full_link = "https://guba.eastmoney.com" + href if href.startswith("/") else href
-                            
-                            read_count = read_div.get_text(strip=True) if read_div else "0"
-                            comment_count = reply_div.get_text(strip=True) if reply_div else "0"
-                            author = author_div.get_text(strip=True) if author_div else "未知作者"
-                            time_val = update_div.get_text(strip=True) if update_div else ""
-                            
-                            comments_list.append({
-                                "标题": title,
-                                "链接": full_link,
-                                "阅读": read_count,
-                                "评论": comment_count,
-                                "作者": author,
-                                "时间": time_val
-                            })
-                    else:
-                        # 旧版结构 (保留以防万一)
-                        l1 = item.find(class_='l1') # 阅读
-                        l2 = item.find(class_='l2') # 评论
-                        l3 = item.find(class_='l3') # 标题
-                        l4 = item.find(class_='l4') # 作者
-                        l5 = item.find(class_='l5') # 时间
-                        
-                        if l3 and l3.a:
-                            title = l3.a.get_text(strip=True)
-                            href = l3.a['href']
-                            full_link = "https://guba.eastmoney.com" + href if href.startswith("/") else href
-                            
-                            read_count = l1.get_text(strip=True) if l1 else "0"
-                            comment_count = l2.get_text(strip=True) if l2 else "0"
-                            author = l4.get_text(strip=True) if l4 else "未知作者"
-                            time_val = l5.get_text(strip=True) if l5 else ""
-                            
-                            comments_list.append({
-                                "标题": title,
-                                "链接": full_link,
-                                "阅读": read_count,
-                                "评论": comment_count,
-                                "作者": author,
-                                "时间": time_val
-                            })
-                except:
-                    continue
-            
-            # 去重
-            seen = set()
-            unique_comments = []
-            for item in comments_list:
-                if item['标题'] not in seen:
-                    seen.add(item['标题'])
-                    unique_comments.append(item)
-            return pd.DataFrame(unique_comments[:20])
-    except Exception as e:
-        print(f"Guba scraping error: {e}")
-    return pd.DataFrame()
+    """爬取东方财富股吧评论 (多页并发抓取并跨页去重；阅读/评论为整数，时间为 Timestamp)"""
+    return get_guba_crawler().crawl(code)
 
 def get_stock_notices(code):
-    """获取公司公告 (使用东方财富API)"""
-    try:
-        # 构造API URL
-        url = f"https://np-anotice-stock.eastmoney.com/api/security/ann?cb=jQuery123&page_index=1&page_size=20&ann_type=A&client_source=web&stock_list={code}&f_node=1&s_node=1"
-        headers = {
-            "User-Agent": "Mozilla/5.0",
-            "Referer": "https://data.eastmoney.com/"
-        }
-        response = requests.get(url, headers=headers, timeout=5)
-        if response.status_code == 200:
-            # 解析JSONP
-            text = response.text
-            start = text.find('(') + 1
-            end = text.rfind(')')
-            if start > 0 and end > 0:
-                json_str = text[start:end]
-                data = json.loads(json_str)
-                if 'data' in data and 'list' in data['data']:
-                    notices = []
-                    for item in data['data']['list']:
-                        # 修正字段获取
-                        title = item.get('title', item.get('art_title', '公告'))
-                        date = item.get('notice_date', '')[:10]
-                        art_code = item.get('art_code')
-                        
-                        # 尝试获取股票代码
-                        stock_code = code
-                        if item.get('codes'):
-                            stock_code = item.get('codes')[0].get('stock_code', code)
-                            
-                        # 修正链接格式: stock_code/art_code.html
-                        link = f"https://data.eastmoney.com/notices/detail/{stock_code}/{art_code}.html"
-                        
-                        # 获取公告类型
-                        ann_type = "公告"
-                        if item.get('columns'):
-                            ann_type = item.get('columns')[0].get('column_name', '公告')
-                            
-                        notices.append({
-                            "公告标题": title,
-                            "公告类型": ann_type,
-                            "公告日期": date,
-                            "链接": link
-                        })
-                    return pd.DataFrame(notices)
-    except Exception as e:
-        print(f"Notices API error: {e}")
-    return pd.DataFrame()
+    """获取公司公告 (本地公告库，超过轮询间隔时先增量拉取东方财富公告API)"""
+    store = get_notice_store()
+    store.poll_if_stale(code)
+    return store.notices(code)
 
 def get_stock_reports(code):
     """获取机构研报 (使用AkShare)"""
     try:
-        df = ak.stock_research_report_em(symbol=code)
+        df = get_upstream().ak("stock_research_report_em", symbol=code)
         if not df.empty:
             # 筛选需要的列
             # 实际列名: '报告名称', '机构', '东财评级', '日期', '报告PDF链接'
@@ -199,148 +88,140 @@ def get_stock_reports(code):
 
 
 def get_financial_report_em(code, report_type='zcfzb'):
-    """获取详细财务报表 (zcfzb=资产负债表, xjllb=现金流量表, lrb=利润表)"""
-    try:
-        # 转换代码格式: 000001 -> SZ000001
-        market = "SZ" if code.startswith(('0', '3')) else "SH" if code.startswith('6') else "BJ"
-        symbol = f"{market}{code}"
-        
-        url = f"https://emweb.securities.eastmoney.com/PC_HSF10/NewFinanceAnalysis/{report_type}Ajax?companyType=4&reportDateType=0&reportType=1&endDate=&code={symbol}"
-        headers = {
-            "User-Agent": "Mozilla/5.0",
-            "Referer": f"https://emweb.securities.eastmoney.com/PC_HSF10/NewFinanceAnalysis/Index?type=web&code={symbol}"
-        }
-        response = requests.get(url, headers=headers, timeout=5)
-        if response.status_code == 200:
-            try:
-                data = response.json()
-                if 'data' in data and data['data']:
-                    df = pd.DataFrame(data['data'])
-                    # 简单的列名映射 (示例，实际列名很多)
-                    # 东方财富返回的key通常是英文缩写，如 REPORT_DATE
-                    # 我们直接返回原始数据，让 Pandas 展示
-                    return df
-            except ValueError:
-                pass
-    except Exception as e:
-        print(f"Financial API error ({report_type}): {e}")
-    return pd.DataFrame()
+    """获取详细财务报表 (zcfzb=资产负债表, xjllb=现金流量表, lrb=利润表)，优先读取本地按报告期缓存"""
+    return get_financial_cache().get(code, report_type)
+
+def get_financial_statements(code):
+    """财务摘要与三大报表 (abstract, lrb, zcfzb, xjllb)；未缓存或已过期的报表并发拉取"""
+    statements = get_financial_cache().get_many(code, FINANCIAL_KINDS)
+    return tuple(statements[kind] for kind in FINANCIAL_KINDS)
+
+# --- 单飞数据加载 (同一时间窗口内相同请求只访问一次上游) ---
+
+def load_individual_info(code):
+    """个股资料 (ak.stock_individual_info_em)"""
+    return get_data_loader().load("stock_individual_info_em", get_upstream().ak, "stock_individual_info_em", symbol=code, metric_symbol=code)
+
+def load_financial_abstract(code):
+    """财务摘要 (ak.stock_financial_abstract，经本地财务缓存)"""
+    return get_data_loader().load("stock_financial_abstract", get_financial_cache().get, code, 'abstract', metric_symbol=code)
+
+def load_financial_statements(code):
+    """财务摘要与三大报表"""
+    return get_data_loader().load("financial_statements", get_financial_statements, code, metric_symbol=code)
+
+def load_stock_notices(code, viewer=None):
+    """公司公告 (增量拉取经单飞加载合并；读取直接来自本地公告库，"新" 标记按 viewer 的上次访问计算)"""
+    store = get_notice_store()
+    get_data_loader().load("stock_notices_poll", store.poll_if_stale, code, metric_symbol=code)
+    return store.notices(code, viewer)
+
+def notice_viewer():
+    """公告"新"标记的查看者: 启用登录时按用户邮箱区分，否则按浏览器会话区分"""
+    # st.user 仅 Streamlit 1.42 及以上提供，旧版本按会话区分
+    user = getattr(st, "user", None)
+    if user is not None and user.get("is_logged_in") and user.get("email"):
+        return f"user:{user.get('email')}"
+    return st.session_state.setdefault("notice_viewer", f"session:{uuid.uuid4().hex}")
+
+def load_guba_comments(code):
+    """股吧评论"""
+    return get_data_loader().load("guba_comments", get_guba_comments, code, metric_symbol=code)
 
-@st.cache_data(ttl=3600)
 def get_all_stock_spot_data():
-    """获取全市场实时行情数据 (带缓存)"""
+    """获取全市场实时行情数据 (来自共享行情快照服务，按代码索引)"""
+    return get_spot_service().snapshot()
+
+@cached(ttl=3600)
+def get_industry_hist(industry):
+    """行业指数历史 (近两年日K)"""
     try:
-        return ak.stock_zh_a_spot_em()
+        # 获取当前年份
+        current_year = datetime.now().year
+        # 为了避免年初无数据导致报错，获取近两年的数据
+        start_date = f"{current_year-1}0101"
+        end_date = f"{current_year}1231"
+        return get_upstream().ak("stock_board_industry_hist_em", symbol=industry, start_date=start_date, end_date=end_date, period="日k", adjust="qfq")
     except Exception as e:
-        print(f"Error fetching spot data: {e}")
+        print(f"Industry hist error: {e}")
         return pd.DataFrame()
 
-@st.cache_data(ttl=3600)
 def get_industry_peers(stock_code, stock_name):
-    """获取同行业对比数据及行业指数历史"""
+    """
+    获取同行业对比数据及行业指数历史
+    所属行业取自本地行业成员索引 (无需联网)，成分股及其排名/分位直接取自
+    全市场行业排名表；索引尚未建好 (首次部署时在后台构建) 或未覆盖该股票时，
+    退回到逐只查询所属行业并只对该行业计算排名。
+    """
     try:
-        # 1. 获取所属行业
-        info = ak.stock_individual_info_em(symbol=stock_code)
-        industry_row = info[info['item'] == '行业']
-        if industry_row.empty:
-            return None, pd.DataFrame(), pd.DataFrame()
-        
-        industry = industry_row['value'].values[0]
-        
-        # 2. 获取行业内成分股
-        peers = ak.stock_board_industry_cons_em(symbol=industry)
-        
-        # 补充总市值数据 (如果缺失)
-        if not peers.empty and '总市值' not in peers.columns:
-            spot_data = get_all_stock_spot_data()
-            if not spot_data.empty and '总市值' in spot_data.columns:
-                # 确保代码列格式一致
-                peers['代码'] = peers['代码'].astype(str)
-                spot_data['代码'] = spot_data['代码'].astype(str)
-                
-                # 合并总市值
-                peers = pd.merge(peers, spot_data[['代码', '总市值']], on='代码', how='left')
-
-        # 3. 获取行业指数历史
-        industry_hist = pd.DataFrame()
-        try:
-            # 获取当前年份
-            current_year = datetime.now().year
-            # 为了避免年初无数据导致报错，获取近两年的数据
-            start_date = f"{current_year-1}0101"
-            end_date = f"{current_year}1231"
-            industry_hist = ak.stock_board_industry_hist_em(symbol=industry, start_date=start_date, end_date=end_date, period="日k", adjust="qfq")
-        except Exception as e:
-            print(f"Industry hist error: {e}")
-
-        # 确保代码列为字符串，避免 pyarrow 转换错误
-        if not peers.empty and '代码' in peers.columns:
-            peers['代码'] = peers['代码'].astype(str)
-        
-        # 确保其他可能混淆的列也为字符串
-        for col in peers.columns:
-            if peers[col].dtype == 'object':
-                peers[col] = peers[col].astype(str)
-
-        # 确保数值列为数值类型
-        numeric_cols = ['最新价', '涨跌幅', '换手率', '市盈率-动态', '市净率', '总市值']
-        for col in numeric_cols:
-            if col in peers.columns:
-                peers[col] = pd.to_numeric(peers[col], errors='coerce')
-
-        return industry, peers, industry_hist
+        industry = get_industry_index().industry_of(stock_code)
+        if industry is not None:
+            peers = get_industry_ranks().peers(industry)
+        else:
+            info = load_individual_info(stock_code)
+            industry_row = info[info['item'] == '行业']
+            if industry_row.empty:
+                return None, pd.DataFrame(), pd.DataFrame()
+            industry = industry_row['value'].values[0]
+            peers = build_rank_table(get_all_stock_spot_data(), fetch_board_members(industry))
+        return industry, peers, get_industry_hist(industry)
     except Exception as e:
         print(f"Industry API error: {e}")
         return None, pd.DataFrame(), pd.DataFrame()
-        
-        return industry, peers
-    except Exception as e:
-        print(f"Peer analysis error: {e}")
-        return None, pd.DataFrame()
 
 # --- 数据获取函数 ---
 
-@st.cache_data(ttl=3600*24)  # 缓存24小时
+# 股票列表从未下载成功时使用的示例数据
+SAMPLE_STOCK_LIST = pd.DataFrame({
+    'code': ['000001', '000002', '600000', '600036'],
+    'name': ['平安银行', '万科A', '浦发银行', '招商银行']
+})
+
 def get_stock_list():
-    """获取A股所有股票列表 (带本地缓存)"""
-    file_path = "stock_list.csv"
-    
-    # 1. 尝试从本地读取
-    if os.path.exists(file_path):
-        try:
-            df = pd.read_csv(file_path, dtype={'code': str})
-            return df
-        except Exception:
-            pass # 读取失败则重新下载
-            
-    # 2. 本地没有或读取失败，从网络下载
+    """获取A股所有股票列表 (后台预热，每日刷新并保存到本地 stock_list.csv)"""
+    stock_info = get_warmup().read("stock_list")
+    if stock_info is None or stock_info.empty:
+        # 从未成功下载，返回示例数据
+        return SAMPLE_STOCK_LIST.copy()
+    return stock_info
+
+SEARCH_TOP_K = 20  # 搜索框最多展示的候选数量
+
+@st.cache_resource(ttl=3600*24)
+def build_stock_search_index():
+    """基于完整股票列表构建搜索索引 (代码/名称/拼音首字母)，进程内共享"""
+    stock_info = get_warmup().read("stock_list")
+    if stock_info is None or stock_info.empty:
+        # 抛出异常时 cache_resource 不缓存结果，下次运行重新尝试
+        raise ValueError("stock list not loaded")
+    return StockSearchIndex(stock_info)
+
+def get_stock_search_index():
+    """股票搜索索引；股票列表尚未加载成功时临时用示例数据构建，不缓存"""
     try:
-        with st.spinner('正在初始化股票列表，请稍候...'):
-            stock_info = ak.stock_info_a_code_name()
-            # 确保code是字符串
-            stock_info['code'] = stock_info['code'].astype(str)
-            # 保存到本地
-            stock_info.to_csv(file_path, index=False)
-            return stock_info
-    except:
-        # 3. 下载失败，返回示例数据
-        return pd.DataFrame({
-            'code': ['000001', '000002', '600000', '600036'],
-            'name': ['平安银行', '万科A', '浦发银行', '招商银行']
-        })
-
-@st.cache_data(ttl=60)  # 缓存1分钟
+        return build_stock_search_index()
+    except ValueError:
+        return StockSearchIndex(SAMPLE_STOCK_LIST)
+
+@cached(ttl=600)  # 缓存10分钟，各进程共享
+def get_indicator_snapshot():
+    """本地行情库中所有股票的最新技术指标 (选股器使用)"""
+    return indicator_snapshot()
+
 def get_market_indices():
-    """获取主要指数实时行情"""
-    try:
-        # 使用新浪接口获取指数数据 (更稳定)
-        df = ak.stock_zh_index_spot_sina()
-        # 筛选主要指数
-        target_indices = ['上证指数', '深证成指', '创业板指', '科创50']
-        filtered_df = df[df['名称'].isin(target_indices)].copy()
-        return filtered_df
-    except Exception as e:
-        return pd.DataFrame()
+    """主要指数实时行情 (新浪接口，后台按交易时段预热刷新)"""
+    df = get_warmup().read("market_indices")
+    return df if df is not None else pd.DataFrame()
+
+@st.cache_resource
+def start_warmup():
+    """随应用启动一次后台预热调度器"""
+    return get_warmup().start()
+
+@st.cache_resource
+def start_metrics_export():
+    """随应用启动一次性能指标导出线程 (定期写入 METRICS_PATH，供监控系统采集)"""
+    return get_metrics().start_export()
 
 def safe_dataframe(df):
     """
@@ -349,13 +230,181 @@ def safe_dataframe(df):
     """
     if df is None or df.empty:
         return df
-    
+
     df_out = df.copy()
     for col in df_out.columns:
         if df_out[col].dtype == 'object':
             df_out[col] = df_out[col].astype(str)
     return df_out
 
+def transpose_financial_abstract(abstract_df, periods=10):
+    """
+    财务摘要 (选项, 指标, 日期1, 日期2...) 中的常用指标转置为 行=报告期、列=指标，
+    索引转为 datetime，只保留最近 periods 个报告期；无常用指标时返回空表
+    """
+    main_indicators = abstract_df[abstract_df['选项'] == '常用指标']
+    if main_indicators.empty:
+        return pd.DataFrame()
+    # 设置索引为指标名，删除选项列后转置: 行变日期，列变指标
+    df_T = main_indicators.set_index('指标').drop(columns=['选项']).T
+    df_T.index = pd.to_datetime(df_T.index.astype(str), errors='coerce')
+    df_T.index.name = '日期'
+    return df_T.head(periods)
+
+def show_llm_response(prompt, system_prompt, spinner_text="正在生成..."):
+    """
+    调用 LLM 并在当前位置展示回复，返回完整文本 (供后续对话上下文使用)
+    LLM_STREAM 开启时逐 token 流式展示，否则等待完整回复后一次性展示。
+    失败时抛出 LLMError。
+    """
+    if LLM_STREAM:
+        return st.write_stream(call_llm(prompt, system_prompt, stream=True))
+    with st.spinner(spinner_text):
+        response = call_llm(prompt, system_prompt)
+    st.markdown(response)
+    return response
+
+# --- AI 分析上下文构建 ---
+
+AGENT_MAX_WORKERS = 4  # 同时请求 LLM 的分析师数量上限
+AGENT_TIMEOUT = 90  # 单次团队分析的最长等待时间 (秒)
+
+def fetch_basic_info_context(stock_code, stock_name):
+    info = load_individual_info(stock_code)
+    return {'basic_info': info.to_markdown()}
+
+def fetch_financial_context(stock_code, stock_name):
+    abstract_df = load_financial_abstract(stock_code)
+    if abstract_df.empty:
+        return {'financial_summary': "暂无数据"}
+    # 取最近几期常用指标
+    main_indicators = abstract_df[abstract_df['选项'] == '常用指标'].head(20)
+    return {'financial_summary': main_indicators.to_markdown()}
+
+def fetch_industry_context(stock_code, stock_name):
+    ind, peers_df, _ = get_industry_peers(stock_code, stock_name)
+    if not ind or peers_df.empty:
+        return {'industry_comparison': "暂无行业数据"}
+    # 简化的行业数据
+    simple_peers = peers_df.sort_values('市值排名')[['代码', '名称', '最新价', '涨跌幅', '市盈率-动态', '总市值']].head(10)
+    rank_lines = ""
+    if stock_code in peers_df.index:
+        row = peers_df.loc[stock_code]
+        rank_lines = "本股行业排名: " + ", ".join(
+            f"{name} {int(row[f'{name}排名'])}/{int(row[f'{name}样本数'])}" for name in RANK_METRICS if pd.notna(row[f'{name}排名'])
+        ) + "\n"
+    return {'industry_comparison': f"行业: {ind}\n" + rank_lines + simple_peers.to_markdown(index=False)}
+
+def daily_indicators(code):
+    """本地行情库中整段日线的技术指标 (按日期索引)；每只股票只对新到的K线增量计算"""
+    bars, _ = get_bar_store().load(code)
+    return get_indicator_cache().indicators(code, bars, last_complete_day())
+
+def fetch_price_context(stock_code, stock_name):
+    end_date = datetime.now().strftime("%Y%m%d")
+    # 多取一段历史供 MA60 / MACD 等指标预热，提示词中只展示最近几日
+    start_date = (datetime.now() - timedelta(days=180)).strftime("%Y%m%d")
+    df_hist = get_bar_store().get_bars(stock_code, start_date, end_date)
+    if df_hist.empty:
+        return {'price_action': "暂无行情"}
+    ind = daily_indicators(stock_code).reindex(df_hist['日期']).reset_index(drop=True)
+    df_hist['日期'] = df_hist['日期'].dt.strftime("%Y-%m-%d")
+    return {
+        'price_action': df_hist.tail(5).to_markdown(),
+        'volume_info': f"最新成交量: {df_hist.iloc[-1]['成交量']}",
+        'moving_averages': pd.concat([df_hist['日期'], ind[['MA5', 'MA20']]], axis=1).tail(5).to_markdown(),
+        'indicator_summary': summarize_indicators(df_hist, ind),
+    }
+
+def fetch_notices_context(stock_code, stock_name, viewer=None):
+    notices = load_stock_notices(stock_code, viewer)
+    if notices.empty:
+        return {'notices': "无近期公告"}
+    new = notices[notices['新']]
+    columns = ['公告日期', '公告类型', '公告标题']
+    if new.empty:
+        prefix = "自上次查看以来无新公告。最近公告:\n" if viewer is not None else "最近公告:\n"
+        return {'notices': prefix + notices[columns].head(5).to_markdown(index=False)}
+    return {'notices': f"自上次查看以来新增 {len(new)} 条公告:\n" + new[columns].to_markdown(index=False)}
+
+def fetch_comments_context(stock_code, stock_name):
+    comments = load_guba_comments(stock_code)
+    if comments.empty:
+        return {'comments': "无近期评论"}
+    recent = comments[['时间', '标题', '阅读', '评论']].head(20).copy()
+    recent['时间'] = recent['时间'].dt.strftime("%m-%d %H:%M")
+    summary = f"近 {len(comments)} 帖，合计阅读 {comments['阅读'].sum()}、评论 {comments['评论'].sum()}\n"
+    return {'comments': summary + recent.to_markdown(index=False)}
+
+# 数据源名称 -> (获取函数, 该数据源写入的 data_context 键, 超时秒数)
+CONTEXT_SOURCES = {
+    "基础信息": (fetch_basic_info_context, ['basic_info'], 10),
+    "财务摘要": (fetch_financial_context, ['financial_summary'], 15),
+    "行业对比": (fetch_industry_context, ['industry_comparison'], 20),
+    "行情数据": (fetch_price_context, ['price_action', 'indicator_summary'], 10),
+    "公司公告": (fetch_notices_context, ['notices'], 8),
+    "股吧评论": (fetch_comments_context, ['comments'], 8),
+}
+
+def context_sources(viewer):
+    """CONTEXT_SOURCES，其中公司公告按 viewer 的上次访问标记新公告"""
+    sources = dict(CONTEXT_SOURCES)
+    func, keys, timeout = sources["公司公告"]
+    sources["公司公告"] = (partial(func, viewer=viewer), keys, timeout)
+    return sources
+
+def build_data_context(stock_code, stock_name, sources=None, on_result=None):
+    """
+    并发获取 AI 分析所需的全部数据上下文
+    各数据源同时请求、各自超时，总等待时间取决于最慢的数据源而非所有数据源之和。
+    每当一个数据源完成 (或失败/超时) 即写入 data_context 并回调
+    on_result(source, status, elapsed)，status 为 "成功" / "失败" / "超时"。
+    返回 (data_context, timings)，timings 为 {数据源: (耗时秒数, status)}。
+    """
+    sources = sources or CONTEXT_SOURCES
+    data_context = {}
+    timings = {}
+
+    def record(source, status, elapsed, result=None):
+        _, keys, _ = sources[source]
+        if result is not None:
+            data_context.update(result)
+        else:
+            for key in keys:
+                data_context[key] = "获取超时" if status == "超时" else "获取失败"
+        timings[source] = (elapsed, status)
+        if on_result:
+            on_result(source, status, elapsed)
+
+    # 不使用 with 语句：超时的请求无法中断，退出时不应等待它们结束
+    executor = ThreadPoolExecutor(max_workers=len(sources))
+    start = time.perf_counter()
+    pending = {}
+    for source, (func, _, _) in sources.items():
+        pending[executor.submit(func, stock_code, stock_name)] = source
+
+    try:
+        while pending:
+            now = time.perf_counter() - start
+            next_deadline = min(sources[s][2] for s in pending.values())
+            done, _ = wait(pending, timeout=max(next_deadline - now, 0), return_when=FIRST_COMPLETED)
+            elapsed = time.perf_counter() - start
+            for future in done:
+                source = pending.pop(future)
+                try:
+                    record(source, "成功", elapsed, future.result())
+                except Exception as e:
+                    print(f"Context source error ({source}): {e}")
+                    record(source, "失败", elapsed)
+            for future, source in list(pending.items()):
+                if elapsed >= sources[source][2]:
+                    pending.pop(future)
+                    record(source, "超时", elapsed)
+    finally:
+        executor.shutdown(wait=False)
+
+    return data_context, timings
+
 # --- 页面组件 ---
 
 def show_market_overview():
@@ -394,9 +443,9 @@ def show_market_overview():
         st.subheader("🔥 行业板块涨幅 Top 5")
         try:
             # 获取行业板块实时行情
-            df_industry = ak.stock_board_industry_name_em()
+            df_industry = get_warmup().read("industry_boards")
             # 按涨跌幅排序
-            if not df_industry.empty and '涨跌幅' in df_industry.columns:
+            if df_industry is not None and not df_industry.empty and '涨跌幅' in df_industry.columns:
                 # 确保涨跌幅是数值
                 df_industry['涨跌幅'] = pd.to_numeric(df_industry['涨跌幅'], errors='coerce')
                 top_industries = df_industry.sort_values('涨跌幅', ascending=False).head(5)
@@ -414,8 +463,8 @@ def show_market_overview():
         try:
             # 获取北向资金概览
             # 注意：akshare接口变动频繁，这里使用 stock_hsgt_fund_flow_summary_em
-            df_flow = ak.stock_hsgt_fund_flow_summary_em()
-            if not df_flow.empty:
+            df_flow = get_warmup().read("hsgt_flow")
+            if df_flow is not None and not df_flow.empty:
                 # 只需要展示最新的几条或者当天的
                 # 假设返回包含 '日期', '北向资金', etc.
                 # 实际上这个接口返回的是历史数据还是实时？
@@ -432,25 +481,32 @@ def show_market_overview():
         except Exception as e:
             st.error(f"获取资金流向失败: {e}")
 
-def show_stock_research(stock_list):
+def show_stock_research(search_index):
     st.title("🔍 个股深度研究")
     
     col1, col2 = st.columns([1, 3])
     with col1:
-        search_method = st.radio("搜索方式", ["股票代码", "公司名称"], horizontal=True)
+        search_method = st.radio("搜索方式", ["股票代码", "公司名称"], horizontal=True, key="search_method")
         
         selected_stock_code = "000001"
         selected_stock_name = "平安银行"
         
         if search_method == "公司名称":
-            selected_stock_name = st.selectbox("输入/选择公司", stock_list['name'].tolist())
-            selected_stock_code = stock_list[stock_list['name'] == selected_stock_name]['code'].iloc[0]
+            query = st.text_input("输入名称或拼音首字母", "平安银行")
+            matches = search_index.search(query, k=SEARCH_TOP_K)
+            if matches:
+                selected_stock_code, selected_stock_name = st.selectbox(
+                    "选择公司", matches, format_func=lambda m: f"{m[1]} ({m[0]})"
+                )
+            else:
+                st.warning("未找到匹配的股票")
         else:
-            code_input = st.text_input("输入6位代码", "000001")
+            st.session_state.setdefault("research_code", "000001")
+            code_input = st.text_input("输入6位代码", key="research_code")
             code_clean = re.sub(r'\D', '', code_input)
-            if code_clean in stock_list['code'].values:
+            if code_clean in search_index:
                 selected_stock_code = code_clean
-                selected_stock_name = stock_list[stock_list['code'] == selected_stock_code]['name'].iloc[0]
+                selected_stock_name = search_index.name_of(selected_stock_code)
             else:
                 st.warning("未找到该代码")
     
@@ -464,65 +520,33 @@ def show_stock_research(stock_list):
     with tab1:
         st.subheader("K线走势与技术分析")
         try:
-            # 获取日线数据 (使用Sina接口作为备选)
+            c1, c2, c3, c4 = st.columns([1, 1, 2, 1])
+            range_label = c1.selectbox("区间", list(CHART_RANGES), index=2)
+            period_label = c2.selectbox("周期", ["自动", "日K", "周K", "月K"])
+            overlays = c3.multiselect("主图叠加", ["MA5", "MA10", "MA20", "MA60", "BOLL"], default=["MA5", "MA20"])
+            sub_indicator = c4.selectbox("副图指标", ["MACD", "RSI", "KDJ", "ATR", "OBV"])
+            range_days = CHART_RANGES[range_label]
+            period = {"自动": 'auto', "日K": 'D', "周K": 'W', "月K": 'M'}[period_label]
+
+            # 获取日线数据 (本地行情库，仅补齐缺失的交易日)，多取一段供指标预热
             end_date = datetime.now().strftime("%Y%m%d")
-            start_date = (datetime.now() - timedelta(days=365)).strftime("%Y%m%d")
-            
-            # 构建带前缀的代码
-            prefix = ""
-            if selected_stock_code.startswith('6'): prefix = "sh"
-            elif selected_stock_code.startswith(('0', '3')): prefix = "sz"
-            elif selected_stock_code.startswith(('8', '4')): prefix = "bj"
-            
-            symbol_with_prefix = prefix + selected_stock_code
-            
-            try:
-                # 尝试使用 stock_zh_a_daily (Sina源)
-                df_hist = ak.stock_zh_a_daily(symbol=symbol_with_prefix, start_date=start_date, end_date=end_date)
-                # 重命名列以匹配后续逻辑
-                df_hist = df_hist.rename(columns={
-                    'date': '日期', 'open': '开盘', 'high': '最高', 'low': '最低', 'close': '收盘', 'volume': '成交量'
-                })
-            except:
-                # 如果Sina失败，尝试原接口 (可能修复)
-                df_hist = ak.stock_zh_a_hist(symbol=selected_stock_code, period="daily", start_date=start_date, end_date=end_date, adjust="qfq")
+            start_date = history_start(range_days, period)
+            df_hist = get_bar_store().get_bars(selected_stock_code, start_date, end_date)
 
             if not df_hist.empty:
-                # 计算均线
-                df_hist['MA5'] = df_hist['收盘'].rolling(window=5).mean()
-                df_hist['MA20'] = df_hist['收盘'].rolling(window=20).mean()
-                
-                # K线图
-                fig = go.Figure()
-                
-                # K线
-                fig.add_trace(go.Candlestick(
-                    x=df_hist['日期'],
-                    open=df_hist['开盘'],
-                    high=df_hist['最高'],
-                    low=df_hist['最低'],
-                    close=df_hist['收盘'],
-                    name='日K'
-                ))
-                
-                # 均线
-                fig.add_trace(go.Scatter(x=df_hist['日期'], y=df_hist['MA5'], mode='lines', name='MA5', line=dict(color='orange', width=1)))
-                fig.add_trace(go.Scatter(x=df_hist['日期'], y=df_hist['MA20'], mode='lines', name='MA20', line=dict(color='blue', width=1)))
-                
-                fig.update_layout(
-                    xaxis_rangeslider_visible=False,
-                    height=500,
-                    title_text=f"{selected_stock_name} 日K线图",
-                    yaxis_title="价格",
-                    dragmode='pan'
-                )
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # 成交量图
-                fig_vol = go.Figure()
-                fig_vol.add_trace(go.Bar(x=df_hist['日期'], y=df_hist['成交量'], name='成交量', marker_color='lightblue'))
-                fig_vol.update_layout(height=200, title_text="成交量", margin=dict(t=30))
-                st.plotly_chart(fig_vol, use_container_width=True)
+                # 长区间自动聚合为周K/月K (强制周期超出K线上限时改用更粗的周期)，线条超过上限时 LTTB 降采样，均使用 WebGL 绘制
+                requested = period
+                bars, ind, period, clipped = prepare_chart(df_hist, range_days, period, daily_indicators(selected_stock_code))
+                period_name = PERIODS[period][0]
+                caption = f"{range_label}{period_name}，共 {len(bars)} 根"
+                if requested != 'auto' and requested != period:
+                    caption += f"（{PERIODS[requested][0]}超过 {CHART_MAX_CANDLES} 根上限，已改为{period_name}）"
+                if clipped:
+                    caption += f"（仅显示最近 {CHART_MAX_CANDLES} 根）"
+                st.caption(caption)
+                st.plotly_chart(price_figure(bars, ind, overlays, f"{selected_stock_name} {period_name}图"), use_container_width=True)
+                st.plotly_chart(volume_figure(bars, ind), use_container_width=True)
+                st.plotly_chart(indicator_figure(bars, ind, sub_indicator), use_container_width=True)
                 
                 # 最新行情数据
                 latest = df_hist.iloc[-1]
@@ -535,7 +559,7 @@ def show_stock_research(stock_list):
                 m2.metric("开盘", f"{latest['开盘']:.2f}")
                 m3.metric("最高", f"{latest['最高']:.2f}")
                 m4.metric("最低", f"{latest['最低']:.2f}")
-                m5.metric("成交量", f"{latest['成交量']/10000:.0f} 万手")
+                m5.metric("成交量", f"{latest['成交量']/1000000:.0f} 万手")
                 
             else:
                 st.warning("暂无行情数据")
@@ -547,7 +571,7 @@ def show_stock_research(stock_list):
         try:
             # 尝试获取详细信息，如果失败则使用实时行情中的简要信息
             try:
-                info = ak.stock_individual_info_em(symbol=selected_stock_code)
+                info = load_individual_info(selected_stock_code)
                 # 确保 value 列为字符串，避免 PyArrow 混合类型错误
                 info['value'] = info['value'].astype(str)
                 info_dict = dict(zip(info['item'], info['value']))
@@ -566,10 +590,8 @@ def show_stock_research(stock_list):
                 
             except Exception:
                 # 备用方案：从实时行情中获取
-                spot_df = ak.stock_zh_a_spot_em()
-                stock_spot = spot_df[spot_df['代码'] == selected_stock_code]
-                if not stock_spot.empty:
-                    row = stock_spot.iloc[0]
+                row = get_spot_service().quote(selected_stock_code)
+                if row is not None:
                     st.info("详细资料获取受限，显示实时概况：")
                     c1, c2, c3 = st.columns(3)
                     c1.metric("总市值", f"{row['总市值']/100000000:.2f} 亿")
@@ -588,11 +610,11 @@ def show_stock_research(stock_list):
     with tab3:
         st.subheader("财务数据全览")
         
-        # 使用 stock_financial_abstract 作为主要数据源
+        # 摘要与三大报表一次取齐 (本地缓存按报告期失效，未命中时并发拉取)
         try:
-            abstract_df = ak.stock_financial_abstract(symbol=selected_stock_code)
+            abstract_df, income_df, balance_df, cash_df = load_financial_statements(selected_stock_code)
         except:
-            abstract_df = pd.DataFrame()
+            abstract_df = income_df = balance_df = cash_df = pd.DataFrame()
 
         ft1, ft2, ft3, ft4 = st.tabs(["关键指标", "利润表", "资产负债表", "现金流量表"])
         
@@ -600,25 +622,8 @@ def show_stock_research(stock_list):
             if not abstract_df.empty:
                 st.markdown("#### 核心财务指标趋势")
                 
-                # 数据清洗与转置
-                # 假设结构: 选项, 指标, 日期1, 日期2...
-                # 我们需要提取 '常用指标'
-                main_indicators = abstract_df[abstract_df['选项'] == '常用指标'].copy()
-                if not main_indicators.empty:
-                    # 设置索引为指标名，删除选项列
-                    main_indicators = main_indicators.set_index('指标').drop(columns=['选项'])
-                    # 转置: 行变日期，列变指标
-                    df_T = main_indicators.T
-                    df_T.index.name = '日期'
-                    
-                    # 转换索引为 datetime 对象，以便正确绘图
-                    # 确保索引是字符串格式的日期
-                    df_T.index = df_T.index.astype(str)
-                    df_T.index = pd.to_datetime(df_T.index, errors='coerce')
-                    
-                    # 只取最近的N个报告期 (前10列 -> 前10行)
-                    df_recent = df_T.head(10)
-                    
+                df_recent = transpose_financial_abstract(abstract_df)
+                if not df_recent.empty:
                     st.dataframe(safe_dataframe(df_recent), use_container_width=True)
                     
                     # 绘图
@@ -652,42 +657,30 @@ def show_stock_research(stock_list):
                 st.info("暂无财务摘要数据")
 
         with ft2:
-            st.markdown("#### 利润表摘要")
-            if not abstract_df.empty:
-                # 尝试筛选利润表相关 (这里简单展示所有数据，或者筛选特定行)
-                # 由于abstract包含所有，我们展示原始表格的转置版本，方便查看
+            st.markdown("#### 利润表 (近期)")
+            if not income_df.empty:
+                st.dataframe(income_df.iloc[:, :20], use_container_width=True)
+            elif not abstract_df.empty:
+                # 利润表接口无数据时退回财务摘要
                 st.dataframe(safe_dataframe(abstract_df), use_container_width=True)
             else:
                 st.info("暂无数据")
 
         with ft3:
             st.markdown("#### 资产负债表 (近期)")
-            try:
-                balance_df = get_financial_report_em(selected_stock_code, 'zcfzb')
-                if not balance_df.empty:
-                    # 筛选关键列 (示例)
-                    # 假设我们只展示前几列和日期
-                    cols = [c for c in balance_df.columns if 'DATE' in c or 'ASSET' in c or 'LIAB' in c or 'EQUITY' in c]
-                    # 如果没有匹配到英文列名，可能返回的是中文key或者其他
-                    # 直接展示前20列
-                    st.dataframe(balance_df.iloc[:, :20], use_container_width=True)
-                else:
-                    st.info("暂无资产负债表数据")
-                    st.markdown(f"[点击查看东方财富详细报表](https://data.eastmoney.com/bbsj/{selected_stock_code}.html)")
-            except:
-                st.info("获取失败")
+            if not balance_df.empty:
+                st.dataframe(balance_df.iloc[:, :20], use_container_width=True)
+            else:
+                st.info("暂无资产负债表数据")
+                st.markdown(f"[点击查看东方财富详细报表](https://data.eastmoney.com/bbsj/{selected_stock_code}.html)")
 
         with ft4:
             st.markdown("#### 现金流量表 (近期)")
-            try:
-                cash_df = get_financial_report_em(selected_stock_code, 'xjllb')
-                if not cash_df.empty:
-                    st.dataframe(cash_df.iloc[:, :20], use_container_width=True)
-                else:
-                    st.info("暂无现金流量表数据")
-                    st.markdown(f"[点击查看东方财富详细报表](https://data.eastmoney.com/bbsj/{selected_stock_code}.html)")
-            except:
-                st.info("获取失败")
+            if not cash_df.empty:
+                st.dataframe(cash_df.iloc[:, :20], use_container_width=True)
+            else:
+                st.info("暂无现金流量表数据")
+                st.markdown(f"[点击查看东方财富详细报表](https://data.eastmoney.com/bbsj/{selected_stock_code}.html)")
 
     with tab4:
         st.subheader("资讯与公告")
@@ -696,14 +689,16 @@ def show_stock_research(stock_list):
         with nt1:
             st.markdown("#### 东方财富股吧热帖")
             try:
-                comments_df = get_guba_comments(selected_stock_code)
+                comments_df = load_guba_comments(selected_stock_code)
                 if not comments_df.empty:
-                    for i, row in comments_df.iterrows():
+                    st.caption(f"共抓取 {len(comments_df)} 帖，合计阅读 {comments_df['阅读'].sum():,}，评论 {comments_df['评论'].sum():,}；以下为最新 20 帖")
+                    for i, row in comments_df.head(20).iterrows():
                         col1, col2 = st.columns([4, 1])
                         with col1:
                             st.markdown(f"[{row['标题']}]({row['链接']})")
                             # 显示更多信息: 作者, 时间, 阅读, 评论
-                            st.caption(f"作者: {row.get('作者', '未知')} | 时间: {row['时间']} | 阅读: {row['阅读']} | 评论: {row['评论']}")
+                            post_time = row['时间'].strftime("%m-%d %H:%M") if pd.notna(row['时间']) else "-"
+                            st.caption(f"作者: {row.get('作者', '未知')} | 时间: {post_time} | 阅读: {row['阅读']} | 评论: {row['评论']}")
                         with col2:
                             pass # 占位
                         st.divider()
@@ -716,11 +711,20 @@ def show_stock_research(stock_list):
         
         with nt2:
             try:
-                notices = get_stock_notices(selected_stock_code)
+                # 每个会话首次查看某只股票时记为该查看者的一次"访问"，之后到达的公告会标记为新
+                viewer = notice_viewer()
+                visited = st.session_state.setdefault("notice_visits", set())
+                if selected_stock_code not in visited:
+                    get_notice_store().poll_if_stale(selected_stock_code)
+                    get_notice_store().mark_seen(selected_stock_code, viewer)
+                    visited.add(selected_stock_code)
+                notices = load_stock_notices(selected_stock_code, viewer)
                 if not notices.empty:
+                    new_count = int(notices['新'].sum())
+                    st.caption(f"🆕 自上次查看以来新增 {new_count} 条公告" if new_count else "自上次查看以来暂无新公告")
                     # 格式化显示
                     for i, row in notices.iterrows():
-                        with st.expander(f"{row['公告日期']} | {row['公告标题']}"):
+                        with st.expander(f"{'🆕 ' if row['新'] else ''}{row['公告日期']} | {row['公告标题']}"):
                             st.write(f"类型: {row['公告类型']}")
                             if row['链接']:
                                 st.markdown(f"[查看公告详情]({row['链接']})")
@@ -753,62 +757,34 @@ def show_stock_research(stock_list):
         if industry and not peers.empty:
             st.info(f"当前所属行业: {industry} (共 {len(peers)} 只成分股)")
             
-            # 初始化 curr_row，防止后续引用报错
+            # 排名与分位已在行业排名表中算好，这里只按代码取行
             curr_row = None
-            if '代码' in peers.columns:
-                current_stock = peers[peers['代码'] == selected_stock_code]
-                if not current_stock.empty:
-                    curr_row = current_stock.iloc[0]
-
-            # 数据预处理
-            if '总市值' in peers.columns and '市盈率-动态' in peers.columns:
-                # 估算净利润 (市值 / PE)
-                peers['估算净利润'] = peers.apply(lambda x: x['总市值'] / x['市盈率-动态'] if x['市盈率-动态'] > 0 else 0, axis=1)
-                
-                # 计算排名
-                peers['市值排名'] = peers['总市值'].rank(ascending=False)
-                peers['净利润排名'] = peers['估算净利润'].rank(ascending=False)
-                
-                # 更新 curr_row 以包含新计算的排名列
-                if curr_row is not None:
-                    current_stock = peers[peers['代码'] == selected_stock_code]
-                    if not current_stock.empty:
-                        curr_row = current_stock.iloc[0]
-                    
-                total_peers = len(peers)
-                    
-                # 1. 行业指数走势
-                if not industry_hist.empty:
-                    st.markdown("#### 📈 行业指数走势 (近两年)")
-                    fig_ind = px.line(industry_hist, x='日期', y='收盘', title=f"{industry}行业指数趋势")
-                    fig_ind.update_layout(xaxis_title="日期", yaxis_title="指数点位")
-                    st.plotly_chart(fig_ind, use_container_width=True)
+            current_stock = peers.iloc[:0]
+            if selected_stock_code in peers.index:
+                current_stock = peers.loc[[selected_stock_code]]
+                curr_row = current_stock.iloc[0]
 
-                st.divider()
+            # 1. 行业指数走势
+            if not industry_hist.empty:
+                st.markdown("#### 📈 行业指数走势 (近两年)")
+                fig_ind = px.line(industry_hist, x='日期', y='收盘', title=f"{industry}行业指数趋势")
+                fig_ind.update_layout(xaxis_title="日期", yaxis_title="指数点位")
+                st.plotly_chart(fig_ind, use_container_width=True)
 
-                # 2. 核心排名指标
-                if curr_row is not None:
-                    st.markdown("#### 🏆 核心指标排名")
-                    c1, c2, c3 = st.columns(3)
-                    
-                    # 市值排名
-                    mkt_rank = int(curr_row['市值排名'])
-                    mkt_pct = (total_peers - mkt_rank + 1) / total_peers * 100
-                    c1.metric("市值排名", f"{mkt_rank} / {total_peers}", f"超过 {mkt_pct:.1f}% 同行")
-                    
-                    # 净利润排名
-                    profit_rank = int(curr_row['净利润排名'])
-                    profit_pct = (total_peers - profit_rank + 1) / total_peers * 100
-                    c2.metric("净利润排名(估)", f"{profit_rank} / {total_peers}", f"超过 {profit_pct:.1f}% 同行")
-                    
-                    # 涨跌幅排名
-                    if '涨跌幅' in peers.columns:
-                        peers['涨跌幅排名'] = peers['涨跌幅'].rank(ascending=False)
-                        chg_rank = int(peers[peers['代码'] == selected_stock_code]['涨跌幅排名'].iloc[0])
-                        chg_pct = (total_peers - chg_rank + 1) / total_peers * 100
-                        c3.metric("今日涨跌幅排名", f"{chg_rank} / {total_peers}", f"超过 {chg_pct:.1f}% 同行")
-                else:
-                    st.warning("当前股票不在行业成分股列表中，无法显示排名。")
+            st.divider()
+
+            # 2. 核心排名指标
+            if curr_row is not None:
+                st.markdown("#### 🏆 核心指标排名")
+                rank_labels = {'市值': "市值排名", '净利润': "净利润排名(估)", '涨跌幅': "今日涨跌幅排名", '换手率': "换手率排名", '市盈率': "市盈率排名(低→高)"}
+                for col, (name, label) in zip(st.columns(len(rank_labels)), rank_labels.items()):
+                    rank = curr_row[f'{name}排名']
+                    if pd.isna(rank):
+                        col.metric(label, "-")
+                        continue
+                    col.metric(label, f"{int(rank)} / {int(curr_row[f'{name}样本数'])}", f"超过 {curr_row[f'{name}分位']:.1f}% 同行")
+            else:
+                st.warning("当前股票不在行业成分股列表中，无法显示排名。")
 
             st.divider()
             
@@ -1002,119 +978,89 @@ def show_stock_research(stock_list):
         st.subheader("🤖 AI 智能投顾团队分析")
         st.info("本模块由 Qwen-2.5-7B 模型驱动，模拟多角色投顾团队为您提供全方位分析。")
         
+        parallel_agents = st.checkbox("并行执行分析师", value=True, help="关闭后各分析师依次调用模型")
+
         if st.button("🚀 开始 AI 深度分析"):
             with st.spinner("AI 投顾团队正在召开研讨会，请稍候..."):
-                # 1. 收集数据上下文
-                data_context = {}
-                
-                # 基础信息
-                try:
-                    info = ak.stock_individual_info_em(symbol=selected_stock_code)
-                    data_context['basic_info'] = info.to_markdown()
-                except:
-                    data_context['basic_info'] = "获取失败"
-                
-                # 财务摘要
-                try:
-                    abstract_df = ak.stock_financial_abstract(symbol=selected_stock_code)
-                    if not abstract_df.empty:
-                        # 取最近几期常用指标
-                        main_indicators = abstract_df[abstract_df['选项'] == '常用指标'].head(20)
-                        data_context['financial_summary'] = main_indicators.to_markdown()
-                    else:
-                        data_context['financial_summary'] = "暂无数据"
-                except:
-                    data_context['financial_summary'] = "获取失败"
-                
-                # 行业对比 (复用之前的函数)
-                try:
-                    ind, peers_df, _ = get_industry_peers(selected_stock_code, selected_stock_name)
-                    if ind and not peers_df.empty:
-                        # 简化的行业数据
-                        simple_peers = peers_df[['代码', '名称', '最新价', '涨跌幅', '市盈率-动态', '总市值']].head(10)
-                        data_context['industry_comparison'] = f"行业: {ind}\n" + simple_peers.to_markdown()
-                    else:
-                        data_context['industry_comparison'] = "暂无行业数据"
-                except:
-                    data_context['industry_comparison'] = "获取失败"
-                
-                # 行情数据
-                try:
-                    end_date = datetime.now().strftime("%Y%m%d")
-                    start_date = (datetime.now() - timedelta(days=30)).strftime("%Y%m%d")
-                    df_hist = ak.stock_zh_a_hist(symbol=selected_stock_code, period="daily", start_date=start_date, end_date=end_date, adjust="qfq")
-                    if not df_hist.empty:
-                        data_context['price_action'] = df_hist.tail(5).to_markdown()
-                        data_context['volume_info'] = f"最新成交量: {df_hist.iloc[-1]['成交量']}"
-                        # 简单计算均线
-                        df_hist['MA5'] = df_hist['收盘'].rolling(window=5).mean()
-                        df_hist['MA20'] = df_hist['收盘'].rolling(window=20).mean()
-                        data_context['moving_averages'] = df_hist[['日期', 'MA5', 'MA20']].tail(5).to_markdown()
-                    else:
-                        data_context['price_action'] = "暂无行情"
-                except:
-                    data_context['price_action'] = "获取失败"
-                
-                # 资讯数据
-                try:
-                    notices = get_stock_notices(selected_stock_code)
-                    data_context['notices'] = notices.head(5).to_markdown() if not notices.empty else "无近期公告"
-                    
-                    comments = get_guba_comments(selected_stock_code)
-                    data_context['comments'] = comments[['标题', '阅读', '评论']].head(10).to_markdown() if not comments.empty else "无近期评论"
-                except:
-                    data_context['notices'] = "获取失败"
-                    data_context['comments'] = "获取失败"
+                # 1. 并发收集数据上下文
+                progress = st.empty()
+                finished = []
+
+                def on_context_result(source, status, elapsed):
+                    finished.append(f"{source} {status} ({elapsed:.1f}s)")
+                    progress.caption(f"数据获取 {len(finished)}/{len(CONTEXT_SOURCES)}: " + " | ".join(finished))
+
+                data_context, timings = build_data_context(selected_stock_code, selected_stock_name, sources=context_sources(notice_viewer()), on_result=on_context_result)
+
+                with st.expander("⏱️ 数据获取耗时", expanded=False):
+                    timing_df = pd.DataFrame(
+                        [(source, f"{elapsed:.2f}", status) for source, (elapsed, status) in timings.items()],
+                        columns=['数据源', '耗时(秒)', '状态']
+                    ).sort_values('耗时(秒)', key=lambda s: s.astype(float), ascending=False)
+                    st.dataframe(timing_df, use_container_width=True, hide_index=True)
 
                 # 2. 初始化 Agents
-                agents = [
-                    FundamentalAnalyst(),
-                    TechnicalAnalyst(),
-                    NewsAnalyst(),
-                    RiskManager()
-                ]
+                agents = build_team()
                 
-                # 3. 并行或顺序执行分析 (这里用顺序简单实现，Streamlit不支持简单的多线程UI更新)
+                # 3. 并行执行分析: 所有 Agent 同时请求 LLM，谁先完成谁先展示
                 cols = st.columns(2)
-                
+
                 # 保存分析结果到 session_state 以便后续对话使用
-                if 'ai_analysis_results' not in st.session_state:
-                    st.session_state.ai_analysis_results = {}
-                
                 # 清空旧的分析结果 (如果是重新点击按钮)
                 st.session_state.ai_analysis_results = {}
 
+                # 先为每个 Agent 占好位置，结果返回后原地填充
+                placeholders = {}
                 for i, agent in enumerate(agents):
                     with cols[i % 2]:
                         with st.chat_message(agent.name, avatar="🧑‍💼" if i % 2 == 0 else "👩‍💻"):
-                            st.write(f"**{agent.role} ({agent.name})** 正在分析...")
-                            try:
-                                analysis = agent.analyze(selected_stock_name, selected_stock_code, data_context)
+                            st.write(f"**{agent.role} ({agent.name})**")
+                            placeholders[agent.name] = st.empty()
+                            placeholders[agent.name].caption("正在分析...")
+
+                if parallel_agents:
+                    max_workers, timeout = AGENT_MAX_WORKERS, AGENT_TIMEOUT
+                else:
+                    max_workers, timeout = 1, None
+                if LLM_STREAM:
+                    for agent, text, done, error, elapsed in stream_agents(agents, selected_stock_name, selected_stock_code, data_context, max_workers=max_workers, timeout=timeout):
+                        if not done:
+                            placeholders[agent.name].markdown(text)
+                            continue
+                        with placeholders[agent.name].container():
+                            if error is not None:
+                                if text:
+                                    st.markdown(text)
+                                st.error(f"分析出错: {error}")
+                            else:
+                                st.markdown(text)
+                                st.caption(f"耗时 {elapsed:.1f}s · 提示词 {agent.prompt_stats.get('raw_tokens')} → {agent.prompt_stats.get('prompt_tokens')} tokens")
+                                st.session_state.ai_analysis_results[agent.name] = text
+                else:
+                    for agent, analysis, error, elapsed in run_agents(agents, selected_stock_name, selected_stock_code, data_context, max_workers=max_workers, timeout=timeout):
+                        with placeholders[agent.name].container():
+                            if error is not None:
+                                st.error(f"分析出错: {error}")
+                            else:
                                 st.markdown(analysis)
+                                st.caption(f"耗时 {elapsed:.1f}s · 提示词 {agent.prompt_stats.get('raw_tokens')} → {agent.prompt_stats.get('prompt_tokens')} tokens")
                                 st.session_state.ai_analysis_results[agent.name] = analysis
-                            except Exception as e:
-                                st.error(f"分析出错: {e}")
-        
+
         # 4. 综合总结与问答
         st.divider()
         st.subheader("💬 与投顾团队对话")
         
         if 'ai_analysis_results' in st.session_state and st.session_state.ai_analysis_results:
             # 综合总结
-            if 'summary' not in st.session_state:
-                with st.spinner("正在生成综合投资建议..."):
-                    summary_prompt = f"""
-                    Based on the following analyses for {selected_stock_name} ({selected_stock_code}), provide a comprehensive investment summary and a final rating (Buy/Hold/Sell).
-                    
-                    Analyses:
-                    {json.dumps(st.session_state.ai_analysis_results, ensure_ascii=False)}
-                    
-                    Output format: Markdown.
-                    """
-                    st.session_state.summary = call_llm(summary_prompt, "You are a Chief Investment Officer (CIO). Synthesize the reports from your team.")
-            
             with st.expander("📋 查看首席投资官 (CIO) 综合报告", expanded=True):
-                st.markdown(st.session_state.summary)
+                if 'summary' not in st.session_state:
+                    summary_prompt = build_cio_prompt(selected_stock_name, selected_stock_code, st.session_state.ai_analysis_results)
+                    try:
+                        st.session_state.summary = show_llm_response(summary_prompt, CIO_SYSTEM_PROMPT, "正在生成综合投资建议...")
+                    except LLMError as e:
+                        st.error(f"综合报告生成失败: {e}")
+                else:
+                    st.markdown(st.session_state.summary)
 
             # 聊天界面
             if "messages" not in st.session_state:
@@ -1130,30 +1076,91 @@ def show_stock_research(stock_list):
                     st.markdown(prompt)
 
                 with st.chat_message("assistant"):
-                    with st.spinner("团队正在讨论..."):
-                        # 构建上下文
-                        context_str = f"""
-                        Stock: {selected_stock_name} ({selected_stock_code})
-                        Data Context: {str(data_context) if 'data_context' in locals() else 'N/A'}
-                        Previous Analyses: {json.dumps(st.session_state.ai_analysis_results, ensure_ascii=False)}
-                        CIO Summary: {st.session_state.summary}
-                        """
-                        
-                        chat_prompt = f"""
-                        Context:
-                        {context_str}
-                        
-                        User Question: {prompt}
-                        
-                        Answer the user's question based on the team's analysis.
-                        """
-                        response = call_llm(chat_prompt, "You are the representative of the investment committee.")
-                        st.markdown(response)
+                    # 构建上下文
+                    context_str = f"""
+                    Stock: {selected_stock_name} ({selected_stock_code})
+                    Data Context: {str(data_context) if 'data_context' in locals() else 'N/A'}
+                    Previous Analyses: {json.dumps(st.session_state.ai_analysis_results, ensure_ascii=False)}
+                    CIO Summary: {st.session_state.get('summary', 'N/A')}
+                    """
+                    
+                    chat_prompt = f"""
+                    Context:
+                    {context_str}
+                    
+                    User Question: {prompt}
+                    
+                    Answer the user's question based on the team's analysis.
+                    """
+                    try:
+                        response = show_llm_response(chat_prompt, "You are the representative of the investment committee.", "团队正在讨论...")
+                    except LLMError as e:
+                        st.error(f"回答生成失败: {e}")
+                    else:
                         st.session_state.messages.append({"role": "assistant", "content": response})
         else:
             st.info("请先点击上方按钮开始分析，生成报告后即可开启对话功能。")
 
-def show_portfolio_tool(stock_list):
+SCREENER_DEFAULT_EXPR = "pe > 0 and pe < 30 and mcap > 100"
+
+def open_stock_research(code):
+    """跳转到个股研究页并选中指定股票 (按钮回调，在组件创建前修改其状态)"""
+    st.session_state["page"] = "个股研究"
+    st.session_state["search_method"] = "股票代码"
+    st.session_state["research_code"] = code
+
+def show_screener():
+    st.title("🧮 全市场选股")
+    st.markdown("用表达式筛选全部 A 股，例如 `pe > 0 and pe < 20 and mcap > 100 and rsi < 30`，支持 `and` / `or` / `not` 与四则运算。")
+
+    labels = field_labels()
+    with st.expander("可用字段"):
+        st.table(pd.DataFrame({"字段": list(labels), "含义": list(labels.values())}))
+
+    expr = st.text_input("筛选条件", SCREENER_DEFAULT_EXPR)
+    industry_index = get_industry_index()
+    selected_industries = st.multiselect("限定行业 (留空为全部)", industry_index.industries())
+    if not industry_index.ready:
+        st.info("行业成员索引正在后台首次构建，行业筛选稍后可用")
+    c1, c2, c3 = st.columns(3)
+    sort_by = c1.selectbox("排序字段", list(labels), index=list(labels).index("mcap"), format_func=lambda f: f"{f} ({labels[f]})")
+    ascending = c2.radio("排序方向", ["降序", "升序"], horizontal=True) == "升序"
+    page_size = c3.selectbox("每页行数", [20, 50, 100])
+
+    spot_data = get_all_stock_spot_data()
+    if spot_data.empty:
+        st.warning("暂无全市场行情数据")
+        return
+    indicators = get_indicator_snapshot()
+
+    start = time.perf_counter()
+    frame = build_screen_frame(spot_data, indicators, industry_index.membership())
+    if selected_industries:
+        frame = frame[frame['行业'].isin(selected_industries)]
+    try:
+        result = screen(frame, expr, sort_by, ascending)
+    except Exception as e:
+        st.error(f"筛选条件有误: {e}")
+        return
+    elapsed = (time.perf_counter() - start) * 1000
+
+    st.caption(f"符合条件 {len(result)} 只 / 候选 {len(frame)} 只，耗时 {elapsed:.0f} ms；技术指标覆盖本地行情库中的 {len(indicators)} 只股票")
+    if result.empty:
+        st.info("没有符合条件的股票")
+        return
+
+    _, pages = paginate(result, 1, page_size)
+    page = st.number_input(f"页码 (共 {pages} 页)", min_value=1, max_value=pages, value=1)
+    rows, _ = paginate(result, page, page_size)
+    # 只把当前页发给浏览器
+    display = rows.rename(columns=labels).round(2)
+    st.dataframe(display, use_container_width=True)
+
+    c1, c2 = st.columns([3, 1])
+    code = c1.selectbox("选择股票", rows.index, format_func=lambda c: f"{rows.at[c, '名称']} ({c})")
+    c2.button("🔍 查看个股研究", on_click=open_stock_research, args=(code,))
+
+def show_portfolio_tool(search_index):
     st.title("💼 投资组合模拟器")
     st.markdown("根据您的预算，计算可以购买的股票数量，并提供风险对冲建议。")
     
@@ -1161,19 +1168,25 @@ def show_portfolio_tool(stock_list):
     with col1:
         budget = st.number_input("请输入您的总预算 (元)", min_value=1000.0, value=50000.0, step=1000.0)
         
-        stock_name = st.selectbox("选择拟投资股票", stock_list['name'].tolist(), key="portfolio_stock")
-        stock_code = stock_list[stock_list['name'] == stock_name]['code'].iloc[0]
+        query = st.text_input("搜索拟投资股票 (代码/名称/拼音首字母)", "平安银行", key="portfolio_query")
+        matches = search_index.search(query, k=SEARCH_TOP_K)
+        stock_code = None
+        if matches:
+            stock_code, stock_name = st.selectbox(
+                "选择拟投资股票", matches, format_func=lambda m: f"{m[1]} ({m[0]})", key="portfolio_stock"
+            )
+        else:
+            st.warning("未找到匹配的股票")
         
     with col2:
         st.markdown("### 计算结果")
-        if st.button("计算可买股数"):
+        if st.button("计算可买股数", disabled=stock_code is None):
             try:
                 # 获取最新价格
-                df = ak.stock_zh_a_spot_em()
-                price_row = df[df['代码'] == stock_code]
-                
-                if not price_row.empty:
-                    current_price = price_row['最新价'].values[0]
+                quote = get_spot_service().quote(stock_code)
+
+                if quote is not None:
+                    current_price = quote['最新价']
                     
                     if current_price > 0:
                         # A股一手=100股
@@ -1199,55 +1212,84 @@ def show_portfolio_tool(stock_list):
     st.info("基于当前市场环境，AI 为您推荐的对冲策略。")
     
     if st.button("获取近期对冲策略"):
-        with st.spinner("正在分析市场风险并生成对冲建议..."):
-            try:
-                # 获取主要指数数据作为市场背景
+        try:
+            # 获取主要指数数据作为市场背景
+            with st.spinner("正在获取市场数据..."):
                 indices = get_market_indices()
-                indices_str = indices.to_markdown() if not indices.empty else "无法获取指数数据"
-                
-                prompt = f"""
-                Current Market Indices (A-Share):
-                {indices_str}
-                
-                Please provide 3-5 hedging strategies or stock categories suitable for the current A-share market environment to reduce portfolio risk.
-                
-                Please structure your answer as follows:
-                1. **Market Risk Assessment**: Analyze the current market sentiment and risk level (High/Medium/Low) based on the indices.
-                2. **Hedging Strategies**:
-                   *   **Strategy 1**: [Strategy Name]
-                       *   **Logic**: Why this works in the current environment.
-                       *   **Target Assets**: Specific sectors (e.g., Utilities, Banking), ETFs (e.g., Gold, Bond), or defensive stocks.
-                       *   **Action**: Buy/Hold/Reduce exposure.
-                   *   **Strategy 2**: ...
-                   *   **Strategy 3**: ...
-                
-                Consider factors like market volatility, sector rotation, and macro conditions.
-                Output format: Markdown. Please answer in Chinese.
-                """
-                response = call_llm(prompt, "You are a professional risk management expert specializing in the Chinese stock market.")
-                st.markdown(response)
-            except Exception as e:
-                st.error(f"获取建议失败: {e}")
+            indices_str = indices.to_markdown() if not indices.empty else "无法获取指数数据"
+            
+            prompt = f"""
+            Current Market Indices (A-Share):
+            {indices_str}
+            
+            Please provide 3-5 hedging strategies or stock categories suitable for the current A-share market environment to reduce portfolio risk.
+            
+            Please structure your answer as follows:
+            1. **Market Risk Assessment**: Analyze the current market sentiment and risk level (High/Medium/Low) based on the indices.
+            2. **Hedging Strategies**:
+               *   **Strategy 1**: [Strategy Name]
+                   *   **Logic**: Why this works in the current environment.
+                   *   **Target Assets**: Specific sectors (e.g., Utilities, Banking), ETFs (e.g., Gold, Bond), or defensive stocks.
+                   *   **Action**: Buy/Hold/Reduce exposure.
+               *   **Strategy 2**: ...
+               *   **Strategy 3**: ...
+            
+            Consider factors like market volatility, sector rotation, and macro conditions.
+            Output format: Markdown. Please answer in Chinese.
+            """
+            show_llm_response(prompt, "You are a professional risk management expert specializing in the Chinese stock market.", "正在分析市场风险并生成对冲建议...")
+        except Exception as e:
+            st.error(f"获取建议失败: {e}")
 
 # --- 主程序逻辑 ---
 
 def main():
+    # 后台预热共享数据 (股票列表、指数、行业板块、北向资金、全市场快照)
+    start_warmup()
+    start_metrics_export()
+
     # 侧边栏导航
     st.sidebar.title("功能导航")
-    page = st.sidebar.radio("前往", ["市场全景", "个股研究", "投资组合助手"])
+    page = st.sidebar.radio("前往", ["市场全景", "个股研究", "全市场选股", "投资组合助手"], key="page")
     
     st.sidebar.markdown("---")
     st.sidebar.info("数据来源: AkShare\n\n仅供学习研究，不构成投资建议。")
+    loader_stats = get_data_loader().stats()
+    st.sidebar.caption(f"数据加载: 上游请求 {loader_stats['upstream_calls']} 次，合并/复用节省 {loader_stats['saved']} 次")
+    host_stats = get_upstream().stats()
+    if host_stats:
+        with st.sidebar.expander("数据源状态"):
+            st.dataframe(pd.DataFrame(host_stats).set_index('host'), use_container_width=True)
+            st.caption("日线行情源 (对冲请求)")
+            st.dataframe(pd.DataFrame(get_bar_fetcher().stats()).set_index('source'), use_container_width=True)
+            st.caption("后台预热数据")
+            st.dataframe(pd.DataFrame(get_warmup().stats()).set_index('dataset'), use_container_width=True)
+            cache_stats = get_shared_cache().stats()
+            st.caption(
+                f"跨进程共享缓存: {cache_stats['entries']} 项 ({cache_stats['bytes'] / 1e6:.1f} MB)，"
+                f"本进程命中 {cache_stats['hits']} 次 / 过期值 {cache_stats['stale_hits']} 次 / 加载 {cache_stats['loads']} 次"
+            )
+    metrics = get_metrics()
+    latency = metrics.summary()
+    if latency:
+        with st.sidebar.expander("性能指标 (运维)"):
+            st.caption("各数据源 / 大模型调用耗时 (本进程最近调用)")
+            st.dataframe(pd.DataFrame(latency).set_index('source'), use_container_width=True)
+            st.caption("最近调用")
+            st.dataframe(safe_dataframe(pd.DataFrame(metrics.recent(30))), use_container_width=True, hide_index=True)
+            st.download_button("导出指标 (Prometheus 文本格式)", metrics.render(), file_name="metrics.prom", mime="text/plain")
     
-    # 获取股票列表（缓存）
-    stock_list = get_stock_list()
+    # 股票搜索索引（缓存）
+    search_index = get_stock_search_index()
     
     if page == "市场全景":
         show_market_overview()
     elif page == "个股研究":
-        show_stock_research(stock_list)
+        show_stock_research(search_index)
+    elif page == "全市场选股":
+        show_screener()
     elif page == "投资组合助手":
-        show_portfolio_tool(stock_list)
+        show_portfolio_tool(search_index)
 
 if __name__ == "__main__":
     main()
@@ -1,44 +1,410 @@
 import os
+import time
+import random
+import asyncio
+import threading
+import hashlib
+import sqlite3
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
 import requests
+from requests.adapters import HTTPAdapter
 import json
 
+from metrics import get_metrics
+
 # Qwen API config (env overrides)
 QWEN_API_KEY = os.getenv("QWEN_API_KEY", "ms-60c5577d-33b4-401f-ac7f-2479fdf4dfd5")
 QWEN_BASE_URL = os.getenv("QWEN_BASE_URL", "https://api-inference.modelscope.cn/v1/")
 QWEN_MODEL = os.getenv("QWEN_MODEL", "Qwen/Qwen2.5-7B-Instruct")
 
-def call_llm(prompt, system_prompt="You are a helpful assistant."):
+# Client tuning (env overrides)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Whether the app shows completions token by token (set LLM_STREAM=0 to disable)
+LLM_STREAM = os.getenv("LLM_STREAM", "1") != "0"
+
+# Response cache (env overrides; LLM_CACHE=0 disables it)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join("cache", "llm_cache.sqlite3"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+METRICS_SOURCE = "llm"
+
+
+@dataclass
+class LLMResult:
+    """Outcome of one chat completion, successful or not."""
+    content: str = ""
+    ok: bool = True
+    error: str = ""
+    status_code: int = 0
+    attempts: int = 0
+    elapsed: float = 0.0
+    usage: dict = field(default_factory=dict)
+
+    def record(self):
+        """File this completion in the process metrics (cache miss, tokens, bytes, outcome)."""
+        tokens = {"prompt": self.usage.get("prompt_tokens"), "completion": self.usage.get("completion_tokens")}
+        get_metrics().record(
+            METRICS_SOURCE, self.elapsed, "ok" if self.ok else "error", "miss",
+            size=len(self.content.encode("utf-8")), tokens=tokens
+        )
+
+
+class LLMError(Exception):
+    """Raised by call_llm when the API did not return a completion."""
+
+    def __init__(self, result):
+        super().__init__(result.error)
+        self.result = result
+
+
+def _retry_after_seconds(response):
+    """Parse a Retry-After header (delta-seconds or HTTP-date), or None."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMClient:
+    """
+    OpenAI-compatible chat client with a persistent connection pool.
+
+    One instance is meant to be shared by every session in the process:
+    connections are kept alive between calls, at most `max_concurrency`
+    requests are in flight at once, and 429/5xx responses or network errors
+    are retried with jittered exponential backoff that honours Retry-After.
+    """
+
+    def __init__(self, api_key=QWEN_API_KEY, base_url=QWEN_BASE_URL, model=QWEN_MODEL,
+                 timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES, backoff_base=LLM_BACKOFF_BASE,
+                 backoff_max=LLM_BACKOFF_MAX, max_concurrency=LLM_MAX_CONCURRENCY):
+        self.model = model
+        self.url = base_url.rstrip('/') + "/chat/completions"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._limiter = threading.BoundedSemaphore(max_concurrency)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+
+    def _backoff(self, attempt, response=None):
+        retry_after = _retry_after_seconds(response)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        # Full jitter: uniform in [0, base * 2^attempt], capped
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _payload(self, prompt, system_prompt, temperature):
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": temperature
+        }
+
+    def chat(self, prompt, system_prompt="You are a helpful assistant.", temperature=0.7):
+        """Send one chat completion request. Never raises for API errors; check `.ok`."""
+        data = self._payload(prompt, system_prompt, temperature)
+        start = time.perf_counter()
+        result = LLMResult(ok=False)
+
+        for attempt in range(self.max_retries + 1):
+            result.attempts = attempt + 1
+            response = None
+            try:
+                with self._limiter:
+                    response = self.session.post(self.url, json=data, timeout=self.timeout)
+                result.status_code = response.status_code
+                if response.status_code == 200:
+                    body = response.json()
+                    if body.get("choices"):
+                        result.content = body["choices"][0]["message"]["content"]
+                        result.usage = body.get("usage") or {}
+                        result.ok = True
+                        result.error = ""
+                        break
+                    result.error = f"No choices in response. {body}"
+                    break
+                result.error = f"API request failed with status code {response.status_code}. {response.text[:500]}"
+                if response.status_code not in RETRY_STATUS_CODES:
+                    break
+            except (requests.ConnectionError, requests.Timeout) as e:
+                result.error = f"Error calling LLM: {e}"
+            except Exception as e:
+                result.error = f"Error calling LLM: {e}"
+                break
+
+            if attempt < self.max_retries:
+                time.sleep(self._backoff(attempt, response))
+
+        result.elapsed = time.perf_counter() - start
+        result.record()
+        return result
+
+    def stream(self, prompt, system_prompt="You are a helpful assistant.", temperature=0.7):
+        """
+        Stream a chat completion over the OpenAI-compatible SSE protocol.
+
+        Yields content deltas as they arrive. Failures before the first token
+        are retried like `chat`; any failure raises LLMError, including one
+        that interrupts a stream already in progress.
+        """
+        data = dict(self._payload(prompt, system_prompt, temperature), stream=True)
+        start = time.perf_counter()
+        result = LLMResult(ok=False)
+        started = False
+
+        for attempt in range(self.max_retries + 1):
+            result.attempts = attempt + 1
+            response = None
+            try:
+                with self._limiter:
+                    with self.session.post(self.url, json=data, timeout=self.timeout, stream=True) as response:
+                        result.status_code = response.status_code
+                        if response.status_code == 200:
+                            for delta in self._iter_sse(response, result):
+                                started = True
+                                yield delta
+                            result.ok = True
+                            result.elapsed = time.perf_counter() - start
+                            result.record()
+                            return
+                        result.error = f"API request failed with status code {response.status_code}. {response.text[:500]}"
+                if response.status_code not in RETRY_STATUS_CODES:
+                    break
+            except (requests.ConnectionError, requests.Timeout) as e:
+                result.error = f"Error calling LLM: {e}"
+                if started:
+                    break
+            except Exception as e:
+                result.error = f"Error calling LLM: {e}"
+                break
+
+            if attempt < self.max_retries:
+                time.sleep(self._backoff(attempt, response))
+
+        result.elapsed = time.perf_counter() - start
+        result.record()
+        raise LLMError(result)
+
+    @staticmethod
+    def _iter_sse(response, result):
+        """Yield content deltas from an SSE response body."""
+        # Decode bytes ourselves: requests assumes ISO-8859-1 for text/event-stream
+        for line in response.iter_lines():
+            if not line or not line.startswith(b"data:"):
+                continue
+            payload = line[5:].strip()
+            if payload == b"[DONE]":
+                break
+            chunk = json.loads(payload.decode("utf-8"))
+            if chunk.get("usage"):
+                result.usage = chunk["usage"]
+            choices = chunk.get("choices") or []
+            if choices:
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    result.content += delta
+                    yield delta
+
+    async def achat(self, prompt, system_prompt="You are a helpful assistant.", temperature=0.7):
+        """asyncio entry point; runs `chat` on the default executor so the pool and limiter are shared."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.chat, prompt, system_prompt, temperature)
+
+    def close(self):
+        self.session.close()
+
+
+class LLMCache:
+    """
+    Disk-backed cache of completions, keyed by a fingerprint of
+    (model, system prompt, user prompt, temperature).
+
+    Entries expire after `ttl` seconds; once the stored text exceeds
+    `max_bytes`, the least recently used entries are evicted. SQLite keeps
+    writes atomic, so several processes can share one cache file.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_bytes=LLM_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, content TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    @staticmethod
+    def make_key(model, system_prompt, prompt, temperature):
+        raw = json.dumps([model, system_prompt, prompt, temperature], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT content FROM responses WHERE key = ? AND created > ?",
+                    (key, now - self.ttl)
+                ).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            print(f"LLM cache read error: {e}")
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, key, content):
+        now = time.time()
+        size = len(content.encode("utf-8"))
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, content, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, content, size, now, now)
+                )
+                conn.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl,))
+                self._evict(conn)
+        except sqlite3.Error as e:
+            print(f"LLM cache write error: {e}")
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+
+_client = None
+_cache = None
+_client_lock = threading.Lock()
+
+def get_llm_client():
+    """Return the process-wide shared LLMClient."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
+
+def configure_llm_client(**kwargs):
+    """Replace the shared client, e.g. configure_llm_client(max_concurrency=2)."""
+    global _client
+    with _client_lock:
+        old, _client = _client, LLMClient(**kwargs)
+    if old is not None:
+        old.close()
+    return _client
+
+def get_llm_cache():
+    """Return the process-wide LLMCache, or None when caching is disabled."""
+    global _cache
+    if _cache is None and LLM_CACHE_ENABLED:
+        with _client_lock:
+            if _cache is None:
+                _cache = LLMCache()
+    return _cache
+
+def _stream_and_cache(deltas, cache, key):
+    """Pass deltas through, storing the full text once the stream completes."""
+    parts = []
+    for delta in deltas:
+        parts.append(delta)
+        yield delta
+    cache.put(key, "".join(parts))
+
+def call_llm(prompt, system_prompt="You are a helpful assistant.", temperature=0.7, stream=False, use_cache=True):
     """
     Call the Qwen LLM API.
+    Returns the completion text, or with stream=True an iterator of text
+    deltas. Raises LLMError if no completion was produced.
+    Identical requests are answered from the response cache unless
+    use_cache=False.
     """
-    headers = {
-        "Authorization": f"Bearer {QWEN_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "model": QWEN_MODEL,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.7
-    }
-    
-    try:
-        # Adjust URL if needed. The provided base URL ends with /v1/, so we append chat/completions
-        url = QWEN_BASE_URL.rstrip('/') + "/chat/completions"
-        
-        response = requests.post(url, headers=headers, json=data, timeout=60)
-        
-        if response.status_code == 200:
-            result = response.json()
-            if "choices" in result and len(result["choices"]) > 0:
-                return result["choices"][0]["message"]["content"]
-            else:
-                return f"Error: No choices in response. {result}"
-        else:
-            return f"Error: API request failed with status code {response.status_code}. {response.text}"
-            
-    except Exception as e:
-        return f"Error calling LLM: {str(e)}"
+    client = get_llm_client()
+    cache = get_llm_cache() if use_cache else None
+    key = LLMCache.make_key(client.model, system_prompt, prompt, temperature) if cache else None
+
+    if cache:
+        start = time.perf_counter()
+        cached = cache.get(key)
+        if cached is not None:
+            get_metrics().record(METRICS_SOURCE, time.perf_counter() - start, "ok", "hit", size=len(cached.encode("utf-8")))
+            return iter([cached]) if stream else cached
+
+    if stream:
+        deltas = client.stream(prompt, system_prompt, temperature)
+        return _stream_and_cache(deltas, cache, key) if cache else deltas
+    result = client.chat(prompt, system_prompt, temperature)
+    if not result.ok:
+        raise LLMError(result)
+    if cache:
+        cache.put(key, result.content)
+    return result.content
+
+async def acall_llm(prompt, system_prompt="You are a helpful assistant.", temperature=0.7, use_cache=True):
+    """asyncio counterpart of call_llm."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: call_llm(prompt, system_prompt, temperature, use_cache=use_cache))
@@ -0,0 +1,210 @@
+import os
+import time
+import threading
+from collections import deque
+import numpy as np
+
+# Exported metrics file and how often it is rewritten (env overrides);
+# "{pid}" in the path gives each app process its own file
+METRICS_PATH = os.getenv("METRICS_PATH", os.path.join("cache", "metrics.prom"))
+METRICS_EXPORT_SECONDS = float(os.getenv("METRICS_EXPORT_SECONDS", "30"))
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "1000"))
+RECENT_CALLS = 200
+
+# Histogram bucket upper bounds in seconds (Prometheus `le` labels)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PREFIX = "robo"
+
+
+def payload_bytes(value):
+    """Approximate size of a call's result: body length for HTTP responses, memory for DataFrames / text."""
+    if value is None:
+        return None
+    if hasattr(value, "content") and isinstance(getattr(value, "content"), bytes):
+        return len(value.content)
+    if hasattr(value, "memory_usage"):
+        return int(value.memory_usage(index=True).sum())
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return None
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+class SourceMetrics:
+    """Latency histogram and counters of one source (an akshare function, a scraper, the LLM)."""
+
+    def __init__(self, source, window=METRICS_WINDOW):
+        self.source = source
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total_seconds = 0.0
+        self.outcomes = {}
+        self.cache = {}
+        self.bytes = 0
+        self.tokens = {"prompt": 0, "completion": 0}
+        self.latencies = deque(maxlen=window)
+
+    def add(self, seconds, outcome, cache, size, tokens):
+        self.buckets[int(np.searchsorted(BUCKETS, seconds))] += 1
+        self.count += 1
+        self.total_seconds += seconds
+        self.latencies.append(seconds)
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        if cache is not None:
+            self.cache[cache] = self.cache.get(cache, 0) + 1
+        if size:
+            self.bytes += size
+        for kind, count in (tokens or {}).items():
+            self.tokens[kind] = self.tokens.get(kind, 0) + (count or 0)
+
+    def add_lookup(self, cache):
+        self.cache[cache] = self.cache.get(cache, 0) + 1
+
+    def summary(self):
+        latencies = np.array(self.latencies) if self.latencies else np.array([np.nan])
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        lookups = sum(self.cache.values())
+        return {
+            "source": self.source,
+            "calls": self.count,
+            "errors": self.count - self.outcomes.get("ok", 0),
+            "cache_hit_rate": round(1 - self.cache.get("miss", 0) / lookups, 3) if lookups else None,
+            "p50_ms": round(float(p50), 1),
+            "p95_ms": round(float(p95), 1),
+            "p99_ms": round(float(p99), 1),
+            "bytes": self.bytes,
+            "tokens": sum(self.tokens.values()),
+        }
+
+
+class Metrics:
+    """
+    In-process latency and outcome metrics for every upstream and LLM call.
+
+    `record` files one timed call under its source with its outcome (ok,
+    error, stale, rejected), cache result (hit / merged / miss), payload bytes and
+    token counts. `record_lookup` counts a cache lookup whose call is timed
+    by another layer, so each call is recorded once. Each source keeps a cumulative latency histogram (for
+    export) and a window of recent latencies (for p50 / p95 / p99). Per-call
+    tags such as the symbol are kept only in a bounded list of recent calls,
+    so the exported series stay one set per source. `render` produces the
+    Prometheus text format; `write` saves it atomically for a textfile
+    collector.
+    """
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self.started = time.time()
+        self._sources = {}
+        self._recent = deque(maxlen=RECENT_CALLS)
+        self._lock = threading.Lock()
+        self._exporter = None
+
+    def record(self, source, seconds, outcome="ok", cache=None, symbol=None, size=None, tokens=None):
+        with self._lock:
+            metrics = self._sources.get(source)
+            if metrics is None:
+                metrics = self._sources[source] = SourceMetrics(source, self.window)
+            metrics.add(seconds, outcome, cache, size, tokens)
+            self._recent.append({
+                "time": time.strftime("%H:%M:%S"), "source": source, "symbol": symbol, "ms": round(seconds * 1000, 1),
+                "outcome": outcome, "cache": cache, "bytes": size, "tokens": sum(v or 0 for v in (tokens or {}).values()) or None,
+            })
+
+    def record_lookup(self, source, cache):
+        """Count a cache result (e.g. a miss) without recording a call."""
+        with self._lock:
+            metrics = self._sources.get(source)
+            if metrics is None:
+                metrics = self._sources[source] = SourceMetrics(source, self.window)
+            metrics.add_lookup(cache)
+
+    def summary(self):
+        """One dict per source, slowest p95 first."""
+        with self._lock:
+            rows = [m.summary() for m in self._sources.values()]
+        return sorted(rows, key=lambda r: -np.nan_to_num(r["p95_ms"]))
+
+    def recent(self, limit=50):
+        """The latest calls with their per-call tags, newest first."""
+        with self._lock:
+            return list(self._recent)[::-1][:limit]
+
+    def render(self):
+        """All sources in the Prometheus text exposition format."""
+        name = f"{PREFIX}_call_seconds"
+        lines = [
+            f"# HELP {name} Latency of upstream and LLM calls by source.",
+            f"# TYPE {name} histogram",
+        ]
+        counters = {
+            "calls_total": ("Calls by source and outcome.", []),
+            "cache_total": ("Cache lookups by source and result.", []),
+            "bytes_total": ("Payload bytes returned by source.", []),
+            "tokens_total": ("LLM tokens by source and kind.", []),
+        }
+        with self._lock:
+            for metrics in self._sources.values():
+                source = _label(metrics.source)
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), metrics.buckets):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{source="{source}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{source="{source}"}} {metrics.total_seconds:.6f}')
+                lines.append(f'{name}_count{{source="{source}"}} {metrics.count}')
+                for outcome, count in metrics.outcomes.items():
+                    counters["calls_total"][1].append(f'{{source="{source}",outcome="{outcome}"}} {count}')
+                for result, count in metrics.cache.items():
+                    counters["cache_total"][1].append(f'{{source="{source}",result="{result}"}} {count}')
+                if metrics.bytes:
+                    counters["bytes_total"][1].append(f'{{source="{source}"}} {metrics.bytes}')
+                for kind, count in metrics.tokens.items():
+                    if count:
+                        counters["tokens_total"][1].append(f'{{source="{source}",kind="{kind}"}} {count}')
+        for suffix, (help_text, samples) in counters.items():
+            lines.append(f"# HELP {PREFIX}_{suffix} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{suffix} counter")
+            lines.extend(f"{PREFIX}_{suffix}{sample}" for sample in samples)
+        lines.append(f"# TYPE {PREFIX}_process_start_time_seconds gauge")
+        lines.append(f"{PREFIX}_process_start_time_seconds {self.started:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path=METRICS_PATH):
+        """Write `render()` to `path` (via a temp file, so collectors never read a partial file)."""
+        path = path.format(pid=os.getpid())
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(path + ".tmp", path)
+        return path
+
+    def start_export(self, path=METRICS_PATH, interval=METRICS_EXPORT_SECONDS):
+        """Rewrite the metrics file every `interval` seconds from a background thread."""
+        def loop():
+            while True:
+                try:
+                    self.write(path)
+                except OSError as e:
+                    print(f"Metrics export error: {e}")
+                time.sleep(interval)
+        with self._lock:
+            if self._exporter is None:
+                self._exporter = threading.Thread(target=loop, name="metrics-export", daemon=True)
+                self._exporter.start()
+        return self
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def get_metrics():
+    """Return the process-wide Metrics."""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = Metrics()
+    return _metrics
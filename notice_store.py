@@ -0,0 +1,245 @@
+import os
+import time
+import sqlite3
+import threading
+import pandas as pd
+
+from upstream import get_upstream
+
+# Local announcement store and polling settings (env overrides)
+NOTICE_STORE_PATH = os.getenv("NOTICE_STORE_PATH", os.path.join("cache", "notices.sqlite3"))
+NOTICE_POLL_SECONDS = float(os.getenv("NOTICE_POLL_SECONDS", "300"))
+NOTICE_BATCH_SIZE = int(os.getenv("NOTICE_BATCH_SIZE", "50"))
+NOTICE_PAGE_SIZE = int(os.getenv("NOTICE_PAGE_SIZE", "50"))
+NOTICE_MAX_PAGES = int(os.getenv("NOTICE_MAX_PAGES", "5"))
+# Stocks viewed within this window are polled in the background (see `poll_watched`)
+NOTICE_WATCH_SECONDS = float(os.getenv("NOTICE_WATCH_SECONDS", str(7 * 24 * 3600)))
+
+NOTICE_API = "https://np-anotice-stock.eastmoney.com/api/security/ann"
+NOTICE_HEADERS = {"User-Agent": "Mozilla/5.0", "Referer": "https://data.eastmoney.com/"}
+COLUMNS = ['公告标题', '公告类型', '公告日期', '链接']
+
+
+def fetch_notice_page(codes, page_index=1, page_size=NOTICE_PAGE_SIZE):
+    """
+    One page of announcements for several stocks at once, newest first.
+    Returns dicts with art_code, title, ann_type, notice_date, link and the
+    stock codes the announcement belongs to.
+    """
+    params = {
+        "page_index": page_index, "page_size": page_size, "ann_type": "A", "client_source": "web",
+        "stock_list": ",".join(codes), "f_node": 1, "s_node": 1,
+    }
+    response = get_upstream().get(NOTICE_API, params=params, headers=NOTICE_HEADERS, source="notices", symbol=",".join(codes), timeout=5)
+    response.raise_for_status()
+    items = (response.json().get('data') or {}).get('list') or []
+    notices = []
+    for item in items:
+        art_code = item.get('art_code')
+        if not art_code:
+            continue
+        stock_codes = [c.get('stock_code') for c in item.get('codes') or [] if c.get('stock_code')]
+        link_code = stock_codes[0] if stock_codes else codes[0]
+        columns = item.get('columns') or []
+        notices.append({
+            'art_code': art_code,
+            'title': item.get('title', item.get('art_title', '公告')),
+            'ann_type': columns[0].get('column_name', '公告') if columns else '公告',
+            'notice_date': item.get('notice_date', ''),
+            'link': f"https://data.eastmoney.com/notices/detail/{link_code}/{art_code}.html",
+            'codes': stock_codes or list(codes),
+        })
+    return notices
+
+
+class NoticeStore:
+    """
+    Local store of company announcements keyed by art_code (SQLite).
+
+    `poll` asks the API for many stocks per request and pages backwards
+    only until it reaches announcements older than every polled stock's
+    high-water mark (its newest stored notice date), so a routine poll is
+    one request per batch. A stock with nothing stored yet gets one request
+    of its own first, and a stock is only marked as polled once its
+    high-water mark was reached. Visit marks are kept per (viewer, stock), where a
+    viewer is a user, a browser session or the batch runner: `mark_seen`
+    records what was stored at this visit, and `notices` flags items that
+    arrived after that viewer's previous visit as new. `poll_watched` polls
+    every stock someone has viewed recently.
+    """
+
+    def __init__(self, path=NOTICE_STORE_PATH, fetcher=fetch_notice_page, poll_seconds=NOTICE_POLL_SECONDS):
+        self.path = path
+        self.fetcher = fetcher
+        self.poll_seconds = poll_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS notices ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, art_code TEXT NOT NULL UNIQUE, title TEXT, "
+                "ann_type TEXT, notice_date TEXT, link TEXT, fetched REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS notice_stocks ("
+                "art_code TEXT NOT NULL, stock_code TEXT NOT NULL, PRIMARY KEY (stock_code, art_code))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS marks ("
+                "stock_code TEXT PRIMARY KEY, high_water TEXT, polled REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS visits ("
+                "viewer TEXT NOT NULL, stock_code TEXT NOT NULL, seen_seq INTEGER, prev_seen_seq INTEGER, visited REAL, "
+                "PRIMARY KEY (viewer, stock_code))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS visits_visited ON visits (visited)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _marks(self, conn, codes):
+        placeholders = ",".join("?" * len(codes))
+        rows = conn.execute(f"SELECT stock_code, high_water, polled FROM marks WHERE stock_code IN ({placeholders})", codes)
+        return {code: (high_water, polled) for code, high_water, polled in rows}
+
+    def _save(self, conn, notices, now):
+        known = 0
+        for n in notices:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO notices (art_code, title, ann_type, notice_date, link, fetched) VALUES (?, ?, ?, ?, ?, ?)",
+                (n['art_code'], n['title'], n['ann_type'], n['notice_date'], n['link'], now)
+            )
+            known += cursor.rowcount == 0
+            conn.executemany(
+                "INSERT OR IGNORE INTO notice_stocks (art_code, stock_code) VALUES (?, ?)",
+                [(n['art_code'], code) for code in n['codes']]
+            )
+        return known
+
+    def _poll_batch(self, codes):
+        now = time.time()
+        with self._connect() as conn:
+            marks = self._marks(conn, codes)
+        high_water = {c: marks[c][0] for c in codes if c in marks and marks[c][0]}
+        new_items, covered = 0, []
+        # Stocks with no stored notice yet get one page of their own, so a
+        # shared page full of busier stocks cannot leave them empty
+        for code in codes:
+            if code in high_water:
+                continue
+            notices = self.fetcher([code], 1)
+            with self._connect() as conn:
+                new_items += len(notices) - self._save(conn, notices, now)
+            covered.append(code)
+        # The rest share requests, paging back until every high-water mark is reached
+        tracked = [c for c in codes if c in high_water]
+        if tracked:
+            stop_at = min(high_water[c] for c in tracked)
+            oldest, exhausted = None, False
+            for page_index in range(1, NOTICE_MAX_PAGES + 1):
+                notices = self.fetcher(tracked, page_index)
+                with self._connect() as conn:
+                    known = self._save(conn, notices, now)
+                new_items += len(notices) - known
+                oldest = min([n['notice_date'] for n in notices] + ([oldest] if oldest else []), default=None)
+                exhausted = len(notices) < NOTICE_PAGE_SIZE or known == len(notices)
+                if exhausted or (oldest and oldest <= stop_at):
+                    break
+            # Stocks whose mark was not reached within NOTICE_MAX_PAGES stay due
+            covered += [c for c in tracked if exhausted or (oldest and oldest <= high_water[c])]
+        with self._connect() as conn:
+            for code in covered:
+                row = conn.execute(
+                    "SELECT MAX(n.notice_date) FROM notices n JOIN notice_stocks s ON s.art_code = n.art_code WHERE s.stock_code = ?",
+                    (code,)
+                ).fetchone()
+                conn.execute(
+                    "INSERT INTO marks (stock_code, high_water, polled) VALUES (?, ?, ?) "
+                    "ON CONFLICT(stock_code) DO UPDATE SET high_water = excluded.high_water, polled = excluded.polled",
+                    (code, row[0], now)
+                )
+        return new_items
+
+    def poll(self, codes, batch_size=NOTICE_BATCH_SIZE):
+        """Fetch new announcements for `codes`, batch_size stocks per request. Returns the number of new items."""
+        codes = list(dict.fromkeys(str(c) for c in codes))
+        new_items = 0
+        for i in range(0, len(codes), batch_size):
+            try:
+                new_items += self._poll_batch(codes[i:i + batch_size])
+            except Exception as e:
+                print(f"Notices API error: {e}")
+        return new_items
+
+    def poll_if_stale(self, code):
+        """Poll one stock unless it was polled within `poll_seconds`."""
+        with self._connect() as conn:
+            mark = self._marks(conn, [code]).get(code)
+        if mark is None or mark[1] is None or time.time() - mark[1] > self.poll_seconds:
+            self.poll([code])
+
+    def watched(self, within=NOTICE_WATCH_SECONDS):
+        """Codes any viewer has visited in the last `within` seconds."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT DISTINCT stock_code FROM visits WHERE visited > ?", (time.time() - within,))
+            return [r[0] for r in rows]
+
+    def poll_watched(self, within=NOTICE_WATCH_SECONDS):
+        """Batched poll of every recently viewed stock. Returns the number of new items."""
+        codes = self.watched(within)
+        return self.poll(codes) if codes else 0
+
+    def mark_seen(self, code, viewer):
+        """
+        Record `viewer`'s visit: items stored so far stop counting as new for
+        that viewer from their next visit on. A first visit flags nothing as new.
+        """
+        with self._connect() as conn:
+            latest = conn.execute(
+                "SELECT COALESCE(MAX(n.seq), 0) FROM notices n JOIN notice_stocks s ON s.art_code = n.art_code WHERE s.stock_code = ?",
+                (code,)
+            ).fetchone()[0]
+            row = conn.execute("SELECT seen_seq FROM visits WHERE viewer = ? AND stock_code = ?", (viewer, code)).fetchone()
+            previous = row[0] if row and row[0] is not None else latest
+            conn.execute(
+                "INSERT INTO visits (viewer, stock_code, seen_seq, prev_seen_seq, visited) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(viewer, stock_code) DO UPDATE SET seen_seq = excluded.seen_seq, "
+                "prev_seen_seq = excluded.prev_seen_seq, visited = excluded.visited",
+                (viewer, code, latest, previous, time.time())
+            )
+
+    def notices(self, code, viewer=None, limit=20):
+        """
+        Latest stored announcements for one stock, newest first, with a 新
+        flag for items since `viewer`'s previous visit (none without a viewer).
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT prev_seen_seq FROM visits WHERE viewer = ? AND stock_code = ?", (viewer, code)
+            ).fetchone() if viewer is not None else None
+            since = row[0] if row and row[0] is not None else None
+            rows = conn.execute(
+                "SELECT n.title, n.ann_type, substr(n.notice_date, 1, 10), n.link, n.seq FROM notices n "
+                "JOIN notice_stocks s ON s.art_code = n.art_code WHERE s.stock_code = ? "
+                "ORDER BY n.notice_date DESC, n.seq DESC LIMIT ?",
+                (code, limit)
+            ).fetchall()
+        df = pd.DataFrame([r[:4] for r in rows], columns=COLUMNS)
+        df['新'] = [since is not None and r[4] > since for r in rows]
+        return df
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_notice_store():
+    """Return the process-wide NoticeStore."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = NoticeStore()
+    return _store
@@ -0,0 +1,163 @@
+import ast
+import numpy as np
+import pandas as pd
+
+from bar_store import get_bar_store
+from indicators import compute_panel, MA_WINDOWS
+
+# Screen field -> (spot snapshot column, label, divisor)
+SPOT_FIELDS = {
+    'price': ('最新价', '最新价', 1),
+    'change': ('涨跌幅', '涨跌幅(%)', 1),
+    'amplitude': ('振幅', '振幅(%)', 1),
+    'turnover': ('换手率', '换手率(%)', 1),
+    'volume_ratio': ('量比', '量比', 1),
+    'amount': ('成交额', '成交额(亿)', 1e8),
+    'pe': ('市盈率-动态', '市盈率(动)', 1),
+    'pb': ('市净率', '市净率', 1),
+    'mcap': ('总市值', '总市值(亿)', 1e8),
+    'float_mcap': ('流通市值', '流通市值(亿)', 1e8),
+    'chg_60d': ('60日涨跌幅', '60日涨跌幅(%)', 1),
+    'chg_ytd': ('年初至今涨跌幅', '年初至今涨跌幅(%)', 1),
+}
+
+# Screen field -> label, for indicators precomputed from the local bar store
+INDICATOR_FIELDS = {
+    'rsi': 'RSI14',
+    'dif': 'MACD DIF',
+    'dea': 'MACD DEA',
+    'macd': 'MACD 柱',
+    'kdj_k': 'KDJ K',
+    'kdj_d': 'KDJ D',
+    'kdj_j': 'KDJ J',
+    'boll_pctb': '布林 %B',
+    'atr_pct': 'ATR/收盘(%)',
+    'ma20_gap': '偏离MA20(%)',
+    'ma60_gap': '偏离MA60(%)',
+    'vol_vs_vma5': '成交量/5日均量',
+}
+
+# Bars per symbol fed to the indicator panel: enough to warm up MA60 / MACD
+INDICATOR_LOOKBACK = 120
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Compare, ast.Eq, ast.NotEq,
+    ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Name, ast.Load, ast.Constant,
+)
+
+
+def field_labels():
+    """Every screen field with its label, spot fields first."""
+    labels = {name: label for name, (_, label, _) in SPOT_FIELDS.items()}
+    labels.update(INDICATOR_FIELDS)
+    return labels
+
+
+def indicator_snapshot(codes=None, store=None, lookback=INDICATOR_LOOKBACK):
+    """
+    Latest indicator readings for every stock with local bars, one row per code.
+
+    Each stock's last `lookback` bars are right-aligned into one (N, T)
+    panel (shorter histories are NaN-padded in front) so all indicators for
+    the whole set are computed in a single vectorized pass.
+    """
+    store = store or get_bar_store()
+    codes = store.codes() if codes is None else list(codes)
+    fields = ('最高', '最低', '收盘', '成交量')
+    panel = {f: np.full((len(codes), lookback), np.nan) for f in fields}
+    kept = []
+    for code in codes:
+        bars, _ = store.load(code)
+        if bars.empty:
+            continue
+        tail = bars.tail(lookback)
+        row = len(kept)
+        for f in fields:
+            panel[f][row, lookback - len(tail):] = tail[f].to_numpy(dtype=float)
+        kept.append(code)
+    if not kept:
+        return pd.DataFrame(columns=list(INDICATOR_FIELDS))
+
+    n = len(kept)
+    high, low, close, volume = (panel[f][:n] for f in fields)
+    ind = {k: v[:, -1] for k, v in compute_panel(high, low, close, volume).items()}
+    last_close, last_volume = close[:, -1], volume[:, -1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        band = ind['BOLL_UP'] - ind['BOLL_LOW']
+        out = pd.DataFrame({
+            'rsi': ind['RSI14'],
+            'dif': ind['DIF'],
+            'dea': ind['DEA'],
+            'macd': ind['MACD'],
+            'kdj_k': ind['K'],
+            'kdj_d': ind['D'],
+            'kdj_j': ind['J'],
+            'boll_pctb': np.where(band > 0, (last_close - ind['BOLL_LOW']) / band, np.nan),
+            'atr_pct': ind['ATR14'] / last_close * 100,
+            'ma20_gap': (last_close / ind['MA20'] - 1) * 100,
+            'ma60_gap': (last_close / ind[f'MA{MA_WINDOWS[-1]}'] - 1) * 100,
+            'vol_vs_vma5': last_volume / ind['VMA5'],
+        }, index=pd.Index(kept, name='代码'))
+    return out
+
+
+def build_screen_frame(spot, indicators=None, membership=None):
+    """
+    Numeric screening frame indexed by code: 名称, 行业 plus every screen field.
+    Spot values are coerced to numbers and scaled (market caps in 亿).
+    Stocks without indicator data get NaN, which fails any comparison.
+    """
+    if spot is None or spot.empty:
+        return pd.DataFrame(columns=['名称', '行业'] + list(field_labels()))
+    frame = pd.DataFrame({'名称': spot['名称'].values}, index=pd.Index(spot['代码'].astype(str).values, name='代码'))
+    industries = membership.set_index('代码')['行业'] if membership is not None and not membership.empty else pd.Series(dtype=object)
+    frame['行业'] = industries.reindex(frame.index).values
+    for name, (column, _, divisor) in SPOT_FIELDS.items():
+        values = pd.to_numeric(spot[column], errors='coerce').values if column in spot.columns else np.nan
+        frame[name] = values / divisor
+    indicators = indicators if indicators is not None else pd.DataFrame(columns=list(INDICATOR_FIELDS))
+    return frame.join(indicators.reindex(columns=list(INDICATOR_FIELDS)).astype(float), how='left')
+
+
+def validate_expression(expr, fields):
+    """
+    Accept only comparisons / arithmetic / and-or-not over known fields and
+    numeric constants. Raises ValueError with a readable message otherwise.
+    """
+    try:
+        tree = ast.parse(expr, mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"表达式语法错误: {e.msg}")
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError(f"不支持的语法: {type(node).__name__}")
+        if isinstance(node, ast.Name) and node.id not in fields:
+            raise ValueError(f"未知字段: {node.id}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError(f"只支持数值常量: {node.value!r}")
+
+
+def screen(frame, expr=None, sort_by=None, ascending=False):
+    """
+    Filter `frame` by a boolean expression over its fields, e.g.
+    "pe > 0 and pe < 20 and mcap > 100 and rsi < 30", then sort by one field.
+    The expression is evaluated as whole-column operations.
+    """
+    result = frame
+    if expr and expr.strip():
+        validate_expression(expr, frame.columns)
+        mask = frame.eval(expr)
+        if not (isinstance(mask, pd.Series) and mask.dtype == bool):
+            raise ValueError("表达式结果必须是条件 (比较运算)")
+        result = frame[mask]
+    if sort_by:
+        result = result.sort_values(sort_by, ascending=ascending, na_position='last')
+    return result
+
+
+def paginate(frame, page, page_size):
+    """Rows of one 1-based page, plus the total page count."""
+    pages = max(1, -(-len(frame) // page_size))
+    page = min(max(1, page), pages)
+    return frame.iloc[(page - 1) * page_size: page * page_size], pages
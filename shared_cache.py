@@ -0,0 +1,220 @@
+import os
+import time
+import uuid
+import pickle
+import sqlite3
+import hashlib
+import functools
+import threading
+import pandas as pd
+
+# Cache file shared by every app process on the host (env overrides)
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", os.path.join("cache", "shared_cache.sqlite3"))
+# How long one process may hold the right to (re)load a key before others take over
+SHARED_CACHE_LEASE_SECONDS = float(os.getenv("SHARED_CACHE_LEASE_SECONDS", "60"))
+SHARED_CACHE_POLL_SECONDS = 0.1
+
+
+def _copy(value):
+    """Hand out DataFrames as copies, like st.cache_data does."""
+    return value.copy() if isinstance(value, pd.DataFrame) else value
+
+
+class SharedCache:
+    """
+    Cross-process cache backed by SQLite, with TTL and stale-while-revalidate.
+
+    Each entry is fresh until `expires` and may still be served, while one
+    process reloads it, until `stale_until`. Loads are coordinated across
+    processes with a lease row per key: only the lease holder calls the
+    loader, others serve the stale value or wait for the holder's result,
+    so all workers share one upstream fetch. Values are pickled and written
+    in a single transaction, so readers never see a partial entry. A small
+    in-process layer avoids unpickling on every read.
+    """
+
+    def __init__(self, path=SHARED_CACHE_PATH, lease_seconds=SHARED_CACHE_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.owner = uuid.uuid4().hex
+        self.hits = 0
+        self.stale_hits = 0
+        self.loads = 0
+        self._local = {}
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, created REAL NOT NULL, "
+                "expires REAL NOT NULL, stale_until REAL NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, until REAL NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, key):
+        """(value, expires, stale_until) or None; the value may be stale."""
+        with self._lock:
+            local = self._local.get(key)
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT created, expires, stale_until FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                if local is not None and local[0] == row[0]:
+                    return local[1], row[1], row[2]
+                blob = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Shared cache read error: {e}")
+            return (local[1], local[2], local[3]) if local is not None else None
+        value = pickle.loads(blob)
+        with self._lock:
+            self._local[key] = (row[0], value, row[1], row[2])
+        return value, row[1], row[2]
+
+    def set(self, key, value, ttl, stale_ttl=None):
+        now = time.time()
+        expires = now + ttl
+        stale_until = expires + (ttl if stale_ttl is None else stale_ttl)
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._local = {k: v for k, v in self._local.items() if v[3] > now}
+            self._local[key] = (now, value, expires, stale_until)
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, created, expires, stale_until) VALUES (?, ?, ?, ?, ?)",
+                    (key, blob, now, expires, stale_until)
+                )
+                conn.execute("DELETE FROM entries WHERE stale_until <= ?", (now,))
+        except sqlite3.Error as e:
+            print(f"Shared cache write error: {e}")
+
+    def try_lease(self, key, seconds=None):
+        """Take the right to load `key` for `seconds` (default lease_seconds) unless another live process holds it."""
+        now = time.time()
+        seconds = self.lease_seconds if seconds is None else seconds
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    "INSERT INTO leases (key, owner, until) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, until = excluded.until "
+                    "WHERE leases.until < ? OR leases.owner = excluded.owner",
+                    (key, self.owner, now + seconds, now)
+                )
+                return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            print(f"Shared cache lease error: {e}")
+            return True
+
+    def release(self, key):
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+        except sqlite3.Error as e:
+            print(f"Shared cache lease error: {e}")
+
+    def _load(self, key, loader, ttl, stale_ttl):
+        try:
+            value = loader()
+            self.loads += 1
+            self.set(key, value, ttl, stale_ttl)
+            return value
+        finally:
+            self.release(key)
+
+    def _revalidate(self, key, loader, ttl, stale_ttl):
+        try:
+            self._load(key, loader, ttl, stale_ttl)
+        except Exception as e:
+            print(f"Shared cache refresh error ({key}): {e}")
+
+    def get_or_load(self, key, loader, ttl, stale_ttl=None, background=True):
+        """
+        The cached value of `key`, calling loader() when it is missing or
+        expired. An expired value within its stale window is returned at
+        once and reloaded in a background thread by one process; with
+        background=False the caller waits for the fresh value instead and
+        only gets the stale one if the reload fails.
+        """
+        entry = self.get(key)
+        if entry is not None and time.time() < entry[1]:
+            self.hits += 1
+            return _copy(entry[0])
+        stale = entry if entry is not None and time.time() < entry[2] else None
+        if stale is not None and background:
+            if self.try_lease(key):
+                threading.Thread(target=self._revalidate, args=(key, loader, ttl, stale_ttl), daemon=True).start()
+            self.stale_hits += 1
+            return _copy(stale[0])
+        # Load it, or wait for the process that is loading it
+        deadline = time.time() + self.lease_seconds
+        while not self.try_lease(key) and time.time() < deadline:
+            time.sleep(SHARED_CACHE_POLL_SECONDS)
+            entry = self.get(key)
+            if entry is not None and time.time() < entry[1]:
+                self.hits += 1
+                return _copy(entry[0])
+        try:
+            return _copy(self._load(key, loader, ttl, stale_ttl))
+        except Exception as e:
+            if stale is None:
+                raise
+            print(f"Shared cache refresh error ({key}), serving stale value: {e}")
+            self.stale_hits += 1
+            return _copy(stale[0])
+
+    def expires(self, key):
+        """When the stored value of `key` stops being fresh (epoch seconds), or None."""
+        entry = self.get(key)
+        return entry[1] if entry is not None else None
+
+    def clear(self, prefix=""):
+        with self._lock:
+            for key in [k for k in self._local if k.startswith(prefix)]:
+                del self._local[key]
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def stats(self):
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM entries").fetchone()
+        return {"hits": self.hits, "stale_hits": self.stale_hits, "loads": self.loads, "entries": entries, "bytes": size}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_shared_cache():
+    """Return the process-wide SharedCache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SharedCache()
+    return _cache
+
+
+def make_key(func, args, kwargs):
+    raw = pickle.dumps((args, sorted(kwargs.items())), protocol=pickle.HIGHEST_PROTOCOL)
+    return f"{func.__module__}.{func.__qualname__}:{hashlib.sha256(raw).hexdigest()}"
+
+
+def cached(ttl, stale_ttl=None):
+    """
+    Drop-in for @st.cache_data(ttl=...) backed by the shared cache: results
+    are reused by every app process and survive restarts. Arguments must be
+    picklable. `func.clear()` drops all cached results of the function.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return get_shared_cache().get_or_load(make_key(func, args, kwargs), lambda: func(*args, **kwargs), ttl, stale_ttl)
+        wrapper.clear = lambda: get_shared_cache().clear(f"{func.__module__}.{func.__qualname__}:")
+        return wrapper
+    return decorator
@@ -0,0 +1,112 @@
+import os
+import time
+import threading
+import pandas as pd
+
+from upstream import get_upstream
+
+# Full-market snapshot refresh cadence in seconds (env override)
+SPOT_REFRESH_SECONDS = float(os.getenv("SPOT_REFRESH_SECONDS", "60"))
+
+
+class SpotService:
+    """
+    Process-wide holder of the full-market spot snapshot (ak.stock_zh_a_spot_em).
+
+    The snapshot is indexed by stock code, so single and batch lookups are
+    hash lookups instead of full-frame scans. Once older than
+    `refresh_seconds` it is refreshed in a background thread while readers
+    keep getting the previous snapshot; only the very first load blocks.
+    """
+
+    def __init__(self, refresh_seconds=SPOT_REFRESH_SECONDS, loader=None):
+        self.refresh_seconds = refresh_seconds
+        self.loader = loader or (lambda: get_upstream().ak("stock_zh_a_spot_em"))
+        self._frame = None
+        self._updated = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._refreshed = threading.Condition(self._lock)
+
+    @staticmethod
+    def _prepare(df):
+        if df is None or df.empty or '代码' not in df.columns:
+            raise ValueError("empty spot snapshot")
+        df = df.copy()
+        df['代码'] = df['代码'].astype(str)
+        df = df.drop_duplicates('代码')
+        df.index = pd.Index(df['代码'].values)
+        return df
+
+    def install(self, df):
+        """Replace the snapshot with `df` (a raw stock_zh_a_spot_em frame loaded elsewhere)."""
+        frame = self._prepare(df)
+        with self._lock:
+            self._frame = frame
+            self._updated = time.time()
+
+    def refresh(self):
+        """Download a new snapshot now. Keeps the previous one on failure."""
+        try:
+            self.install(self.loader())
+        except Exception as e:
+            print(f"Error fetching spot data: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+                self._refreshed.notify_all()
+
+    def _ensure_fresh(self):
+        with self._lock:
+            if self._frame is not None and time.time() - self._updated < self.refresh_seconds:
+                return
+            first_load = self._frame is None
+            start_refresh = not self._refreshing
+            self._refreshing = True
+        if start_refresh:
+            if first_load:
+                self.refresh()
+            else:
+                threading.Thread(target=self.refresh, daemon=True).start()
+        elif first_load:
+            # Another caller is doing the first load; wait for it
+            with self._lock:
+                self._refreshed.wait_for(lambda: not self._refreshing)
+
+    @property
+    def updated_at(self):
+        return self._updated
+
+    def snapshot(self):
+        """The whole market frame (empty if it has never been loaded)."""
+        self._ensure_fresh()
+        frame = self._frame
+        return frame if frame is not None else pd.DataFrame()
+
+    def quote(self, code):
+        """One stock's row as a Series, or None."""
+        frame = self.snapshot()
+        if frame.empty or code not in frame.index:
+            return None
+        return frame.loc[code]
+
+    def quotes(self, codes):
+        """Rows for the given codes that exist in the snapshot, in input order."""
+        frame = self.snapshot()
+        if frame.empty:
+            return frame
+        codes = pd.Index([str(c) for c in codes])
+        return frame.loc[codes[codes.isin(frame.index)]]
+
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_spot_service():
+    """Return the process-wide SpotService."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = SpotService()
+    return _service
@@ -0,0 +1,109 @@
+import re
+import bisect
+import difflib
+import unicodedata
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:  # pinyin initials search is unavailable without pypinyin
+    lazy_pinyin = None
+
+# Match tiers, best first
+EXACT, PREFIX, INITIALS, CONTAINS, FUZZY = range(5)
+
+
+def normalize_name(name):
+    """Fold full-width characters and case, drop whitespace: '万  科Ａ' -> '万科a'"""
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", str(name))).lower()
+
+
+def pinyin_initials(name):
+    """'平安银行' -> 'payh', '*ST国华' -> 'stgh', 'TCL科技' -> 'tclkj'"""
+    if lazy_pinyin is None:
+        return ""
+    parts = lazy_pinyin(normalize_name(name), style=Style.FIRST_LETTER)
+    return re.sub(r"[^0-9a-z]", "", "".join(parts).lower())
+
+
+class StockSearchIndex:
+    """
+    Search index over stock codes, names and pinyin initials.
+
+    Built once from the stock list. Prefix queries are binary searches over
+    sorted keys; the substring scan only runs when they return fewer than
+    `k` results, and typo-tolerant matching only when nothing else matched.
+    """
+
+    def __init__(self, stock_list):
+        codes = stock_list['code'].astype(str).tolist()
+        names = stock_list['name'].astype(str).tolist()
+        self.name_by_code = dict(zip(codes, names))
+        self.code_by_name = {}
+        for code, name in zip(codes, names):
+            self.code_by_name.setdefault(name, code)
+        self.codes = codes
+        self._norm_names = [normalize_name(n) for n in names]
+        self._initials = [pinyin_initials(n) for n in names]
+        self._code_keys = sorted((c, i) for i, c in enumerate(codes))
+        self._name_keys = sorted((n, i) for i, n in enumerate(self._norm_names))
+        self._initial_keys = sorted((p, i) for i, p in enumerate(self._initials) if p)
+        # Fuzzy candidates bucketed by length: one typo changes length by at most 1
+        self._fuzzy_keys = {}
+        for keys in (self._norm_names, self._initials):
+            for i, key in enumerate(keys):
+                if key:
+                    self._fuzzy_keys.setdefault(len(key), {}).setdefault(key, i)
+
+    def __contains__(self, code):
+        return code in self.name_by_code
+
+    def __len__(self):
+        return len(self.codes)
+
+    def name_of(self, code):
+        return self.name_by_code.get(code)
+
+    def code_of(self, name):
+        return self.code_by_name.get(name)
+
+    @staticmethod
+    def _prefix_hits(keys, prefix, limit):
+        start = bisect.bisect_left(keys, (prefix,))
+        hits = []
+        for key, i in keys[start:start + limit]:
+            if not key.startswith(prefix):
+                break
+            hits.append((key, i))
+        return hits
+
+    def search(self, query, k=10):
+        """Return up to k (code, name) pairs, best matches first."""
+        q = normalize_name(query)
+        if not q:
+            return []
+        ranked = {}
+
+        def add(i, tier):
+            if i not in ranked or tier < ranked[i]:
+                ranked[i] = tier
+
+        for key, i in self._prefix_hits(self._code_keys, q, k):
+            add(i, EXACT if key == q else PREFIX)
+        for key, i in self._prefix_hits(self._name_keys, q, k):
+            add(i, EXACT if key == q else PREFIX)
+        for key, i in self._prefix_hits(self._initial_keys, q, k):
+            add(i, INITIALS)
+
+        if len(ranked) < k:
+            for i, name in enumerate(self._norm_names):
+                if q in name:
+                    add(i, CONTAINS)
+        if not ranked:
+            candidates = {}
+            for length in (len(q) - 1, len(q), len(q) + 1):
+                candidates.update(self._fuzzy_keys.get(length, {}))
+            for key in difflib.get_close_matches(q, candidates, n=k, cutoff=0.7):
+                add(candidates[key], FUZZY)
+
+        order = sorted(ranked, key=lambda i: (ranked[i], len(self._norm_names[i]), self.codes[i]))
+        return [(self.codes[i], self.name_by_code[self.codes[i]]) for i in order[:k]]
@@ -0,0 +1,313 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict, deque
+from urllib.parse import urlparse
+import numpy as np
+import requests
+import akshare as ak
+
+from metrics import get_metrics, payload_bytes
+
+# Default per-host budget and breaker settings (env overrides)
+UPSTREAM_RATE = float(os.getenv("UPSTREAM_RATE", "10"))  # requests per second
+UPSTREAM_BURST = float(os.getenv("UPSTREAM_BURST", "20"))
+UPSTREAM_FAILURE_THRESHOLD = int(os.getenv("UPSTREAM_FAILURE_THRESHOLD", "5"))
+UPSTREAM_RESET_SECONDS = float(os.getenv("UPSTREAM_RESET_SECONDS", "30"))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "10"))
+UPSTREAM_STALE_ENTRIES = int(os.getenv("UPSTREAM_STALE_ENTRIES", "256"))
+
+# Hosts with their own (rate, burst); anything else gets the defaults
+HOST_LIMITS = {
+    "sina.com.cn": (5, 10),
+}
+# akshare function -> host it talks to (by name: *_em is eastmoney, *_sina is sina)
+AK_HOSTS = {
+    "stock_zh_a_daily": "sina.com.cn",
+    "stock_financial_abstract": "sina.com.cn",
+    "stock_info_a_code_name": "exchanges",
+}
+THROTTLE_STATUS_CODES = {403, 429, 456}
+LATENCY_WINDOW = 512
+
+
+class UpstreamUnavailable(Exception):
+    """Raised without calling upstream while a host's circuit is open and nothing stale is cached."""
+
+
+class Throttled(Exception):
+    """Raised for HTTP responses that signal rate limiting."""
+
+
+def host_of(url):
+    """'https://push2.eastmoney.com/api' -> 'eastmoney.com' (requests share one budget per site)."""
+    netloc = urlparse(url).netloc.split(":")[0]
+    return ".".join(netloc.split(".")[-3:]) if netloc.endswith(".com.cn") else ".".join(netloc.split(".")[-2:])
+
+
+def ak_host(func_name):
+    if func_name in AK_HOSTS:
+        return AK_HOSTS[func_name]
+    if func_name.endswith("_sina"):
+        return "sina.com.cn"
+    return "eastmoney.com"
+
+
+def is_throttle(error):
+    """Errors that mean "slow down": throttling statuses and dropped connections."""
+    if isinstance(error, (Throttled, requests.exceptions.ConnectionError, ConnectionResetError)):
+        return True
+    text = str(error)
+    return re.search(r"\b429\b", text) is not None or "Too Many" in text or "RemoteDisconnected" in text
+
+
+def is_host_failure(error):
+    """
+    Errors that say the host is unhealthy (transport errors, timeouts, 5xx,
+    throttling), as opposed to errors about the request itself such as a
+    KeyError for a delisted symbol. Only these count toward the breaker.
+    """
+    if is_throttle(error):
+        return True
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                          requests.exceptions.ChunkedEncodingError, ConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status >= 500 or status in THROTTLE_STATUS_CODES
+    return False
+
+
+class HostState:
+    """
+    Rate limiting and health of one upstream host.
+
+    Token bucket: up to `burst` requests at once, refilled at `rate` per
+    second. Throttling signals add a backoff gap between requests that
+    doubles on each signal and halves on each success. After
+    `failure_threshold` consecutive host failures (`is_host_failure`; other
+    errors are counted but leave the breaker alone) the circuit opens and
+    calls fail fast for `reset_seconds`; then one probe is let through
+    (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, host, rate, burst, failure_threshold=UPSTREAM_FAILURE_THRESHOLD,
+                 reset_seconds=UPSTREAM_RESET_SECONDS, backoff_max=UPSTREAM_BACKOFF_MAX):
+        self.host = host
+        self.rate = rate
+        self.burst = burst
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.backoff_max = backoff_max
+        self._tokens = burst
+        self._refilled = time.monotonic()
+        self._next_start = 0.0
+        self.backoff = 0.0
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.short_circuited = 0
+        self.stale_served = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def admit(self):
+        """False while the circuit is open; in half-open state only one probe is admitted."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_seconds or self._probing:
+                self.short_circuited += 1
+                return False
+            self._probing = True
+            return True
+
+    def acquire(self):
+        """Block until the token bucket and the backoff gap allow one more request."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            self._tokens -= 1
+            wait_for = max(-self._tokens / self.rate, self._next_start - now, 0.0)
+            self._next_start = max(self._next_start, now) + self.backoff
+            self.requests += 1
+        if wait_for > 0:
+            time.sleep(wait_for)
+
+    def record(self, elapsed, error=None):
+        with self._lock:
+            self.latencies.append(elapsed)
+            self._probing = False
+            if error is None:
+                self.failures = 0
+                self.opened_at = None
+                self.backoff = self.backoff / 2 if self.backoff > 0.05 else 0.0
+                return
+            self.errors += 1
+            if not is_host_failure(error):
+                return
+            self.failures += 1
+            if is_throttle(error):
+                self.throttled += 1
+                self.backoff = min(self.backoff_max, max(self.backoff * 2, 1.0 / self.rate))
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                # A failed half-open probe re-opens for another full period
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        latencies = np.array(self.latencies) if self.latencies else np.array([np.nan])
+        return {
+            "host": self.host,
+            "state": self.state,
+            "requests": self.requests,
+            "errors": self.errors,
+            "throttled": self.throttled,
+            "short_circuited": self.short_circuited,
+            "stale_served": self.stale_served,
+            "backoff_seconds": round(self.backoff, 3),
+            "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1),
+            "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 1),
+        }
+
+
+class Upstream:
+    """
+    Shared access layer for upstream data sources.
+
+    Every akshare call and scraper request goes through `call` with the
+    host it talks to, so all sessions share one rate budget and one health
+    view per host. The last good result of each call is kept (bounded LRU);
+    while a host fails or its circuit is open that stale result is returned
+    instead of an error.
+    """
+
+    def __init__(self, rate=UPSTREAM_RATE, burst=UPSTREAM_BURST, host_limits=HOST_LIMITS, stale_entries=UPSTREAM_STALE_ENTRIES):
+        self.rate = rate
+        self.burst = burst
+        self.host_limits = host_limits
+        self.stale_entries = stale_entries
+        self._hosts = {}
+        self._stale = OrderedDict()
+        self._lock = threading.Lock()
+
+    def host(self, name):
+        with self._lock:
+            state = self._hosts.get(name)
+            if state is None:
+                rate, burst = self.host_limits.get(name, (self.rate, self.burst))
+                state = self._hosts[name] = HostState(name, rate, burst)
+            return state
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._stale[key] = value
+            self._stale.move_to_end(key)
+            while len(self._stale) > self.stale_entries:
+                self._stale.popitem(last=False)
+
+    def _stale_result(self, state, key, error):
+        with self._lock:
+            found = key in self._stale
+            value = self._stale.get(key)
+        if not found:
+            raise error
+        state.stale_served += 1
+        print(f"Upstream {state.host} unavailable, serving stale data: {error}")
+        return value
+
+    def call(self, host, func, *args, stale_key=None, **kwargs):
+        """
+        Run func(*args, **kwargs) under `host`'s rate limit and circuit
+        breaker. With a `stale_key`, successes are remembered and returned
+        again when the call fails or the circuit is open.
+        """
+        return self._call(host, func, args, kwargs, stale_key, getattr(func, "__name__", host), None)
+
+    def _call(self, host, func, args, kwargs, stale_key, source, symbol):
+        state = self.host(host)
+        metrics = get_metrics()
+        if not state.admit():
+            try:
+                if stale_key is None:
+                    raise UpstreamUnavailable(f"{host} circuit open")
+                value = self._stale_result(state, stale_key, UpstreamUnavailable(f"{host} circuit open"))
+            except UpstreamUnavailable:
+                metrics.record(source, 0.0, "rejected", symbol=symbol)
+                raise
+            metrics.record(source, 0.0, "stale", symbol=symbol, size=payload_bytes(value))
+            return value
+        state.acquire()
+        start = time.perf_counter()
+        try:
+            value = func(*args, **kwargs)
+        except Exception as e:
+            elapsed = time.perf_counter() - start
+            state.record(elapsed, e)
+            if stale_key is None or not is_host_failure(e):
+                metrics.record(source, elapsed, "error", symbol=symbol)
+                raise
+            try:
+                value = self._stale_result(state, stale_key, e)
+            except Exception:
+                metrics.record(source, elapsed, "error", symbol=symbol)
+                raise
+            metrics.record(source, elapsed, "stale", symbol=symbol, size=payload_bytes(value))
+            return value
+        elapsed = time.perf_counter() - start
+        state.record(elapsed)
+        metrics.record(source, elapsed, "ok", symbol=symbol, size=payload_bytes(value))
+        if stale_key is not None:
+            self._remember(stale_key, value)
+        return value
+
+    def ak(self, func_name, *args, **kwargs):
+        """akshare `func_name` through the layer, with stale fallback."""
+        key = ("ak", func_name, args, tuple(sorted(kwargs.items())))
+        symbol = kwargs.get("symbol", args[0] if args else None)
+        return self._call(ak_host(func_name), getattr(ak, func_name), args, kwargs, key, f"ak.{func_name}", symbol)
+
+    def get(self, url, session=None, source=None, symbol=None, **kwargs):
+        """
+        HTTP GET through the layer; throttling statuses count as failures
+        and raise Throttled, 5xx responses raise HTTPError. `source` names
+        the scraper in the metrics (default: the host).
+        """
+        def fetch():
+            response = (session or requests).get(url, **kwargs)
+            if response.status_code in THROTTLE_STATUS_CODES:
+                raise Throttled(f"HTTP {response.status_code} from {url}")
+            if response.status_code >= 500:
+                response.raise_for_status()
+            return response
+        host = host_of(url)
+        return self._call(host, fetch, (), {}, None, source or host, symbol)
+
+    def stats(self):
+        """Per-host counters as a list of dicts."""
+        with self._lock:
+            hosts = list(self._hosts.values())
+        return [state.stats() for state in hosts]
+
+
+_upstream = None
+_upstream_lock = threading.Lock()
+
+def get_upstream():
+    """Return the process-wide Upstream."""
+    global _upstream
+    if _upstream is None:
+        with _upstream_lock:
+            if _upstream is None:
+                _upstream = Upstream()
+    return _upstream
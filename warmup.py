@@ -0,0 +1,291 @@
+import os
+import time
+import threading
+from datetime import datetime, date, timedelta, time as dtime
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+from upstream import get_upstream
+from spot_service import get_spot_service
+from notice_store import get_notice_store, NOTICE_POLL_SECONDS
+from industry import get_industry_index
+from shared_cache import get_shared_cache
+
+# Scheduler tick and the local stock list file (env overrides)
+WARMUP_TICK_SECONDS = float(os.getenv("WARMUP_TICK_SECONDS", "5"))
+WARMUP_ERROR_RETRY_SECONDS = float(os.getenv("WARMUP_ERROR_RETRY_SECONDS", "30"))
+STOCK_LIST_PATH = os.getenv("STOCK_LIST_PATH", "stock_list.csv")
+
+# A-share continuous auction sessions; boundaries are also refresh points
+SESSIONS = ((dtime(9, 30), dtime(11, 30)), (dtime(13, 0), dtime(15, 0)))
+MAIN_INDICES = ['上证指数', '深证成指', '创业板指', '科创50']
+
+
+class TradingCalendar:
+    """Trading days from sina's trade date history (weekdays if it cannot be loaded), reloaded daily."""
+
+    def __init__(self):
+        self._days = None
+        self._loaded_on = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            df = get_upstream().ak("tool_trade_date_hist_sina")
+            return set(pd.to_datetime(df['trade_date']).dt.date)
+        except Exception as e:
+            print(f"Trading calendar error: {e}")
+            return None
+
+    def is_trading_day(self, day):
+        with self._lock:
+            if self._loaded_on != date.today():
+                self._days = self._load() or self._days
+                self._loaded_on = date.today()
+            days = self._days
+        if days and min(days) <= day <= max(days):
+            return day in days
+        return day.weekday() < 5
+
+    def phase(self, now=None):
+        """'trading' inside a session, 'break' at lunch, 'closed' otherwise."""
+        now = now or datetime.now()
+        if not self.is_trading_day(now.date()):
+            return "closed"
+        t = now.time()
+        if any(start <= t < end for start, end in SESSIONS):
+            return "trading"
+        return "break" if SESSIONS[0][1] <= t < SESSIONS[1][0] else "closed"
+
+    def last_boundary(self, now=None):
+        """The latest session open / close at or before `now` on a trading day, or None."""
+        now = now or datetime.now()
+        if not self.is_trading_day(now.date()):
+            return None
+        passed = [datetime.combine(now.date(), b) for session in SESSIONS for b in session if b <= now.time()]
+        return max(passed) if passed else None
+
+    def next_boundary(self, now=None, horizon_days=15):
+        """The first session open / close after `now` (looking `horizon_days` ahead), or None."""
+        now = now or datetime.now()
+        for offset in range(horizon_days):
+            day = now.date() + timedelta(days=offset)
+            if not self.is_trading_day(day):
+                continue
+            upcoming = [datetime.combine(day, b) for session in SESSIONS for b in session if datetime.combine(day, b) > now]
+            if upcoming:
+                return min(upcoming)
+        return None
+
+
+class Dataset:
+    """
+    One shared dataset kept warm by the scheduler.
+
+    `read` returns the current value at once (a copy for DataFrames); only a
+    process that has never loaded it waits, and then for the in-flight load
+    rather than starting its own. Loads go through the shared cache, so when
+    several app processes run, one of them calls the loader per interval and
+    the others pick up its result; `on_update` is called with each new value.
+    """
+
+    def __init__(self, name, loader, trading_seconds, closed_seconds, on_update=None):
+        self.name = name
+        self.loader = loader
+        self.trading_seconds = trading_seconds
+        self.closed_seconds = closed_seconds
+        self.on_update = on_update
+        self.value = None
+        self.updated = 0.0
+        self.next_due = 0.0
+        self.error = None
+        self._loading = False
+        self._loaded = threading.Event()
+        self._lock = threading.Lock()
+
+    def interval(self, phase):
+        return self.trading_seconds if phase == "trading" else self.closed_seconds
+
+    @property
+    def market_driven(self):
+        return self.trading_seconds != self.closed_seconds
+
+    def is_due(self, now, phase, boundary):
+        if self.market_driven and self.updated and boundary is not None and self.updated < boundary.timestamp() <= now:
+            return True  # a session opened or closed since the last refresh
+        return now >= self.next_due
+
+    def seed(self, value, updated):
+        """Start from a persisted value; the next refresh is due one interval after `updated`."""
+        with self._lock:
+            self.value, self.updated = value, updated
+            self.next_due = updated + self.closed_seconds
+        self._loaded.set()
+
+    def claim(self):
+        """Mark a load as in flight; False if one already is."""
+        with self._lock:
+            if self._loading:
+                return False
+            self._loading = True
+            return True
+
+    def refresh(self, phase="trading", claimed=False, until=None):
+        """Load a new value; a market-driven value is not shared past `until` (the next session boundary)."""
+        if not claimed and not self.claim():
+            return
+        try:
+            cache = get_shared_cache()
+            key = f"warmup:{self.name}"
+            ttl = self.interval(phase)
+            if until is not None and self.market_driven:
+                ttl = max(min(ttl, until.timestamp() - time.time()), 1)
+            value = cache.get_or_load(key, self.loader, ttl=ttl, background=False)
+            if self.on_update is not None:
+                self.on_update(value)
+            with self._lock:
+                self.value, self.updated, self.error = value, time.time(), None
+                # Follow the shared entry's expiry so every process refreshes on the same beat;
+                # an already expired entry means a stale value was served after a failed load
+                expires = cache.expires(key)
+                fresh = expires is not None and expires > self.updated
+                self.next_due = expires if fresh else self.updated + min(self.interval(phase), WARMUP_ERROR_RETRY_SECONDS)
+        except Exception as e:
+            print(f"Warm-up error ({self.name}): {e}")
+            with self._lock:
+                self.error = str(e)
+                self.next_due = time.time() + min(self.interval(phase), WARMUP_ERROR_RETRY_SECONDS)
+        finally:
+            with self._lock:
+                self._loading = False
+            self._loaded.set()
+
+    def read(self):
+        if self.value is None:
+            # Load inline, or wait for the load already in flight
+            self.refresh()
+            self._loaded.wait()
+        value = self.value
+        return value.copy() if isinstance(value, pd.DataFrame) else value
+
+
+def load_stock_list():
+    """A-share code / name list, downloaded and saved to STOCK_LIST_PATH."""
+    stock_info = get_upstream().ak("stock_info_a_code_name")
+    stock_info['code'] = stock_info['code'].astype(str)
+    try:
+        os.makedirs(os.path.dirname(STOCK_LIST_PATH) or ".", exist_ok=True)
+        stock_info.to_csv(STOCK_LIST_PATH + ".tmp", index=False)
+        os.replace(STOCK_LIST_PATH + ".tmp", STOCK_LIST_PATH)
+    except OSError as e:
+        print(f"Stock list save error: {e}")
+    return stock_info
+
+
+def load_market_indices():
+    df = get_upstream().ak("stock_zh_index_spot_sina")
+    return df[df['名称'].isin(MAIN_INDICES)].reset_index(drop=True)
+
+
+class WarmupScheduler:
+    """
+    Background thread that loads the shared, user-independent datasets at
+    boot and refreshes each one before it goes stale: on its trading-hours
+    interval during sessions, its slower interval otherwise, and once more
+    right after each session opens or closes.
+    """
+
+    def __init__(self, calendar=None, tick=WARMUP_TICK_SECONDS):
+        self.calendar = calendar or TradingCalendar()
+        self.tick = tick
+        self.datasets = {}
+        self._executor = ThreadPoolExecutor(max_workers=4)
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, trading_seconds, closed_seconds, on_update=None):
+        self.datasets[name] = Dataset(name, loader, trading_seconds, closed_seconds, on_update)
+        return self.datasets[name]
+
+    def read(self, name):
+        return self.datasets[name].read()
+
+    def run_once(self, now=None):
+        """Start refreshes for every due dataset. Returns their names."""
+        now_dt = now or datetime.now()
+        now = now_dt.timestamp()
+        phase = self.calendar.phase(now_dt)
+        boundary = self.calendar.last_boundary(now_dt)
+        upcoming = self.calendar.next_boundary(now_dt)
+        due = [d for d in self.datasets.values() if d.is_due(now, phase, boundary) and d.claim()]
+        for dataset in due:
+            self._executor.submit(dataset.refresh, phase, True, upcoming)
+        # Spot service readers refresh on their own only if the scheduler falls behind
+        spot = self.datasets.get("spot")
+        if spot is not None:
+            get_spot_service().refresh_seconds = 2 * spot.interval(phase)
+        return [d.name for d in due]
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Warm-up scheduler error: {e}")
+            self._stop.wait(self.tick)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name="warmup", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        now = time.time()
+        return [
+            {
+                "dataset": d.name,
+                "age_seconds": round(now - d.updated, 1) if d.updated else None,
+                "next_in_seconds": round(d.next_due - now, 1),
+                "error": d.error,
+            }
+            for d in self.datasets.values()
+        ]
+
+
+def build_scheduler():
+    scheduler = WarmupScheduler()
+    stock_list = scheduler.register("stock_list", load_stock_list, 24 * 3600, 24 * 3600)
+    if os.path.exists(STOCK_LIST_PATH):
+        try:
+            stock_list.seed(pd.read_csv(STOCK_LIST_PATH, dtype={'code': str}), os.path.getmtime(STOCK_LIST_PATH))
+        except Exception as e:
+            print(f"Stock list read error: {e}")
+    scheduler.register("market_indices", load_market_indices, 30, 1800)
+    scheduler.register("industry_boards", lambda: get_upstream().ak("stock_board_industry_name_em"), 60, 3600)
+    scheduler.register("hsgt_flow", lambda: get_upstream().ak("stock_hsgt_fund_flow_summary_em"), 60, 3600)
+    scheduler.register("spot", lambda: get_upstream().ak("stock_zh_a_spot_em"), 60, 3600, on_update=get_spot_service().install)
+    # Code -> industry membership: checked hourly, rebuilt once older than its TTL
+    scheduler.register("industry_index", lambda: get_industry_index().build(), 3600, 3600)
+    # Announcements for every recently viewed stock, many codes per request
+    scheduler.register("notices", lambda: get_notice_store().poll_watched(), NOTICE_POLL_SECONDS, NOTICE_POLL_SECONDS)
+    return scheduler
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_warmup():
+    """Return the process-wide WarmupScheduler (not started)."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = build_scheduler()
+    return _scheduler